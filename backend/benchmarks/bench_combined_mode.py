@@ -0,0 +1,160 @@
+# -----
+# Fan-out (quiz, recommendations and mindmap as three calls) versus the
+# combined mode (one structured call returning StudyMaterials): input and
+# output tokens, cost and latency per learning space.
+#
+# By default the model is simulated: input tokens are estimated from the
+# rendered prompts, output tokens are fixed per schema (--output-tokens) and
+# latency is --base-latency + --latency-per-1k-output * output ktokens.
+# --live calls the configured model (needs GOOGLE_API_KEY) and reports the
+# usage metadata, including input tokens served from the provider cache.
+#
+# Run from the backend directory with:
+#   PYTHONPATH=src python benchmarks/bench_combined_mode.py
+# -----
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="bench-combined-"))
+# measure the calls themselves, without retries, hedging or rate limits
+os.environ.setdefault("RESILIENCE_ENABLED", "false")
+
+from langchain_core.callbacks import get_usage_metadata_callback  # noqa: E402
+from langchain_core.runnables import RunnableLambda  # noqa: E402
+from agents.nodes import node_quiz, node_recommendation, node_mindmap  # noqa: E402
+from agents.nodes import node_study_materials  # noqa: E402
+from agents.output_structures import (  # noqa: E402
+    MindMapStructure, QuizOutput, RecommendationList, StudyMaterials)
+from agents.state import SummaryNotes  # noqa: E402
+
+NODES = {
+    "quiz": (node_quiz, QuizOutput),
+    "recommendations": (node_recommendation, RecommendationList),
+    "mindmap": (node_mindmap, MindMapStructure),
+}
+
+SUMMARY = " ".join(
+    ["Photosynthesis converts light energy into chemical energy stored in glucose."] * 60)
+
+STATE = {
+    "learning_space_id": 0,
+    "student_profile": {"grade_level": "10", "language": "english", "gender": "female"},
+    "summary_notes": SummaryNotes(title="Photosynthesis", summary=SUMMARY),
+}
+
+
+def fake_output(schema):
+    question = {"question": "Q?", "options": {"A": "a", "B": "b", "C": "c", "D": "d"},
+                "correctAnswer": "A", "hint": "h", "explaination": "e"}
+    quiz = {"title": "Quiz", "questions": [question] * 10}
+    recommendations = {"recommendations": [
+        {"title": "Book", "description": "d", "url": "https://example.com"}] * 10}
+    mindmap = {"central_node": "a", "nodes": [{"id": "a", "label": "A"}], "edges": []}
+    data = {
+        QuizOutput: quiz,
+        RecommendationList: recommendations,
+        MindMapStructure: mindmap,
+        StudyMaterials: {"quiz": quiz, "recommendations": recommendations, "mindmap": mindmap},
+    }[schema]
+    return schema(**data)
+
+
+class SimulatedModels:
+    """get_structured_model replacement that records estimated usage"""
+
+    def __init__(self, args):
+        self.args = args
+        self.output_tokens = {
+            QuizOutput: args.output_tokens[0],
+            RecommendationList: args.output_tokens[1],
+            MindMapStructure: args.output_tokens[2],
+        }
+        self.output_tokens[StudyMaterials] = sum(args.output_tokens)
+        self.usage = []
+
+    def __call__(self, schema, model=None, temperature=None):
+        def call(prompt):
+            input_tokens = len(prompt.to_string()) // 4
+            output_tokens = self.output_tokens[schema]
+            time.sleep(self.args.base_latency
+                       + self.args.latency_per_1k_output * output_tokens / 1000)
+            self.usage.append({"input_tokens": input_tokens, "output_tokens": output_tokens,
+                               "cache_read": 0})
+            return fake_output(schema)
+        return RunnableLambda(call)
+
+
+def run_fan_out():
+    with ThreadPoolExecutor(max_workers=len(NODES)) as executor:
+        futures = [executor.submit(lambda m=module: m._build_chain().invoke(m._chain_input(STATE)))
+                   for module, _ in NODES.values()]
+        for future in futures:
+            future.result()
+
+
+def run_combined():
+    node_study_materials._build_chain().invoke(node_study_materials._chain_input(STATE))
+
+
+def measure(label, run, iterations, usage_source, prices):
+    latencies = []
+    totals = {"input_tokens": 0, "output_tokens": 0, "cache_read": 0}
+    for _ in range(iterations):
+        start = time.perf_counter()
+        for usage in usage_source(run):
+            for key in totals:
+                totals[key] += usage.get(key, 0)
+        latencies.append(time.perf_counter() - start)
+
+    per_run = {key: value / iterations for key, value in totals.items()}
+    uncached = per_run["input_tokens"] - per_run["cache_read"]
+    cost = (uncached * prices[0] + per_run["cache_read"] * prices[2]
+            + per_run["output_tokens"] * prices[1]) / 1e6
+    print(f"{label:<10} input {per_run['input_tokens']:8.0f}  cached {per_run['cache_read']:7.0f}  "
+          f"output {per_run['output_tokens']:7.0f}  cost ${cost:.5f}  "
+          f"latency p50 {statistics.median(latencies):6.2f}s  max {max(latencies):6.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--live", action="store_true")
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--base-latency", type=float, default=1.5)
+    parser.add_argument("--latency-per-1k-output", type=float, default=4.0)
+    parser.add_argument("--output-tokens", type=lambda v: [int(x) for x in v.split(",")],
+                        default=[2500, 900, 700], help="quiz,recommendations,mindmap")
+    parser.add_argument("--prices", type=lambda v: [float(x) for x in v.split(",")],
+                        default=[0.30, 2.50, 0.075],
+                        help="USD per 1M input, output and cached input tokens")
+    args = parser.parse_args()
+
+    if args.live:
+        def usage_source(run):
+            with get_usage_metadata_callback() as callback:
+                run()
+            for usage in callback.usage_metadata.values():
+                details = usage.get("input_token_details") or {}
+                yield {"input_tokens": usage.get("input_tokens", 0),
+                       "output_tokens": usage.get("output_tokens", 0),
+                       "cache_read": details.get("cache_read", 0)}
+    else:
+        models = SimulatedModels(args)
+        for module in [node_quiz, node_recommendation, node_mindmap, node_study_materials]:
+            module.get_structured_model = models
+
+        def usage_source(run):
+            models.usage.clear()
+            run()
+            yield from list(models.usage)
+
+    measure("fan-out", run_fan_out, args.iterations, usage_source, args.prices)
+    measure("combined", run_combined, args.iterations, usage_source, args.prices)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+# -----
+# Per-request graph setup overhead: building and compiling AgentGraphWorkflow
+# for every request versus reusing the compiled graph from the registry.
+#
+# Run from the backend directory with: PYTHONPATH=src python benchmarks/bench_graph_setup.py
+# -----
+
+import argparse
+import statistics
+import time
+from agents.graph import AgentGraphWorkflow
+from agents.registry import graph_registry
+
+
+def measure(label: str, setup, iterations: int):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        setup()
+        samples.append((time.perf_counter() - start) * 1000)
+
+    samples.sort()
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"{label:<28} mean {statistics.mean(samples):8.3f} ms   "
+          f"p50 {statistics.median(samples):8.3f} ms   p95 {p95:8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    measure("before: new graph/request", AgentGraphWorkflow, args.iterations)
+
+    graph_registry.warm_up()
+    measure("after: registry lookup", graph_registry.get, args.iterations)
+
+
+if __name__ == "__main__":
+    main()
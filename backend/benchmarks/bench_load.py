@@ -0,0 +1,305 @@
+# -----
+# Offline load test of the workflow with fake models and an in-memory
+# supabase_service (benchmarks/fakes.py): throughput, p50/p95/p99 latency
+# and memory, at a given concurrency.
+#
+#   --target workflow  invoke_agent_workflow (or the async version with
+#                      --async) for every request, concurrently
+#   --target api       POST /invoke through the FastAPI router, with
+#                      --workers in-process workers running the queued jobs;
+#                      reports the enqueue latency and the end-to-end latency
+#
+# Results are saved as JSON under --results-dir; --compare prints the change
+# against an earlier result file.
+#
+# Run from the backend directory with:
+#   PYTHONPATH=src python benchmarks/bench_load.py --requests 200 --concurrency 20
+# -----
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="bench-load-"))
+os.environ.setdefault("STORAGE_BACKEND", "services.storage.LocalStorageBackend")
+os.environ.setdefault("TTS_ENABLED", "false")
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import fakes  # noqa: E402
+
+
+def percentile(samples, percent: float) -> float:
+    samples = sorted(samples)
+    index = min(int(len(samples) * percent / 100), len(samples) - 1)
+    return samples[index]
+
+
+def summarize(latencies, errors: int, elapsed: float):
+    if not latencies:
+        return {"requests": errors, "errors": errors}
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "throughput": len(latencies) / elapsed,
+        "mean": statistics.mean(latencies),
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "max": max(latencies),
+    }
+
+
+# ------- Workflow --------
+
+def run_workflow(args):
+    from services.agent_workflow import invoke_agent_workflow
+
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(index: int):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            invoke_agent_workflow(index, uuid.UUID(int=index + 1))
+        except Exception as e:
+            with lock:
+                errors += 1
+            print(f"request {index} failed: {e}", file=sys.stderr)
+            return
+        with lock:
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(one, range(args.requests)))
+    return {"workflow": summarize(latencies, errors, time.perf_counter() - start)}
+
+
+def arun_workflow(args):
+    from services.agent_workflow import ainvoke_agent_workflow
+
+    async def main():
+        semaphore = asyncio.Semaphore(args.concurrency)
+        latencies = []
+        errors = 0
+
+        async def one(index: int):
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    await ainvoke_agent_workflow(index, uuid.UUID(int=index + 1))
+                except Exception as e:
+                    errors += 1
+                    print(f"request {index} failed: {e}", file=sys.stderr)
+                    return
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(index) for index in range(args.requests)))
+        return {"workflow": summarize(latencies, errors, time.perf_counter() - start)}
+
+    return asyncio.run(main())
+
+
+# ------- API --------
+
+def _worker_loop(worker_id: str, stop: threading.Event):
+    import config
+    from jobs.queue import get_job_queue
+    from jobs.worker import execute_job
+
+    queue = get_job_queue()
+    while not stop.is_set():
+        job = queue.claim(worker_id, config.JOB_TENANT_CONCURRENCY, config.JOB_LEASE_SECONDS)
+        if job is None:
+            time.sleep(0.01)
+            continue
+        execute_job(queue, job, worker_id)
+
+
+def run_api(args):
+    import httpx
+    from fastapi import FastAPI
+    from api.routes.workflow import router
+    from jobs.backends import JobStatus
+    from jobs.queue import get_job_queue
+
+    app = FastAPI()
+    app.include_router(router)
+    queue = get_job_queue()
+
+    stop = threading.Event()
+    workers = [threading.Thread(target=_worker_loop, args=(f"bench-{i}", stop), daemon=True)
+               for i in range(args.workers)]
+    for worker in workers:
+        worker.start()
+
+    async def main():
+        semaphore = asyncio.Semaphore(args.concurrency)
+        enqueue_latencies, latencies = [], []
+        errors = 0
+        transport = httpx.ASGITransport(app=app)
+
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            async def one(index: int):
+                nonlocal errors
+                async with semaphore:
+                    start = time.perf_counter()
+                    response = await client.post("/invoke", json={
+                        "learning_space_id": index, "user_id": str(uuid.UUID(int=index + 1))})
+                    enqueue_latencies.append(time.perf_counter() - start)
+                    if response.status_code != 200:
+                        errors += 1
+                        return
+                    job_id = response.json()["workflow_id"]
+
+                while True:
+                    job = await asyncio.to_thread(queue.get, job_id)
+                    if job.status in (JobStatus.DONE, JobStatus.FAILED):
+                        break
+                    await asyncio.sleep(0.02)
+                if job.status == JobStatus.FAILED:
+                    errors += 1
+                else:
+                    latencies.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            await asyncio.gather(*(one(index) for index in range(args.requests)))
+            elapsed = time.perf_counter() - start
+
+        return {"enqueue": summarize(enqueue_latencies, 0, elapsed),
+                "end_to_end": summarize(latencies, errors, elapsed)}
+
+    try:
+        return asyncio.run(main())
+    finally:
+        stop.set()
+        for worker in workers:
+            worker.join()
+
+
+# ------- Results --------
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def print_results(results):
+    for name, summary in results.items():
+        if "throughput" not in summary:
+            print(f"{name:<11} all {summary['requests']} requests failed")
+            continue
+        print(f"{name:<11} {summary['requests']:5d} req  {summary['errors']:3d} err  "
+              f"{summary['throughput']:7.2f} req/s  p50 {summary['p50']:7.3f}s  "
+              f"p95 {summary['p95']:7.3f}s  p99 {summary['p99']:7.3f}s")
+
+
+def compare(current, path: str):
+    with open(path) as f:
+        previous = json.load(f)
+    print(f"\nchange against {path} ({previous.get('commit')}, {previous.get('label')})")
+    for name, summary in current["results"].items():
+        before = previous["results"].get(name)
+        if not before or "throughput" not in before or "throughput" not in summary:
+            continue
+        changes = "  ".join(
+            f"{key} {100 * (summary[key] - before[key]) / before[key]:+6.1f}%"
+            for key in ["throughput", "p50", "p95", "p99"] if before[key])
+        print(f"{name:<11} {changes}")
+    peak, before_peak = current["memory"]["peak_rss_mb"], previous["memory"]["peak_rss_mb"]
+    print(f"{'memory':<11} peak rss {peak:.0f} MB (was {before_peak:.0f} MB)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--target", choices=["workflow", "api"], default="workflow")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="ainvoke_agent_workflow for the workflow target")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=4, help="job workers for the api target")
+    parser.add_argument("--graph-version", default="v1")
+    parser.add_argument("--latency", default="lognormal:1.0,0.3",
+                        help="seconds per model call: fixed:S, uniform:A,B or lognormal:MEDIAN,SIGMA")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--caches", action="store_true",
+                        help="keep the artifact, semantic and mindmap caches enabled")
+    parser.add_argument("--tracemalloc", action="store_true",
+                        help="also report the peak of Python allocations (slower)")
+    parser.add_argument("--label", default="")
+    parser.add_argument("--results-dir", default=os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "results"))
+    parser.add_argument("--compare", help="earlier result file to compare with")
+    args = parser.parse_args()
+
+    os.environ["GRAPH_VERSION"] = args.graph_version
+    if not args.caches:
+        for name in ["ARTIFACT_CACHE_ENABLED", "SEMANTIC_CACHE_ENABLED", "MINDMAP_CACHE_ENABLED"]:
+            os.environ[name] = "false"
+    supabase_service, models = fakes.install(fakes.Latency(args.latency, args.seed))
+
+    from agents.registry import graph_registry
+
+    graph_registry.get()
+    if args.tracemalloc:
+        tracemalloc.start()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    if args.target == "api":
+        results = run_api(args)
+    elif args.use_async:
+        results = arun_workflow(args)
+    else:
+        results = run_workflow(args)
+
+    memory = {"peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+              "start_rss_mb": rss_before}
+    if args.tracemalloc:
+        memory["peak_python_mb"] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+
+    result = {
+        "label": args.label,
+        "commit": _git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "args": vars(args),
+        "results": results,
+        "memory": memory,
+        "model_calls": models.calls,
+        "learning_space_updates": supabase_service.updates,
+    }
+    print_results(results)
+    print(f"memory      peak rss {memory['peak_rss_mb']:.0f} MB, {models.calls} model calls, "
+          f"{supabase_service.updates} learning space updates")
+
+    os.makedirs(args.results_dir, exist_ok=True)
+    name = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{args.target}"
+    path = os.path.join(args.results_dir, f"{name}{'-' + args.label if args.label else ''}.json")
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"saved {path}")
+
+    if args.compare:
+        compare(result, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# -----
+# Summary latency versus document size: one call over the whole document
+# compared with map-reduce (parallel chunk notes, then one reduce call).
+#
+# By default the model is simulated with a latency of
+# --base-latency + --latency-per-1k * (input kchars) so the orchestration can be
+# compared offline; --live calls the configured model instead (needs
+# GOOGLE_API_KEY) and reports real latencies.
+#
+# Run from the backend directory with:
+#   PYTHONPATH=src python benchmarks/bench_summary_mapreduce.py
+# -----
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="bench-mapreduce-"))
+
+from langchain_core.runnables import RunnableLambda  # noqa: E402
+import config  # noqa: E402
+from agents import mapreduce  # noqa: E402
+from agents.models import get_chat_model  # noqa: E402
+from services.ingestion import split_text  # noqa: E402
+
+WORDS = ("cell energy light chlorophyll glucose oxygen carbon reaction plant "
+         "leaf water enzyme membrane structure process cycle stage product").split()
+
+
+def make_document(chars: int) -> str:
+    paragraphs = []
+    size = 0
+    while size < chars:
+        paragraph = " ".join(random.choices(WORDS, k=120)) + "."
+        paragraphs.append(paragraph)
+        size += len(paragraph) + 2
+    return "\n\n".join(paragraphs)[:chars]
+
+
+def simulated_model(base_latency: float, latency_per_1k: float, output_ratio: float):
+    def call(value):
+        # invoked with a prompt string, or with the map chain input
+        text = value["chunk"] if isinstance(value, dict) else str(value)
+        time.sleep(base_latency + latency_per_1k * len(text) / 1000)
+        return text[:max(int(len(text) * output_ratio), 200)]
+    return RunnableLambda(call)
+
+
+def single_call(model, document: str):
+    return model.invoke(f"Summarise:\n\n{document}")
+
+
+def map_reduce(model, document: str):
+    chunks = split_text(document, config.INGEST_CHUNK_CHARS, config.INGEST_CHUNK_OVERLAP)
+    notes = mapreduce.map_chunks(chunks)
+    return model.invoke("Summarise:\n\n" + "\n\n".join(notes))
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="20000,60000,150000,400000,1000000",
+                        help="comma separated document sizes in characters")
+    parser.add_argument("--live", action="store_true")
+    parser.add_argument("--base-latency", type=float, default=1.0)
+    parser.add_argument("--latency-per-1k", type=float, default=0.05)
+    parser.add_argument("--output-ratio", type=float, default=0.2)
+    args = parser.parse_args()
+
+    if args.live:
+        model = get_chat_model(config.LLM_MODEL, 0)
+    else:
+        model = simulated_model(args.base_latency, args.latency_per_1k, args.output_ratio)
+        mapreduce._chain = lambda: model
+
+    print(f"{'chars':>10} {'chunks':>7} {'single':>9} {'map-reduce':>11} {'re-run (cached map)':>20}")
+    for size in (int(value) for value in args.sizes.split(",")):
+        document = make_document(size)
+        chunks = len(split_text(document, config.INGEST_CHUNK_CHARS, config.INGEST_CHUNK_OVERLAP))
+
+        single = timed(single_call, model, document)
+        cold = timed(map_reduce, model, document)
+        warm = timed(map_reduce, model, document)
+        print(f"{size:>10} {chunks:>7} {single:>8.2f}s {cold:>10.2f}s {warm:>19.2f}s")
+
+
+if __name__ == "__main__":
+    main()
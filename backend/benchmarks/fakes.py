@@ -0,0 +1,227 @@
+# -----
+# Deterministic stand-ins for the external services, for offline benchmarks:
+# an in-memory supabase_service and fake chat models that return schema
+# valid outputs after a configurable latency.
+#
+# install() has to run before the agent modules are imported, since the
+# nodes bind the model getters and supabase_service at import time.
+# -----
+
+import asyncio
+import copy
+import random
+import sys
+import threading
+import time
+import types
+import typing
+import uuid
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableGenerator, RunnableLambda
+from pydantic import BaseModel
+
+SECTION = ("## {title}\n\n- {title} explained with a simple example.\n"
+           "- A second point about {title}, with an analogy.\n\n")
+
+
+class FakeSupabaseService:
+    """The supabase_service calls used by the backend, on dicts in memory"""
+
+    def __init__(self, topics=None):
+        self.topics = topics or ["Photosynthesis"]
+        self.learning_spaces = {}
+        self.updates = 0
+        self.files = {}
+        self.content_types = {}
+        self._lock = threading.Lock()
+
+    def get_student_profile(self, user_id):
+        return {"id": str(user_id), "gender": "female", "grade_level": "10",
+                "language": "english"}
+
+    def get_learning_space(self, learning_space_id: int):
+        with self._lock:
+            if learning_space_id not in self.learning_spaces:
+                topic = self.topics[learning_space_id % len(self.topics)]
+                self.learning_spaces[learning_space_id] = {
+                    "id": learning_space_id, "topic": f"{topic} {learning_space_id}",
+                    "pdf_source": None}
+            return copy.deepcopy(self.learning_spaces[learning_space_id])
+
+    def update_learning_space(self, learning_space_id: int, data: dict):
+        with self._lock:
+            self.updates += 1
+            row = self.learning_spaces.setdefault(learning_space_id, {"id": learning_space_id})
+            row.update(copy.deepcopy(data))
+            return [row]
+
+    def upload_file(self, filename: str, file_bytes: bytes, content_type=None):
+        with self._lock:
+            self.files[filename] = len(file_bytes)
+            self.content_types[filename] = content_type
+        return filename
+
+    def get_public_url(self, filename: str):
+        return f"https://storage.invalid/{filename}"
+
+
+class Latency:
+    """
+    Seconds per call drawn from a spec: "0", "fixed:1.5", "uniform:0.5,2"
+    or "lognormal:1.5,0.4" (median and sigma). Seeded, so runs repeat.
+    """
+
+    def __init__(self, spec: str, seed: int = 0):
+        kind, _, values = spec.partition(":") if ":" in spec else ("fixed", "", spec)
+        self.kind = kind
+        self.values = [float(value) for value in values.split(",")]
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self) -> float:
+        with self._lock:
+            if self.kind == "fixed":
+                return self.values[0]
+            if self.kind == "uniform":
+                return self._random.uniform(*self.values)
+            if self.kind == "lognormal":
+                median, sigma = self.values
+                return median * self._random.lognormvariate(0, sigma)
+        raise ValueError(f"Unknown latency distribution: {self.kind}")
+
+
+def _fake_mindmap(schema):
+    nodes = [{"id": "root", "label": "Topic"}]
+    edges = []
+    for i in range(4):
+        nodes.append({"id": f"n{i}", "label": f"Idea {i}"})
+        edges.append({"source": "root", "target": f"n{i}"})
+        for j in range(2):
+            nodes.append({"id": f"n{i}_{j}", "label": f"Detail {i}.{j}"})
+            edges.append({"source": f"n{i}", "target": f"n{i}_{j}"})
+    return schema(central_node="root", nodes=nodes, edges=edges)
+
+
+def _fake_value(annotation, name: str, list_items: int):
+    origin = typing.get_origin(annotation)
+    if origin is typing.Union:
+        options = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        return _fake_value(options[0], name, list_items)
+    if origin in (list, typing.List):
+        (item,) = typing.get_args(annotation)
+        return [_fake_value(item, name, list_items) for _ in range(list_items)]
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return fake_output(annotation, list_items)
+    if annotation is int:
+        return 1
+    if annotation is float:
+        return 1.0
+    if annotation is bool:
+        return True
+    if name == "summary":
+        return "".join(SECTION.format(title=f"Section {i}") for i in range(6))
+    if name == "script":
+        return " ".join(f"This is sentence {i} of the overview." for i in range(20))
+    if name == "url":
+        return "https://example.com/resource"
+    if name == "correctAnswer":
+        return "A"
+    return f"Fake {name}"
+
+
+def fake_output(schema, list_items: int = 5):
+    """A valid instance of a pydantic output structure"""
+    if schema.__name__ == "MindMapStructure":
+        return _fake_mindmap(schema)
+    return schema(**{name: _fake_value(field.annotation, name, list_items)
+                     for name, field in schema.model_fields.items()})
+
+
+class FakeModels:
+    """Replacements for the model getters of agents.models"""
+
+    def __init__(self, latency: Latency, list_items: int = 5, stream_chunks: int = 20):
+        self.latency = latency
+        self.list_items = list_items
+        self.stream_chunks = stream_chunks
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _count(self) -> float:
+        with self._lock:
+            self.calls += 1
+        return self.latency.sample()
+
+    def get_structured_model(self, schema, model=None, temperature=None):
+        def call(value):
+            time.sleep(self._count())
+            return fake_output(schema, self.list_items)
+
+        async def acall(value):
+            await asyncio.sleep(self._count())
+            return fake_output(schema, self.list_items)
+
+        return RunnableLambda(call, afunc=acall)
+
+    def get_streaming_model(self, schema, model=None, temperature=None):
+        def partials():
+            output = fake_output(schema, self.list_items).model_dump()
+            summary = output.get("summary", "")
+            for i in range(1, self.stream_chunks + 1):
+                yield {**output, "summary": summary[:len(summary) * i // self.stream_chunks]}
+
+        def transform(inputs):
+            for _ in inputs:
+                pass
+            delay = self._count() / self.stream_chunks
+            for partial in partials():
+                time.sleep(delay)
+                yield partial
+
+        async def atransform(inputs):
+            async for _ in inputs:
+                pass
+            delay = self._count() / self.stream_chunks
+            for partial in partials():
+                await asyncio.sleep(delay)
+                yield partial
+
+        return RunnableGenerator(transform, atransform)
+
+    def get_chat_model(self, model=None, temperature=None):
+        def message():
+            return AIMessage(content="Notes on the chunk.\n\n- point one\n- point two",
+                             id=str(uuid.uuid4()))
+
+        def call(value):
+            time.sleep(self._count())
+            return message()
+
+        async def acall(value):
+            await asyncio.sleep(self._count())
+            return message()
+
+        return RunnableLambda(call, afunc=acall)
+
+    def get_embeddings(self, model=None):
+        return DeterministicFakeEmbedding(size=256)
+
+
+def install(latency: Latency, topics=None, **model_options):
+    """
+    Inject the in-memory supabase_service and the fake models. Returns
+    (supabase_service, models) so a benchmark can inspect what was called.
+    """
+    supabase_service = FakeSupabaseService(topics)
+    module = types.ModuleType("services.supabase_service")
+    module.supabase_service = supabase_service
+    sys.modules["services.supabase_service"] = module
+
+    from agents import models as agent_models
+
+    models = FakeModels(latency, **model_options)
+    for name in ["get_structured_model", "get_streaming_model", "get_chat_model",
+                 "get_embeddings"]:
+        setattr(agent_models, name, getattr(models, name))
+    return supabase_service, models
@@ -0,0 +1,297 @@
+# -----
+# Checkpoints of graph runs, so a retried run resumes from the nodes that had
+# not finished instead of starting over
+# -----
+
+import asyncio
+import importlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional, Sequence
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP, BaseCheckpointSaver, ChannelVersions, Checkpoint,
+    CheckpointMetadata, CheckpointTuple, get_checkpoint_id, get_checkpoint_metadata)
+from langgraph.checkpoint.memory import InMemorySaver
+import config
+
+
+class SQLiteCheckpointSaver(BaseCheckpointSaver):
+    """
+    Checkpoints stored in a local SQLite file. Only the latest checkpoint of
+    a thread and the writes of its running step are kept, which is all a run
+    needs to resume; threads not updated for ttl_seconds and the least
+    recently updated ones beyond max_threads are dropped. Pruning runs every
+    prune_every checkpoints of a process rather than on each one.
+    """
+
+    prune_every = 100
+
+    def __init__(self, path: str, ttl_seconds: float, max_threads: int):
+        super().__init__()
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_threads = max_threads
+        self._puts = 0
+        self._puts_lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._create_schema()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+        finally:
+            conn.close()
+
+    def _create_schema(self):
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS checkpoints (
+                    thread_id TEXT NOT NULL,
+                    checkpoint_ns TEXT NOT NULL,
+                    checkpoint_id TEXT NOT NULL,
+                    parent_checkpoint_id TEXT,
+                    type TEXT NOT NULL,
+                    checkpoint BLOB NOT NULL,
+                    metadata_type TEXT NOT NULL,
+                    metadata BLOB NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (thread_id, checkpoint_ns)
+                );
+                CREATE INDEX IF NOT EXISTS idx_checkpoints_updated_at
+                    ON checkpoints (updated_at);
+                CREATE TABLE IF NOT EXISTS writes (
+                    thread_id TEXT NOT NULL,
+                    checkpoint_ns TEXT NOT NULL,
+                    checkpoint_id TEXT NOT NULL,
+                    task_id TEXT NOT NULL,
+                    idx INTEGER NOT NULL,
+                    channel TEXT NOT NULL,
+                    type TEXT NOT NULL,
+                    value BLOB NOT NULL,
+                    task_path TEXT NOT NULL,
+                    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+                );
+            """)
+
+    def _to_tuple(self, conn, row) -> CheckpointTuple:
+        (thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id,
+         checkpoint_type, checkpoint, metadata_type, metadata) = row
+        writes = conn.execute(
+            """SELECT task_id, channel, type, value FROM writes
+               WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?
+               ORDER BY task_id, idx""",
+            (thread_id, checkpoint_ns, checkpoint_id)).fetchall()
+
+        def checkpoint_config(checkpoint_id):
+            return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                     "checkpoint_id": checkpoint_id}}
+
+        return CheckpointTuple(
+            config=checkpoint_config(checkpoint_id),
+            checkpoint=self.serde.loads_typed((checkpoint_type, checkpoint)),
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            parent_config=(checkpoint_config(parent_checkpoint_id)
+                           if parent_checkpoint_id else None),
+            pending_writes=[(task_id, channel, self.serde.loads_typed((value_type, value)))
+                            for task_id, channel, value_type, value in writes])
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        configurable = config["configurable"]
+        query = """SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id,
+                          type, checkpoint, metadata_type, metadata
+                   FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"""
+        params = [configurable["thread_id"], configurable.get("checkpoint_ns", "")]
+        if checkpoint_id := get_checkpoint_id(config):
+            query += " AND checkpoint_id = ?"
+            params.append(checkpoint_id)
+
+        with self._connect() as conn:
+            row = conn.execute(query, params).fetchone()
+            return self._to_tuple(conn, row) if row is not None else None
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[dict] = None,
+             before: Optional[RunnableConfig] = None,
+             limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        query = """SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id,
+                          type, checkpoint, metadata_type, metadata
+                   FROM checkpoints WHERE 1 = 1"""
+        params = []
+        if config is not None:
+            configurable = config["configurable"]
+            query += " AND thread_id = ?"
+            params.append(configurable["thread_id"])
+            if "checkpoint_ns" in configurable:
+                query += " AND checkpoint_ns = ?"
+                params.append(configurable["checkpoint_ns"])
+            if checkpoint_id := get_checkpoint_id(config):
+                query += " AND checkpoint_id = ?"
+                params.append(checkpoint_id)
+        if before is not None and (before_id := get_checkpoint_id(before)):
+            query += " AND checkpoint_id < ?"
+            params.append(before_id)
+        query += " ORDER BY checkpoint_id DESC"
+
+        with self._connect() as conn:
+            rows = conn.execute(query, params).fetchall()
+            result = []
+            for row in rows:
+                checkpoint = self._to_tuple(conn, row)
+                if filter and any(checkpoint.metadata.get(key) != value
+                                  for key, value in filter.items()):
+                    continue
+                result.append(checkpoint)
+                if limit is not None and len(result) >= limit:
+                    break
+        yield from result
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint,
+            metadata: CheckpointMetadata, new_versions: ChannelVersions) -> RunnableConfig:
+        configurable = config["configurable"]
+        thread_id = configurable["thread_id"]
+        checkpoint_ns = configurable.get("checkpoint_ns", "")
+        checkpoint_type, checkpoint_blob = self.serde.dumps_typed(checkpoint)
+        metadata_type, metadata_blob = self.serde.dumps_typed(
+            get_checkpoint_metadata(config, metadata))
+        now = time.time()
+
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                """INSERT OR REPLACE INTO checkpoints
+                   (thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type,
+                    checkpoint, metadata_type, metadata, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (thread_id, checkpoint_ns, checkpoint["id"], get_checkpoint_id(config),
+                 checkpoint_type, checkpoint_blob, metadata_type, metadata_blob, now))
+            # the writes of earlier steps are part of this checkpoint now
+            conn.execute(
+                """DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ?
+                                        AND checkpoint_id < ?""",
+                (thread_id, checkpoint_ns, checkpoint["id"]))
+            if self._due_for_pruning():
+                self._prune(conn, now)
+            conn.execute("COMMIT")
+
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                 "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]],
+                   task_id: str, task_path: str = "") -> None:
+        configurable = config["configurable"]
+        # special writes (errors, interrupts) replace earlier ones, regular
+        # writes of a task are saved once
+        rows = {"REPLACE": [], "IGNORE": []}
+        for idx, (channel, value) in enumerate(writes):
+            value_type, value_blob = self.serde.dumps_typed(value)
+            rows["REPLACE" if channel in WRITES_IDX_MAP else "IGNORE"].append(
+                (configurable["thread_id"], configurable.get("checkpoint_ns", ""),
+                 configurable["checkpoint_id"], task_id, WRITES_IDX_MAP.get(channel, idx),
+                 channel, value_type, value_blob, task_path))
+        with self._connect() as conn:
+            for verb, verb_rows in rows.items():
+                conn.executemany(
+                    f"""INSERT OR {verb} INTO writes
+                        (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel,
+                         type, value, task_path)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    verb_rows)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+            conn.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+            conn.execute("COMMIT")
+
+    def _due_for_pruning(self) -> bool:
+        with self._puts_lock:
+            self._puts += 1
+            return (self._puts - 1) % self.prune_every == 0
+
+    def _prune(self, conn, now: float):
+        # both selects walk the updated_at index from the oldest thread:
+        # runs that failed for good and were never retried, then the
+        # threads beyond max_threads
+        stale = conn.execute(
+            "SELECT thread_id FROM checkpoints WHERE updated_at < ?",
+            (now - self.ttl_seconds,)).fetchall()
+        excess = conn.execute("SELECT COUNT(*) FROM checkpoints").fetchone()[0] \
+            - len(stale) - self.max_threads
+        if excess > 0:
+            stale += conn.execute(
+                """SELECT thread_id FROM checkpoints WHERE updated_at >= ?
+                   ORDER BY updated_at LIMIT ?""",
+                (now - self.ttl_seconds, excess)).fetchall()
+        for (thread_id,) in set(stale):
+            conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+            conn.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+
+    # the async graph calls these from the event loop
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[dict] = None,
+                    before: Optional[RunnableConfig] = None, limit: Optional[int] = None):
+        checkpoints = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for checkpoint in checkpoints:
+            yield checkpoint
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint,
+                   metadata: CheckpointMetadata, new_versions: ChannelVersions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]],
+                          task_id: str, task_path: str = "") -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+def _sqlite_saver():
+    return SQLiteCheckpointSaver(
+        config.CHECKPOINT_PATH, ttl_seconds=config.CHECKPOINT_TTL,
+        max_threads=config.CHECKPOINT_MAX_THREADS)
+
+
+_SAVERS = {
+    "sqlite": _sqlite_saver,
+    # this process only, a restarted worker starts its runs over
+    "memory": InMemorySaver,
+}
+
+_saver = None
+_saver_lock = threading.Lock()
+
+
+def get_checkpointer() -> Optional[BaseCheckpointSaver]:
+    """The process-wide checkpoint saver configured by CHECKPOINT_BACKEND, None when disabled"""
+    global _saver
+    if config.CHECKPOINT_BACKEND == "none":
+        return None
+    if _saver is None:
+        with _saver_lock:
+            if _saver is None:
+                name = config.CHECKPOINT_BACKEND
+                if name in _SAVERS:
+                    _saver = _SAVERS[name]()
+                else:
+                    module_name, class_name = name.rsplit(".", 1)
+                    _saver = getattr(importlib.import_module(module_name), class_name)()
+    return _saver
+
+
+def thread_id(learning_space_id: int, run_id: int, graph_version: str) -> str:
+    """A retry of a run resumes its checkpoint, unless the graph changed in between"""
+    return f"{learning_space_id}:{run_id}:{graph_version}"
@@ -2,20 +2,72 @@
 # This file contains the agent workflow graph created using LangGraph
 # ------
 
+from typing import Iterable, Optional
+from langchain_core.runnables import RunnableLambda
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.graph import StateGraph, START, END
+from langgraph.types import Command
 from agents.state import AgentState
 # from .state import AgentState
-from agents.nodes.node_summarise import run_node_summary_notes
-from agents.nodes.node_quiz import run_node_quiz
-from agents.nodes.node_mindmap import run_node_mindmap
-from agents.nodes.node_recommendation import run_node_recommendation
-from agents.nodes.node_audio_summary import run_node_audio_overview
+from agents.nodes.node_summarise import (
+    run_node_summary_notes, arun_node_summary_notes,
+    run_node_summary_draft, arun_node_summary_draft,
+    run_node_summary_complete, arun_node_summary_complete)
+from agents.nodes.node_quiz import run_node_quiz, arun_node_quiz
+from agents.nodes.node_mindmap import run_node_mindmap, arun_node_mindmap
+from agents.nodes.node_recommendation import run_node_recommendation, arun_node_recommendation
+from agents.nodes.node_study_materials import (
+    run_node_study_materials, arun_node_study_materials)
+from agents.nodes.node_audio_summary import (
+    run_node_audio_overview, arun_node_audio_overview, run_node_tts, arun_node_tts)
+from agents.tracking import track_node, atrack_node
+from agents.resilience import NodesDegraded, degrade_node, adegrade_node
+import config
 
 
 class AgentGraphWorkflow:
 
-    def __init__(self):
+    # nodes that run in parallel once the summary notes are available
+    BRANCHES = ["node_quiz", "node_recommendations",
+                "node_mindmap", "node_audio_overview"]
+    # nodes a run cannot do without, never degraded: node_summary_complete
+    # writes the full summary the draft was cut from
+    REQUIRED = ["node_summary_notes", "node_summary_complete"]
+    # combined mode: quiz, recommendations and mindmap in one call
+    COMBINED_BRANCHES = ["node_study_materials", "node_audio_overview"]
+    # node -> nodes whose output it reads
+    DEPENDENCIES = {
+        "node_summary_notes": [],
+        "node_summary_complete": ["node_summary_notes"],
+        "node_quiz": ["node_summary_notes"],
+        "node_recommendations": ["node_summary_notes"],
+        "node_mindmap": ["node_summary_notes"],
+        "node_study_materials": ["node_summary_notes"],
+        "node_audio_overview": ["node_summary_notes"],
+        "node_tts": ["node_audio_overview"],
+    }
+
+    def __init__(self, stream_summary: bool = False, combined: bool = False,
+                 include: Optional[Iterable[str]] = None,
+                 checkpointer: Optional[BaseCheckpointSaver] = None):
+        """
+        With stream_summary the summary is streamed: the branches start from
+        a partial summary while node_summary_complete finishes it.
+        With combined one structured call replaces the quiz, recommendations
+        and mindmap nodes.
+        With include only these nodes are added (selective regeneration); the
+        outputs of the nodes left out have to be in the input state.
+        With a checkpointer, runs invoked with a thread_id save a checkpoint
+        after every step and a failed run can be resumed.
+        """
         self.workflow = None
+        self.resumable_workflow = None
+        self.checkpointer = checkpointer
+        self.stream_summary = stream_summary
+        self.combined = combined
+        self.include = set(include) if include is not None else None
+        self.branches = self.COMBINED_BRANCHES if combined else self.BRANCHES
+        self.nodes = self._node_functions()
 
         # init the graph
         self.graph = StateGraph(AgentState)
@@ -27,36 +79,149 @@ class AgentGraphWorkflow:
         # compile the graph
         self._compile()
 
+    def _node_functions(self):
+        """node name -> (sync function, async function)"""
+        if self.stream_summary:
+            nodes = {
+                "node_summary_notes": (run_node_summary_draft, arun_node_summary_draft),
+                "node_summary_complete": (run_node_summary_complete, arun_node_summary_complete),
+            }
+        else:
+            nodes = {
+                "node_summary_notes": (run_node_summary_notes, arun_node_summary_notes),
+            }
+
+        if self.combined:
+            nodes["node_study_materials"] = (run_node_study_materials, arun_node_study_materials)
+        else:
+            nodes.update({
+                "node_quiz": (run_node_quiz, arun_node_quiz),
+                "node_recommendations": (run_node_recommendation, arun_node_recommendation),
+                "node_mindmap": (run_node_mindmap, arun_node_mindmap),
+            })
+        nodes["node_audio_overview"] = (run_node_audio_overview, arun_node_audio_overview)
+        if config.TTS_ENABLED:
+            nodes["node_tts"] = (run_node_tts, arun_node_tts)
+        if self.include is not None:
+            unknown = self.include - set(nodes)
+            if unknown:
+                raise ValueError(f"Unknown nodes: {sorted(unknown)}")
+            nodes = {name: functions for name, functions in nodes.items()
+                     if name in self.include}
+        return nodes
+
     def _add_nodes(self):
-        self.graph.add_node(
-            "node_summary_notes", run_node_summary_notes)
-        self.graph.add_node("node_quiz", run_node_quiz)
-        self.graph.add_node(
-            "node_recommendations", run_node_recommendation)
-        self.graph.add_node("node_mindmap", run_node_mindmap)
-        self.graph.add_node(
-            "node_audio_overview", run_node_audio_overview)
+        # each node runs its sync or async function depending on whether the
+        # graph is invoked or ainvoked, and reports progress to the run registry
+        for name, (node_function, anode_function) in self.nodes.items():
+            node_function = track_node(name, node_function)
+            anode_function = atrack_node(name, anode_function)
 
-    def _add_edges_(self):
-        self.graph.add_edge(START, "node_summary_notes")
+            # the branches are optional: a failing branch is recorded and the
+            # others still complete
+            if config.RESILIENCE_DEGRADE and name not in self.REQUIRED:
+                node_function = degrade_node(name, node_function)
+                anode_function = adegrade_node(name, anode_function)
 
-        # parallel agents
-        self.graph.add_edge("node_summary_notes", "node_quiz")
-        self.graph.add_edge("node_summary_notes", "node_recommendations")
-        self.graph.add_edge("node_summary_notes", "node_mindmap")
-        self.graph.add_edge("node_summary_notes", "node_audio_overview")
+            self.graph.add_node(name, RunnableLambda(
+                node_function, afunc=anode_function, name=name))
 
-        self.graph.add_edge("node_quiz", END)
-        self.graph.add_edge("node_recommendations", END)
-        self.graph.add_edge("node_mindmap", END)
-        self.graph.add_edge("node_audio_overview", END)
+    def _add_edges_(self):
+        # every node starts once the nodes it reads from are done: the
+        # branches run in parallel after the summary and the audio script is
+        # synthesised as soon as it is written
+        upstream = set()
+        for name in self.nodes:
+            dependencies = [node for node in self.DEPENDENCIES[name] if node in self.nodes]
+            for dependency in dependencies:
+                self.graph.add_edge(dependency, name)
+            if not dependencies:
+                self.graph.add_edge(START, name)
+            upstream.update(dependencies)
+
+        for name in self.nodes:
+            if name not in upstream:
+                self.graph.add_edge(name, END)
 
     def _compile(self):
         self.workflow = self.graph.compile()
+        if self.checkpointer is not None:
+            self.resumable_workflow = self.graph.compile(checkpointer=self.checkpointer)
+
+    @staticmethod
+    def _thread_config(thread_id: str):
+        return {"configurable": {"thread_id": thread_id}}
 
-    def invoke(self, input_state: AgentState):
+    def checkpoint(self, thread_id: Optional[str]) -> Optional[dict]:
+        """
+        The state saved by an earlier run of thread_id that did not complete,
+        with the outputs of the nodes that finished; None if there is none
+        """
+        if self.resumable_workflow is None or thread_id is None:
+            return None
+        snapshot = self.resumable_workflow.get_state(self._thread_config(thread_id))
+        return snapshot.values if snapshot.created_at is not None else None
+
+    async def acheckpoint(self, thread_id: Optional[str]) -> Optional[dict]:
+        """Async version of checkpoint"""
+        if self.resumable_workflow is None or thread_id is None:
+            return None
+        snapshot = await self.resumable_workflow.aget_state(self._thread_config(thread_id))
+        return snapshot.values if snapshot.created_at is not None else None
+
+    @staticmethod
+    def _resume_input(snapshot):
+        """
+        Input that continues a checkpoint: its pending nodes, or when it
+        finished with degraded nodes those nodes (and the ones after them)
+        """
+        degraded = snapshot.values.get("degraded_nodes", [])
+        if not snapshot.next and degraded:
+            return Command(goto=sorted(set(degraded)))
+        return None
+
+    def _check_degraded(self, final_state: dict, before: int):
+        # degraded nodes of this attempt fail the run and keep its checkpoint
+        degraded = final_state.get("degraded_nodes", [])[before:]
+        if degraded:
+            raise NodesDegraded(degraded)
+
+    def invoke(self, input_state: Optional[AgentState], thread_id: Optional[str] = None):
         """
         Invoke this method to execute this workflow.
+        With a thread_id the run is checkpointed, and an input_state of None
+        resumes the checkpoint of that thread. The checkpoint is deleted once
+        the run completes; a run with degraded nodes raises NodesDegraded
+        instead and its retry reruns them.
         """
-        final_state = self.workflow.invoke(input_state)
+        if self.resumable_workflow is None or thread_id is None:
+            return self.workflow.invoke(input_state)
+
+        thread_config = self._thread_config(thread_id)
+        before = 0
+        if input_state is None:
+            snapshot = self.resumable_workflow.get_state(thread_config)
+            before = len(snapshot.values.get("degraded_nodes", []))
+            input_state = self._resume_input(snapshot)
+        final_state = self.resumable_workflow.invoke(input_state, thread_config)
+        self._check_degraded(final_state, before)
+        self.checkpointer.delete_thread(thread_id)
+        return final_state
+
+    async def ainvoke(self, input_state: Optional[AgentState], thread_id: Optional[str] = None):
+        """
+        Async version of invoke, all nodes run on the calling event loop.
+        """
+        if self.resumable_workflow is None or thread_id is None:
+            return await self.workflow.ainvoke(input_state)
+
+        thread_config = self._thread_config(thread_id)
+        before = 0
+        if input_state is None:
+            snapshot = await self.resumable_workflow.aget_state(thread_config)
+            before = len(snapshot.values.get("degraded_nodes", []))
+            input_state = self._resume_input(snapshot)
+        final_state = await self.resumable_workflow.ainvoke(input_state, thread_config)
+        self._check_degraded(final_state, before)
+        await self.checkpointer.adelete_thread(thread_id)
         return final_state
@@ -0,0 +1,75 @@
+# ------
+# Map step of the map-reduce summarisation of large source documents.
+# Chunk notes do not depend on the student profile, so they are cached and a
+# regeneration for another grade level or language only repeats the reduce.
+# ------
+
+import asyncio
+import contextvars
+import hashlib
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from langchain_core.output_parsers import StrOutputParser
+import config
+from agents.models import get_chat_model
+from agents.prompts import prompt_registry
+from agents.resilience import with_resilience
+from services.cache import DiskCache
+
+logger = logging.getLogger(__name__)
+
+chunk_notes_cache = DiskCache(
+    os.path.join(config.CACHE_DIR, "chunk_notes.sqlite3"),
+    ttl_seconds=config.ARTIFACT_CACHE_TTL,
+    max_entries=config.MAPREDUCE_CACHE_MAX_ENTRIES)
+
+
+def _chain():
+    prompt = prompt_registry.get("map_chunk")
+    return with_resilience(
+        prompt.template | get_chat_model(config.MAPREDUCE_MODEL, 0) | StrOutputParser(), prompt.name,
+        model=config.MAPREDUCE_MODEL)
+
+
+def _cache_key(chunk: str) -> str:
+    key = f"{prompt_registry.get('map_chunk').key}|{config.MAPREDUCE_MODEL}|{chunk}"
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def _summarise_chunk(chunk: str) -> str:
+    key = _cache_key(chunk)
+    notes = chunk_notes_cache.get(key)
+    if notes is None:
+        notes = _chain().invoke({"chunk": chunk})
+        chunk_notes_cache.set(key, notes)
+    return notes
+
+
+async def _asummarise_chunk(chunk: str, semaphore: asyncio.Semaphore) -> str:
+    key = _cache_key(chunk)
+    notes = await asyncio.to_thread(chunk_notes_cache.get, key)
+    if notes is None:
+        async with semaphore:
+            notes = await _chain().ainvoke({"chunk": chunk})
+        await asyncio.to_thread(chunk_notes_cache.set, key, notes)
+    return notes
+
+
+def map_chunks(chunks: List[str]) -> List[str]:
+    """Notes for every chunk, at most MAPREDUCE_CONCURRENCY model calls at a time"""
+    logger.info(f"Summarising {len(chunks)} chunks")
+    with ThreadPoolExecutor(max_workers=config.MAPREDUCE_CONCURRENCY) as executor:
+        # a context copy per chunk keeps the node's usage callback, span and
+        # rate limit priority in the worker threads
+        futures = [executor.submit(contextvars.copy_context().run, _summarise_chunk, chunk)
+                   for chunk in chunks]
+        return [future.result() for future in futures]
+
+
+async def amap_chunks(chunks: List[str]) -> List[str]:
+    """Async version of map_chunks"""
+    logger.info(f"Summarising {len(chunks)} chunks")
+    semaphore = asyncio.Semaphore(config.MAPREDUCE_CONCURRENCY)
+    return await asyncio.gather(*(_asummarise_chunk(chunk, semaphore) for chunk in chunks))
@@ -0,0 +1,255 @@
+# -----
+# In-process mindmap rendering: tree layout of the MindMapStructure output,
+# drawn as SVG (PNG optional through a small pool of renderer processes)
+# -----
+
+import hashlib
+import json
+import logging
+import multiprocessing
+import textwrap
+import threading
+from functools import lru_cache
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from xml.sax.saxutils import escape
+import config
+from services.artifact_cache import normalize_text
+
+logger = logging.getLogger(__name__)
+
+LEVEL_COLORS = [("#FF6B6B", "white"), ("#4ECDC4", "black"), ("#96CEB4", "black")]
+
+FONT_SIZE = 12
+LINE_HEIGHT = 16
+CHAR_WIDTH = 7
+WRAP_CHARS = 22
+PADDING = 12
+NODE_GAP = 24
+LEVEL_GAP = 70
+MARGIN = 20
+
+# bump when the layout or drawing changes so cached images are not reused
+RENDERER_VERSION = "1"
+
+
+def mindmap_tree(mindmap: dict):
+    """
+    Breadth-first tree of the mindmap from its central node.
+    Returns (levels by node id, children by node id, root id). Nodes the
+    edges do not reach are attached to the root so nothing is dropped.
+    """
+    node_ids = [node["id"] for node in mindmap["nodes"]]
+    known = set(node_ids)
+    root = mindmap.get("central_node") or (node_ids[0] if node_ids else "")
+
+    adjacency = {node_id: [] for node_id in node_ids}
+    adjacency.setdefault(root, [])
+    for edge in mindmap["edges"]:
+        if edge["source"] in adjacency and edge["target"] in known:
+            adjacency[edge["source"]].append(edge["target"])
+
+    levels = {root: 0}
+    children = {root: []}
+    queue = deque([root])
+    while queue:
+        parent = queue.popleft()
+        for child in adjacency[parent]:
+            if child not in levels:
+                levels[child] = levels[parent] + 1
+                children[parent].append(child)
+                children[child] = []
+                queue.append(child)
+
+    for node_id in node_ids:
+        if node_id not in levels:
+            levels[node_id] = 1
+            children[root].append(node_id)
+            children[node_id] = []
+
+    return levels, children, root
+
+
+def canonical_mindmap(mindmap: dict) -> dict:
+    """
+    The mindmap structure independent of node ids, ordering and label case
+    or spacing, so that equivalent model outputs compare equal
+    """
+    labels = {node["id"]: normalize_text(node["label"]) for node in mindmap["nodes"]}
+    return {
+        "central": labels.get(mindmap.get("central_node"), ""),
+        "nodes": sorted(labels.values()),
+        "edges": sorted({(labels[edge["source"]], labels[edge["target"]])
+                         for edge in mindmap["edges"]
+                         if edge["source"] in labels and edge["target"] in labels})
+    }
+
+
+def mindmap_hash(mindmap: dict, image_format: str) -> str:
+    key = {"mindmap": canonical_mindmap(mindmap), "format": image_format,
+           "renderer": RENDERER_VERSION}
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+
+def _box(label: str):
+    lines = textwrap.wrap(label, WRAP_CHARS) or [""]
+    width = max(len(line) for line in lines) * CHAR_WIDTH + 2 * PADDING
+    height = len(lines) * LINE_HEIGHT + PADDING
+    return lines, width, height
+
+
+def layout_mindmap(mindmap: dict) -> dict:
+    """
+    Top-down tree layout: leaves are placed left to right and every parent
+    is centred over its children. The result is JSON the frontend can draw
+    and the input of render_svg.
+    """
+    levels, children, root = mindmap_tree(mindmap)
+    labels = {node["id"]: node["label"] for node in mindmap["nodes"]}
+
+    boxes = {node_id: _box(labels.get(node_id, node_id)) for node_id in levels}
+    depth = max(levels.values(), default=0)
+    level_heights = [0] * (depth + 1)
+    for node_id, level in levels.items():
+        level_heights[level] = max(level_heights[level], boxes[node_id][2])
+    level_y = [MARGIN]
+    for level in range(depth):
+        level_y.append(level_y[-1] + level_heights[level] + LEVEL_GAP)
+
+    # post-order without recursion (mindmaps from the model can be deep):
+    # leaves take the next free slot, parents are centred over their
+    # children and a parent wider than its children shifts the subtree right
+    x_centres = {}
+    start_x = {}
+    shifts = {}
+    next_x = MARGIN
+
+    stack = [(root, False)]
+    while stack:
+        node_id, visited = stack.pop()
+        if not visited:
+            start_x[node_id] = next_x
+            stack.append((node_id, True))
+            stack.extend((child, False) for child in reversed(children[node_id]))
+            continue
+
+        width = boxes[node_id][1]
+        if children[node_id]:
+            first, last = children[node_id][0], children[node_id][-1]
+            centre = (x_centres[first] + x_centres[last]) / 2
+            overlap = start_x[node_id] - (centre - width / 2)
+            if overlap > 0:
+                shifts[node_id] = overlap
+                centre += overlap
+                next_x += overlap
+        else:
+            centre = next_x + width / 2
+        x_centres[node_id] = centre
+        next_x = max(next_x, centre + width / 2 + NODE_GAP)
+
+    # apply the shifts of the ancestors
+    queue = deque([(root, 0.0)])
+    while queue:
+        node_id, offset = queue.popleft()
+        x_centres[node_id] += offset
+        child_offset = offset + shifts.get(node_id, 0.0)
+        queue.extend((child, child_offset) for child in children[node_id])
+
+    nodes = []
+    for node_id, level in sorted(levels.items(), key=lambda item: item[1]):
+        lines, width, height = boxes[node_id]
+        fill, text = LEVEL_COLORS[min(level, len(LEVEL_COLORS) - 1)]
+        nodes.append({
+            "id": node_id,
+            "label": labels.get(node_id, node_id),
+            "lines": lines,
+            "level": level,
+            "x": round(x_centres[node_id] - width / 2, 1),
+            "y": level_y[level],
+            "width": width,
+            "height": height,
+            "fill": fill,
+            "text_color": text
+        })
+
+    edges = [{"source": parent, "target": child}
+             for parent, child_ids in children.items() for child in child_ids]
+
+    return {
+        "width": round(max((n["x"] + n["width"] for n in nodes), default=0) + MARGIN, 1),
+        "height": max((n["y"] + n["height"] for n in nodes), default=0) + MARGIN,
+        "nodes": nodes,
+        "edges": edges
+    }
+
+
+def render_svg(layout: dict) -> str:
+    """Draw a layout as a standalone SVG document"""
+    by_id = {node["id"]: node for node in layout["nodes"]}
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{layout["width"]}" '
+        f'height="{layout["height"]}" viewBox="0 0 {layout["width"]} {layout["height"]}" '
+        f'font-family="Arial, sans-serif" font-size="{FONT_SIZE}">',
+        f'<rect width="100%" height="100%" fill="white"/>'
+    ]
+
+    # orthogonal connectors: down from the parent, across, down to the child
+    for edge in layout["edges"]:
+        source, target = by_id[edge["source"]], by_id[edge["target"]]
+        x1 = source["x"] + source["width"] / 2
+        y1 = source["y"] + source["height"]
+        x2 = target["x"] + target["width"] / 2
+        y2 = target["y"]
+        middle = (y1 + y2) / 2
+        parts.append(
+            f'<path d="M{x1:.1f},{y1} V{middle:.1f} H{x2:.1f} V{y2}" '
+            f'fill="none" stroke="#555" stroke-width="1.2"/>')
+
+    for node in layout["nodes"]:
+        centre = node["x"] + node["width"] / 2
+        parts.append(
+            f'<rect x="{node["x"]}" y="{node["y"]}" width="{node["width"]}" '
+            f'height="{node["height"]}" rx="8" fill="{node["fill"]}" stroke="#333"/>')
+        for i, line in enumerate(node["lines"]):
+            y = node["y"] + PADDING / 2 + (i + 1) * LINE_HEIGHT - 4
+            parts.append(
+                f'<text x="{centre:.1f}" y="{y:.1f}" text-anchor="middle" '
+                f'fill="{node["text_color"]}">{escape(line)}</text>')
+
+    parts.append("</svg>")
+    return "\n".join(parts)
+
+
+# ------- PNG --------
+# cairosvg is optional; PNGs are rasterised in a few long-lived processes
+# instead of forking a renderer per request
+
+_png_pool = None
+_png_pool_lock = threading.Lock()
+
+
+def _svg_to_png(svg: str) -> bytes:
+    import cairosvg
+
+    return cairosvg.svg2png(bytestring=svg.encode())
+
+
+@lru_cache(maxsize=1)
+def png_available() -> bool:
+    try:
+        import cairosvg  # noqa: F401
+    except (ImportError, OSError):
+        return False
+    return True
+
+
+def render_png(svg: str) -> bytes:
+    global _png_pool
+    with _png_pool_lock:
+        if _png_pool is None:
+            # spawn, as the worker pool: forked renderers would inherit the
+            # threads and clients of the API process
+            _png_pool = ProcessPoolExecutor(max_workers=config.MINDMAP_PNG_RENDERERS,
+                                            mp_context=multiprocessing.get_context("spawn"))
+    return _png_pool.submit(_svg_to_png, svg).result()
+
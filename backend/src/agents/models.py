@@ -0,0 +1,51 @@
+# ------
+# This file contains the shared chat model clients used by the agent nodes
+# ------
+
+import functools
+from typing import Optional, Type
+from langchain.chat_models import init_chat_model
+from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from pydantic import BaseModel
+import config
+
+
+@functools.lru_cache(maxsize=None)
+def get_chat_model(model: str, temperature: Optional[float] = None):
+    """
+    Return the process-wide client for a model. The client owns the
+    connection to the provider, so reusing it keeps the channel warm.
+    """
+    kwargs = {
+        "model_provider": config.LLM_PROVIDER,
+        "transport": config.LLM_TRANSPORT,
+        "timeout": config.LLM_TIMEOUT,
+    }
+    if temperature is not None:
+        kwargs["temperature"] = temperature
+    return init_chat_model(model, **kwargs)
+
+
+@functools.lru_cache(maxsize=None)
+def get_structured_model(schema: Type[BaseModel], model: Optional[str] = None,
+                         temperature: Optional[float] = None):
+    """Return the cached structured-output runnable for (model, schema, temperature)"""
+    return get_chat_model(model or config.LLM_MODEL, temperature).with_structured_output(schema)
+
+
+@functools.lru_cache(maxsize=None)
+def get_embeddings(model: Optional[str] = None):
+    """Return the process-wide embeddings client"""
+    return GoogleGenerativeAIEmbeddings(
+        model=model or config.EMBEDDING_MODEL, transport=config.LLM_TRANSPORT)
+
+
+@functools.lru_cache(maxsize=None)
+def get_streaming_model(schema: Type[BaseModel], model: Optional[str] = None,
+                        temperature: Optional[float] = None):
+    """
+    Structured output in JSON mode. Unlike tool calling, streaming it yields
+    partial dicts of the schema as the tokens arrive.
+    """
+    return get_chat_model(model or config.LLM_MODEL, temperature).with_structured_output(
+        schema.model_json_schema(), method="json_mode")
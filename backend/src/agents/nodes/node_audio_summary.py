@@ -1,13 +1,15 @@
-
 # import modules
 
+import asyncio
 import logging
-from langchain.chat_models import init_chat_model
-from langchain_core.prompts import ChatPromptTemplate
 from agents.state import AgentState
+from agents.models import get_structured_model
+from agents.prompts import profile_inputs, prompt_registry
+from agents.resilience import with_resilience
 from agents.output_structures import PodcastContent
-from services.supabase_service import supabase_service
-from datetime import datetime
+from services.learning_space_writer import learning_space_writer
+from services.run_registry import run_registry
+from services.tts import synthesize_script, tts_language_code
 import re
 
 # ----- Agent Node - Audio Summary
@@ -15,74 +17,97 @@ import re
 logger = logging.getLogger(__name__)
 
 
+def _build_chain():
+    """Create a personalized prompt based on student profile"""
+
+    # shared client with structured output
+    model = get_structured_model(PodcastContent, temperature=0.2)
+
+    prompt = prompt_registry.get("node_audio_overview")
+    return with_resilience(prompt.template | model, prompt.name)
+
+
+def _chain_input(state: AgentState):
+    # the summary notes are shortened if the prompt is over its token budget
+    return prompt_registry.get("node_audio_overview").fit_inputs({
+        **profile_inputs(state),
+        "topic_summary": state["summary_notes"].prompt_text()
+    })
+
+
+# cleaning SSML
+def clean_podcast_content(content):
+    clean_text = re.sub(r"[\n\r\\]", "", content)
+    return clean_text
+
+
 def run_node_audio_overview(state: AgentState):
     """LLM call to generate aduio overview based on summary content"""
 
-    # generate the chat prompt
-
     logging.info('Running node_audio_overview ....')
 
-    """Create a personalized prompt based on student profile"""
+    response = _build_chain().invoke(_chain_input(state))
+
+    logger.info('Completed LLM response.')
+
+    script = clean_podcast_content(response.script)
 
-    prompt_template = ChatPromptTemplate([
-        ("system", """
-         You are an expert academic female tutor. Your goal is to generate engaging, informative, and personalized educational summaries for students.
-
-            Student Profile:
-            - Class Level: {grade_level}
-            - Target Language: {language} (Provide content in this language.)
-            - Preferred Pronouns: {gender} 
-
-            Podcast Content Requirements:
-            1.  Comprehensive Summary: Generate a detailed and well-structured summary of the user-provided topic. This summary should serve as the core script for a 7-10 minute audio podcast episode within a 3000 character limit.
-            2.  Academic Appropriateness: Tailor the depth, complexity, and vocabulary of the content precisely to the specified {grade_level}. Assume the student has foundational knowledge typical for their level, but introduce new concepts clearly.
-            3.  Engaging Delivery Style:
-                - Write in a conversational, accessible, and enthusiastic tone.
-                - Incorporate brief, relatable examples or analogies where helpful.
-                - Include a brief, friendly introduction and conclusion suitable for a podcast.
-            4.  Structure: Your summary should implicitly or explicitly follow a logical podcast flow:
-                - Introduction: Hook the listener, introduce the topic.
-                - Main Content: Break down the topic into digestible segments.
-                - Key Takeaways/Recap: Briefly summarize the main points.
-                - Call to Action/Further Exploration:** Encourage continued learning.
-            5. Strictly use the 3000 characters limit, if the script goes beyond this, self edit it to adhere to the character limit.
-                """),
-
-        ("user",
-         "Create a audio summary for the topic summary: {topic_summary}.")
-    ])
-
-    # init a new model with structured output
-    model = init_chat_model(
-        "gemini-2.5-flash", model_provider="google_genai", temperature=0.2).with_structured_output(PodcastContent)
-
-    chain = prompt_template | model
-
-    response = chain.invoke(
-        {
-            "grade_level": state['student_profile'].get("grade_level", "general"),
-            "language": state['student_profile'].get("language", "English"),
-            "gender": state['student_profile'].get("gender", ""),
-            "topic_summary": state["summary_notes"]
-        }
+    # # # update in supabase database
+
+    learning_space_writer.write(
+        state['learning_space_id'], {"audio_script": script}
     )
 
-    logger.info('Completed LLM response.')
+    return {"podcast_script": script}
 
-    json_response = response.model_dump()
 
-    # cleaning SSML
+async def arun_node_audio_overview(state: AgentState):
+    """Async version of run_node_audio_overview"""
 
-    def clean_podcast_content(content):
-        clean_text = re.sub(r"[\n\r\\]", "", content)
-        return clean_text
+    logging.info('Running node_audio_overview ....')
 
-    script = clean_podcast_content(json_response['script'])
+    response = await _build_chain().ainvoke(_chain_input(state))
 
-    # # # update in supabase database
+    logger.info('Completed LLM response.')
+
+    script = clean_podcast_content(response.script)
 
-    supabase_service.update_learning_space(
+    await learning_space_writer.awrite(
         state['learning_space_id'], {"audio_script": script}
     )
 
     return {"podcast_script": script}
+
+
+# ----- Pipeline stage - Text to Speech
+
+def _synthesize(state: AgentState):
+    run_id = state.get("run_id")
+
+    def progress(chunk_urls):
+        # the first chunks can be played while the rest is synthesised
+        if run_id is not None:
+            run_registry.node_progress(run_id, "node_tts", {"audio_chunks": chunk_urls})
+
+    language_code = tts_language_code(state['student_profile'].get("language"))
+    return synthesize_script(
+        state["podcast_script"], language_code, state['learning_space_id'], progress)
+
+
+def run_node_tts(state: AgentState):
+    """Synthesise the audio overview from the podcast script"""
+
+    logger.info('Running node_tts ....')
+
+    url = _synthesize(state)
+    # an empty script has no audio
+    return {"audio_overview_url": url} if url else {}
+
+
+async def arun_node_tts(state: AgentState):
+    """Async version of run_node_tts, synthesis runs on its own thread pool"""
+
+    logger.info('Running node_tts ....')
+
+    url = await asyncio.to_thread(_synthesize, state)
+    return {"audio_overview_url": url} if url else {}
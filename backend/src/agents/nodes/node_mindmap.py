@@ -1,167 +1,121 @@
 # import modules
 
+import asyncio
 import logging
-from langchain.chat_models import init_chat_model
-from langchain_core.prompts import ChatPromptTemplate
-import graphviz
+import os
+import config
 from agents.state import AgentState
+from agents.models import get_structured_model
+from agents.prompts import profile_inputs, prompt_registry
+from agents.resilience import with_resilience
 from agents.output_structures import MindMapStructure
-from services.supabase_service import supabase_service
-from datetime import datetime
+from agents.mindmap_renderer import (
+    layout_mindmap, mindmap_hash, png_available, render_png, render_svg)
+from services.artifact_store import artifact_store
+from services.cache import DiskCache
+from services.learning_space_writer import learning_space_writer
+from services.storage import artifact_uploader, content_key
 
 
 #  ------- Agent Node : Mindmap -------
 logger = logging.getLogger(__name__)
 
+# canonical mindmap hash -> stored image URL and layout, so equivalent
+# mindmaps are neither rendered nor uploaded again
+mindmap_cache = DiskCache(
+    os.path.join(config.CACHE_DIR, "mindmaps.sqlite3"),
+    ttl_seconds=config.MINDMAP_CACHE_TTL,
+    max_entries=config.MINDMAP_CACHE_MAX_ENTRIES)
 
-def create_balanced_mindmap(mindmap_data):
-    """Create a more balanced mindmap layout"""
 
-    dot = graphviz.Digraph(comment='Mindmap')
+def upload_mindmap(mindmap: dict, learning_space_id: int):
+    """
+    Lay out the mindmap and queue its image for upload.
+    Returns (layout for the frontend, public URL of the image).
+    """
 
-    # Set graph attributes for better layout
-    dot.attr(
-        rankdir='TB',  # Top to Bottom
-        ranksep='1.5',  # Increase vertical separation
-        nodesep='0.8',  # Increase horizontal separation
-        splines='ortho',  # Use orthogonal edges
-        bgcolor='white'
-    )
+    image_format = config.MINDMAP_FORMAT if png_available() else "svg"
+    cache_key = mindmap_hash(mindmap, image_format)
 
-    # Node styling
-    dot.attr('node',
-             shape='box',
-             style='rounded,filled',
-             fontname='Arial',
-             fontsize='10',
-             width='1.5',
-             height='0.8'
-             )
+    if config.MINDMAP_CACHE_ENABLED:
+        cached = mindmap_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"Mindmap cache hit for learning space {learning_space_id}")
+            learning_space_writer.write(learning_space_id, {"mindmap": cached["url"]})
+            return cached["layout"], cached["url"]
 
-    nodes = mindmap_data['nodes']
-    edges = mindmap_data['edges']
-    central_node = mindmap_data.get('central_node', '')
+    layout = layout_mindmap(mindmap)
+    svg = render_svg(layout)
 
-    # Group nodes by their level (distance from central node)
-    node_levels = {}
-    for edge in edges:
-        if edge['source'] == central_node:
-            node_levels[edge['target']] = 1
-        elif edge['source'] in node_levels:
-            node_levels[edge['target']] = node_levels[edge['source']] + 1
+    def image():
+        return render_png(svg) if image_format == "png" else svg.encode()
 
-    # Add central node
-    dot.node(central_node,
-             next(node['label']
-                  for node in nodes if node['id'] == central_node),
-             fillcolor='#FF6B6B', fontcolor='white', fontsize='12')
+    def uploaded(url: str):
+        learning_space_writer.write(learning_space_id, {"mindmap": url})
+        if config.MINDMAP_CACHE_ENABLED:
+            mindmap_cache.set(cache_key, {"url": url, "layout": layout})
 
-    # Add level 1 nodes (main concepts) in subgraphs
-    level1_nodes = [node for node in nodes if node['id']
-                    in node_levels and node_levels[node['id']] == 1]
+    # named by a hash of the drawing so the same image is stored once;
+    # rasterising and upload run on the upload threads, off the graph's path,
+    # and the learning space gets the URL once the image is stored
+    filename = content_key("mindmap", svg, f".{image_format}")
+    content_type = "image/png" if image_format == "png" else "image/svg+xml"
 
-    # Create subgraphs for better clustering
-    for i, node in enumerate(level1_nodes):
-        with dot.subgraph(name=f'cluster_{i}') as cluster:
-            cluster.attr(style='invisible')  # Make cluster invisible
-            cluster.node(node['id'], node['label'],
-                         fillcolor='#4ECDC4', fontcolor='black')
+    url = artifact_uploader.submit(
+        filename, image, content_type, owner=learning_space_id,
+        on_uploaded=uploaded)
+    return layout, url
 
-    # Add remaining nodes
-    for node in nodes:
-        if node['id'] != central_node and node['id'] not in [n['id'] for n in level1_nodes]:
-            dot.node(node['id'], node['label'],
-                     fillcolor='#96CEB4', fontcolor='black')
 
-    # Add edges
-    for edge in edges:
-        dot.edge(edge['source'], edge['target'])
+def mindmap_state(mindmap: dict, learning_space_id: int):
+    """Upload the mindmap and return its state, with the JSON by reference"""
+    layout, mindmap_url = upload_mindmap(mindmap, learning_space_id)
+    return {"mindmap": artifact_store.put(mindmap),
+            "mindmap_layout": artifact_store.put(layout),
+            "mindmap_url": mindmap_url}
 
-    return dot
 
+# Agent Node - Notes Summary
 
-def upload_mindmap_to_supabase(dot_graph, learning_space_id: int):
-    """Upload mindmap image to Supabase Storage"""
-
-    try:
-        # Generate image bytes
-        image_bytes = dot_graph.pipe(format='png')
-
-        # Create filename with timestamp
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"mindmap_{learning_space_id}_{timestamp}.png"
-
-        # Upload to Supabase Storage
-        response = supabase_service.upload_file(filename, image_bytes)
-
-        logger.info(f"✅ Mindmap uploaded successfully: {filename}")
+def _build_chain():
+    """Create a personalized prompt based on student profile"""
 
-        public_url = supabase_service.get_public_url(filename)
+    # shared client with structured output
+    model = get_structured_model(MindMapStructure)
 
-        return {
-            "file_path": filename,
-            "public_url": public_url
-        }
+    prompt = prompt_registry.get("node_mindmap")
+    return with_resilience(prompt.template | model, prompt.name)
 
-    except Exception as e:
-        print(f"❌ Error uploading mindmap: {str(e)}")
-        return None
 
+def _chain_input(state: AgentState):
+    # the summary notes are shortened if the prompt is over its token budget
+    return prompt_registry.get("node_mindmap").fit_inputs({
+        **profile_inputs(state),
+        "topic_summary": state["summary_notes"].prompt_text()
+    })
 
-# Agent Node - Notes Summary
 
 def run_node_mindmap(state: AgentState):
     """LLM call to generate mindmap based on summary content"""
 
     logger.info('Running mindmap node...')
 
-    # generate the chat prompt
+    response = _build_chain().invoke(_chain_input(state))
 
-    """Create a personalized prompt based on student profile"""
+    logger.info('LLM response completed...')
 
-    prompt_template = ChatPromptTemplate([
-        ("system", """ 
-        You are a helpful academic tutor.
-        Use the below context to create a json response to create a mind map using graph viz in python. The mind map should clearly explain the core concepts and key ideas.
-        
-        Student Profile:
-            - Class Level: {grade_level}
-            - Language: {language} 
-            - Gender: {gender}
-         
-        1. Adapt your language and complexity based on the student's profile provided.
-        2. Respond in JSON format which can be used to render.
-        """),
-        ("user", "Topic Summary {topic_summary}")
-    ])
-
-    # init a new model with structured output
-    model = init_chat_model(
-        "gemini-2.5-flash", model_provider="google_genai").with_structured_output(MindMapStructure)
-
-    chain = prompt_template | model
-
-    response = chain.invoke(
-        {
-            "grade_level": state['student_profile'].get("grade_level", "general"),
-            "language": state['student_profile'].get("language", "English"),
-            "gender": state['student_profile'].get("gender", ""),
-            "topic_summary": state["summary_notes"]
-        }
-    )
+    # lay out the mindmap, the image is uploaded in the background
+    return mindmap_state(response.model_dump(), state['learning_space_id'])
 
-    logger.info('LLM response completed...')
 
-    # create mindmap graph
-    json_response = response.model_dump()
-    dot = create_balanced_mindmap(json_response)
+async def arun_node_mindmap(state: AgentState):
+    """Async version of run_node_mindmap"""
 
-    # upload to supabase storage
-    upload_response = upload_mindmap_to_supabase(
-        dot, state['learning_space_id'])
+    logger.info('Running mindmap node...')
+
+    response = await _build_chain().ainvoke(_chain_input(state))
 
-    # # update in supabase database
-    supabase_service.update_learning_space(state['learning_space_id'], {
-                                           "mindmap": upload_response["public_url"]})
+    logger.info('LLM response completed...')
 
-    return {"mindmap": json_response}
+    return await asyncio.to_thread(
+        mindmap_state, response.model_dump(), state['learning_space_id'])
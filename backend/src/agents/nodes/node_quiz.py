@@ -1,62 +1,65 @@
-
 # import modules
 
+import asyncio
 import logging
-from langchain.chat_models import init_chat_model
-from langchain_core.prompts import ChatPromptTemplate
 from agents.state import AgentState
+from agents.models import get_structured_model
+from agents.prompts import profile_inputs, prompt_registry
+from agents.resilience import with_resilience
 from agents.output_structures import QuizOutput
-from services.supabase_service import supabase_service
+from services.artifact_store import artifact_store
+from services.learning_space_writer import learning_space_writer
 
 # ---------------- Agent Node - Quiz ---------------
 logger = logging.getLogger(__name__)
 
 
+def _build_chain():
+    """Create a personalized prompt based on student profile"""
+
+    # shared client with structured output
+    model = get_structured_model(QuizOutput)
+
+    prompt = prompt_registry.get("node_quiz")
+    return with_resilience(prompt.template | model, prompt.name)
+
+
+def _chain_input(state: AgentState):
+    # the summary notes are shortened if the prompt is over its token budget
+    return prompt_registry.get("node_quiz").fit_inputs({
+        **profile_inputs(state),
+        "topic_summary": state["summary_notes"].prompt_text()
+    })
+
+
 def run_node_quiz(state: AgentState):
     """LLM call to generate quiz based on summary content"""
 
     logger.info('node_quiz is running')
 
-    # generate the chat prompt
+    response = _build_chain().invoke(_chain_input(state))
 
-    """Create a personalized prompt based on student profile"""
+    logger.info("Completed LLM response step")
+
+    quiz = response.model_dump()
+    learning_space_writer.write(state["learning_space_id"], {
+                                           "quiz": quiz})
+
+    # the state keeps a reference, the quiz itself is in the artifact store
+    return {"quiz": artifact_store.put(quiz)}
+
+
+async def arun_node_quiz(state: AgentState):
+    """Async version of run_node_quiz"""
+
+    logger.info('node_quiz is running')
 
-    prompt_template = ChatPromptTemplate([
-        ("system", """ 
-        You are a helpful academic tutor. Use these instructions to create a quiz on the notes provided by the user:
-        
-        Student Profile:
-            - Class Level: {grade_level}
-            - Language: {language} 
-            - Gender: {gender}
-        
-        1. Questions should be in MCQ format with 4 options each.
-        2. Create 10 quality questions which tests fundamentals and analytical thinking of the user. 
-        3. Adapt your language and complexity based on the student's profile provided.
-        4. Respond in JSON format which can be used to render a quiz UI.
-        5. Include correct answer, hint and explaination with each question.
-        """),
-        ("user", "Topic Summary {topic_summary}")
-    ])
-
-    # init a new model with structured output
-    model = init_chat_model(
-        "gemini-2.5-flash", model_provider="google_genai").with_structured_output(QuizOutput)
-
-    chain = prompt_template | model
-
-    response = chain.invoke(
-        {
-            "grade_level": state['student_profile'].get("grade_level", "general"),
-            "language": state['student_profile'].get("language", "English"),
-            "gender": state['student_profile'].get("gender", ""),
-            "topic_summary": state["summary_notes"]
-        }
-    )
+    response = await _build_chain().ainvoke(_chain_input(state))
 
     logger.info("Completed LLM response step")
 
-    supabase_service.update_learning_space(state["learning_space_id"], {
-                                           "quiz": response.model_dump()})
+    quiz = response.model_dump()
+    await learning_space_writer.awrite(state["learning_space_id"], {
+        "quiz": quiz})
 
-    return {"quiz": response.model_dump()}
+    return {"quiz": await asyncio.to_thread(artifact_store.put, quiz)}
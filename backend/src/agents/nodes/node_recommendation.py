@@ -1,64 +1,69 @@
 # import modules
 
+import asyncio
 import logging
-from langchain.chat_models import init_chat_model
-from langchain_core.prompts import ChatPromptTemplate
 from agents.state import AgentState
+from agents.models import get_structured_model
+from agents.prompts import profile_inputs, prompt_registry
+from agents.resilience import with_resilience
 from agents.output_structures import RecommendationList
-from services.supabase_service import supabase_service
+from services.artifact_store import artifact_store
+from services.learning_space_writer import learning_space_writer
 
 # ----- Agent Node : Recommendation ----
 
 logger = logging.getLogger(__name__)
 
 
+def _build_chain():
+    """Create a personalized prompt based on student profile"""
+
+    # shared client with structured output
+    model = get_structured_model(RecommendationList)
+
+    prompt = prompt_registry.get("node_recommendations")
+    return with_resilience(prompt.template | model, prompt.name)
+
+
+def _chain_input(state: AgentState):
+    # the summary notes are shortened if the prompt is over its token budget
+    return prompt_registry.get("node_recommendations").fit_inputs({
+        **profile_inputs(state),
+        "topic_summary": state["summary_notes"].prompt_text()
+    })
+
+
 def run_node_recommendation(state: AgentState):
     """LLM call to generate recommendation based on summary content"""
 
     logger.info("node_recommendation running....")
 
-    # generate the chat prompt
-
-    """Create a personalized prompt based on student profile"""
-
-    prompt_template = ChatPromptTemplate([
-        ("system", """ 
-        You are a helpful academic tutor. Use these instructions to create a recommendation list based on the notes provided by the user:
-        
-        Student Profile:
-            - Class Level: {grade_level}
-            - Language: {language} 
-            - Gender: {gender}
-        
-        1. The recommendation should include all the necessary resources to learn the topic.
-        2. Create uptp 10 quality recommendations with a mixture of books, online lectures, articles etc. 
-        3. Adapt your language and complexity based on the student's profile provided and add proper contextual description and url if available with each source.
-        4. Respond in JSON format which can be used to render a UI.
-        """),
-        ("user", "Topic Summary {topic_summary}")
-    ])
-
-    # init a new model with structured output
-    model = init_chat_model(
-        "gemini-2.5-flash", model_provider="google_genai").with_structured_output(RecommendationList)
-
-    chain = prompt_template | model
-
-    response = chain.invoke(
-        {
-            "grade_level": state['student_profile'].get("grade_level", "general"),
-            "language": state['student_profile'].get("language", "English"),
-            "gender": state['student_profile'].get("gender", ""),
-            "topic_summary": state["summary_notes"]
-        }
-    )
+    response = _build_chain().invoke(_chain_input(state))
 
     logger.info('LLM response completed.')
 
     # update in supabase database
 
-    supabase_service.update_learning_space(state['learning_space_id'], {
-        "recommendations": response.model_dump()
+    recommendations = response.model_dump()
+    learning_space_writer.write(state['learning_space_id'], {
+        "recommendations": recommendations
+    })
+
+    return {"recommendations": artifact_store.put(recommendations)}
+
+
+async def arun_node_recommendation(state: AgentState):
+    """Async version of run_node_recommendation"""
+
+    logger.info("node_recommendation running....")
+
+    response = await _build_chain().ainvoke(_chain_input(state))
+
+    logger.info('LLM response completed.')
+
+    recommendations = response.model_dump()
+    await learning_space_writer.awrite(state['learning_space_id'], {
+        "recommendations": recommendations
     })
 
-    return {"recommendations": response.model_dump()}
+    return {"recommendations": await asyncio.to_thread(artifact_store.put, recommendations)}
@@ -0,0 +1,73 @@
+# import modules
+
+import asyncio
+import logging
+from agents.state import AgentState
+from agents.models import get_structured_model
+from agents.prompts import profile_inputs, prompt_registry
+from agents.resilience import with_resilience
+from agents.output_structures import StudyMaterials
+from agents.nodes.node_mindmap import mindmap_state
+from services.artifact_store import artifact_store
+from services.learning_space_writer import learning_space_writer
+
+# ------- Agent Node - Study Materials (combined mode) -------
+# one structured call instead of node_quiz, node_recommendations and
+# node_mindmap, which each resend the same preamble and summary
+logger = logging.getLogger(__name__)
+
+
+def _build_chain():
+    """Create a personalized prompt based on student profile"""
+
+    # shared client with structured output
+    model = get_structured_model(StudyMaterials)
+
+    prompt = prompt_registry.get("node_study_materials")
+    return with_resilience(prompt.template | model, prompt.name)
+
+
+def _chain_input(state: AgentState):
+    # the summary notes are shortened if the prompt is over its token budget
+    return prompt_registry.get("node_study_materials").fit_inputs({
+        **profile_inputs(state),
+        "topic_summary": state["summary_notes"].prompt_text()
+    })
+
+
+def _write_results(state: AgentState, response: StudyMaterials):
+    quiz = response.quiz.model_dump()
+    recommendations = response.recommendations.model_dump()
+
+    learning_space_writer.write(state['learning_space_id'], {
+        "quiz": quiz, "recommendations": recommendations})
+
+    return {
+        "quiz": artifact_store.put(quiz),
+        "recommendations": artifact_store.put(recommendations),
+        **mindmap_state(response.mindmap.model_dump(), state['learning_space_id'])
+    }
+
+
+def run_node_study_materials(state: AgentState):
+    """LLM call to generate the quiz, recommendations and mindmap together"""
+
+    logger.info('node_study_materials is running')
+
+    response = _build_chain().invoke(_chain_input(state))
+
+    logger.info("Completed LLM response step")
+
+    return _write_results(state, response)
+
+
+async def arun_node_study_materials(state: AgentState):
+    """Async version of run_node_study_materials"""
+
+    logger.info('node_study_materials is running')
+
+    response = await _build_chain().ainvoke(_chain_input(state))
+
+    logger.info("Completed LLM response step")
+
+    return await asyncio.to_thread(_write_results, state, response)
@@ -1,81 +1,381 @@
 # import modules
 
+import asyncio
 import logging
-from langchain.chat_models import init_chat_model
-from langchain_core.prompts import ChatPromptTemplate
-from agents.state import AgentState
+import re
+import time
+import uuid
+from langchain_core.messages import HumanMessage
+import config
+from agents.state import AgentState, SummaryNotes
+from agents.prompts import profile_inputs, prompt_registry
+from agents.models import get_structured_model, get_streaming_model
+from agents.resilience import aresilient_stream, resilient_stream, with_resilience
 from agents.output_structures import SummaryNoteOutput
-from services.supabase_service import supabase_service
+from services.learning_space_writer import learning_space_writer
+from services.semantic_cache import semantic_summary_cache
+from services.run_registry import run_registry
+from services.ingestion import load_chunks, relevant_chunks
+from agents.mapreduce import map_chunks, amap_chunks
 
 # -------------- Agent Node - Notes Summary ----------------
 
 logger = logging.getLogger(__name__)
 
 
-def run_node_summary_notes(state: AgentState):
-    """LLM call to generate summary notes for student"""
+def _notes(response: SummaryNoteOutput) -> SummaryNotes:
+    """The summary as passed to the downstream nodes"""
+    return SummaryNotes(title=response.title, summary=response.summary)
+
+
+def _has_file(state: AgentState):
+    file_url = state['user_prompt']['file_url']
+    return bool(file_url and file_url.strip())
+
+
+def _semantic_lookup(state: AgentState):
+    """
+    Return (cached summary or None, topic embedding). Only topic-only requests
+    are looked up, a summary of an uploaded file depends on the file.
+    """
+    if not config.SEMANTIC_CACHE_ENABLED or _has_file(state):
+        return None, None
+
+    profile = state['student_profile']
+    try:
+        summary, vector = semantic_summary_cache.find(
+            state['user_prompt']['topic'], profile.get("grade_level"), profile.get("language"))
+    except Exception as e:
+        logger.warning(f"Semantic cache lookup failed: {e}")
+        return None, None
+
+    return (SummaryNoteOutput(**summary) if summary else None), vector
+
+
+def _semantic_store(state: AgentState, vector, response: SummaryNoteOutput):
+    if vector is None:
+        return
+
+    profile = state['student_profile']
+    try:
+        semantic_summary_cache.add(
+            vector, state['user_prompt']['topic'], profile.get("grade_level"),
+            profile.get("language"), response.model_dump())
+    except Exception as e:
+        logger.warning(f"Semantic cache update failed: {e}")
 
-    logger.info("node_summary_notes running....")
-    logger.info(state)
 
-    # generate the chat prompt
+def _source_chunks(state: AgentState):
+    """Text chunks of the ingested source file, empty if there are none"""
+    source_hash = state['user_prompt'].get('source_hash')
+    return load_chunks(source_hash) if source_hash and _has_file(state) else []
+
+
+def _use_map_reduce(chunks):
+    return config.MAPREDUCE_ENABLED and sum(len(chunk) for chunk in chunks) > config.INGEST_CONTEXT_CHARS
+
+
+def _source_text(state: AgentState):
+    """
+    The source as text for the prompt: the relevant chunks of a document that
+    fits the context budget, or the map step notes of every chunk.
+    """
+    chunks = _source_chunks(state)
+    if not chunks:
+        return None
+    if _use_map_reduce(chunks):
+        return "Source notes:\n\n" + "\n\n---\n\n".join(map_chunks(chunks))
+
+    chunks = relevant_chunks(
+        state['user_prompt']['source_hash'], state['user_prompt']['topic'], config.INGEST_CONTEXT_CHARS)
+    return "Source material:\n\n" + "\n\n---\n\n".join(chunks)
+
+
+async def _asource_text(state: AgentState):
+    """Async version of _source_text"""
+    chunks = await asyncio.to_thread(_source_chunks, state)
+    if chunks and _use_map_reduce(chunks):
+        return "Source notes:\n\n" + "\n\n---\n\n".join(await amap_chunks(chunks))
+    return await asyncio.to_thread(_source_text, state)
+
+
+def _request(state: AgentState, source_text=None):
+    """The user message of the summary prompt (the reduce step for large documents)"""
 
     # Build human message content dynamically
     user_content = [
         {"type": "text", "text": f"Topic: {state['user_prompt']['topic']}"}]
 
-    # Add file only if it exists
-    if state['user_prompt']['file_url'] and state['user_prompt']['file_url'].strip():
-        user_content.append({
-            "type": "file",
-            "url": state['user_prompt']['file_url'],
-            "source_type": "url"
-        })
-
-    prompt_template = ChatPromptTemplate([
-        ("system", """You are an expert academic tutor. Create personalized educational content following these guidelines:
-            
-            Student Profile:
-            - Class Level: {grade_level}
-            - Language: {language} 
-            - Gender: {gender}
-            
-            Content Requirements:
-            1. Use the audio/image/pdf if provided by the user to genertae concise summary notes
-            2. Use bullet points and simple language appropriate for {grade_level}
-            3. Include practical examples and analogies
-            4. Make it engaging and easy to understand
-            5. Provide content in {language} only
-            
-            """),
-        ("user", user_content)
-    ])
-
-    # init a new model with structured output
-    model = init_chat_model(
-        "gemini-2.5-flash", model_provider="google_genai").with_structured_output(SummaryNoteOutput)
-
-    chain = prompt_template | model
-
-    response = chain.invoke(
-        {
-            "grade_level": state['student_profile'].get("grade_level", "general"),
-            "language": state['student_profile'].get("language", "english"),
-            "gender": state['student_profile'].get("gender", ""),
-        }
-    )
-
-    # update in supabase database
-    # supabase_response = (
-    #     supabase.table("learning_space")
-    #     .update({"summary_notes": response.model_dump()})
-    #     .eq("id", state["learning_space_id"])
-    #     .execute()
-    # )
+    # Add file only if it exists: the extracted text when the source was
+    # ingested, otherwise the file itself
+    if _has_file(state):
+        if source_text:
+            user_content.append({"type": "text", "text": source_text})
+        else:
+            user_content.append({
+                "type": "file",
+                "url": state['user_prompt']['file_url'],
+                "source_type": "url"
+            })
+
+    return [HumanMessage(content=user_content)]
+
+
+def _build_chain():
+    # shared client with structured output
+    model = get_structured_model(SummaryNoteOutput)
+
+    prompt = prompt_registry.get("node_summary_notes")
+    return with_resilience(prompt.template | model, prompt.name)
+
+
+def _chain_input(state: AgentState, source_text=None):
+    return {**profile_inputs(state), "request": _request(state, source_text)}
+
+
+def run_node_summary_notes(state: AgentState):
+    """LLM call to generate summary notes for student"""
+
+    logger.info("node_summary_notes running....")
+
+    # a summary of a near-identical topic skips the LLM call
+    response, vector = _semantic_lookup(state)
+    if response is None:
+        response = _build_chain().invoke(_chain_input(state, _source_text(state)))
+        logger.info("Completed LLM response step")
+        _semantic_store(state, vector, response)
+
+    learning_space_writer.write(state["learning_space_id"], {
+                                           "summary_notes": response.model_dump()})
+
+    return {"summary_notes": _notes(response)}
+
+
+async def arun_node_summary_notes(state: AgentState):
+    """Async version of run_node_summary_notes"""
+
+    logger.info("node_summary_notes running....")
+
+    response, vector = await asyncio.to_thread(_semantic_lookup, state)
+    if response is None:
+        response = await _build_chain().ainvoke(_chain_input(state, await _asource_text(state)))
+        logger.info("Completed LLM response step")
+        await asyncio.to_thread(_semantic_store, state, vector, response)
+
+    await learning_space_writer.awrite(state["learning_space_id"], {
+        "summary_notes": response.model_dump()})
+
+    return {"summary_notes": _notes(response)}
+
 
+# -------------- Streaming mode ----------------
+# node_summary_draft streams the summary until enough sections are complete
+# and returns that partial summary so the downstream nodes can start.
+# node_summary_complete runs next to them, consumes the rest of the same
+# stream and writes the full summary.
+
+# stream id -> (opened at, _SummaryStream or None when the draft node already
+# produced the full summary). The id is unique per draft call and passed to
+# node_summary_complete in the state.
+_open_streams = {}
+
+_SECTION_HEADING = re.compile(r"^#{1,6}\s", re.MULTILINE)
+# top level bullet points, which the prompt asks for
+_LIST_ITEM = re.compile(r"^(?:[-*+]|\d+[.)])\s", re.MULTILINE)
+
+
+def _to_summary(partial: dict) -> SummaryNoteOutput:
+    return SummaryNoteOutput(title=partial.get("title") or "",
+                             summary=partial.get("summary") or "")
+
+
+def _completed(pattern: re.Pattern, partial: dict) -> int:
+    """A section or bullet point is complete once the next one has started"""
+    return max(len(pattern.findall(partial.get("summary") or "")) - 1, 0)
+
+
+class _SummaryStream:
+    """Partial summary of one run, pushed to the client while it streams"""
+
+    def __init__(self, state: AgentState, chunks, vector):
+        self.state = state
+        self.chunks = chunks
+        self.vector = vector
+        self.partial = {}
+        self._last_publish = 0.0
+
+    def update(self, partial: dict) -> bool:
+        """Keep the latest partial output, True when it is due to be published"""
+        self.partial = partial
+        now = time.monotonic()
+        if now - self._last_publish < config.SUMMARY_PROGRESS_INTERVAL:
+            return False
+        self._last_publish = now
+        return True
+
+    def publish(self, node: str):
+        run_id = self.state.get("run_id")
+        if run_id is not None:
+            run_registry.node_progress(run_id, node, {"summary_notes": self.partial})
+        # progress is written straight away, also when writes are buffered per run
+        learning_space_writer.write(
+            self.state["learning_space_id"], {"summary_notes": _to_summary(self.partial).model_dump()},
+            flush=True)
+
+    def ready(self) -> bool:
+        return (_completed(_SECTION_HEADING, self.partial) >= config.SUMMARY_EARLY_SECTIONS
+                or _completed(_LIST_ITEM, self.partial) >= config.SUMMARY_EARLY_ITEMS)
+
+    def close(self):
+        # closing the generator closes the model stream
+        if hasattr(self.chunks, "close"):
+            self.chunks.close()
+
+    async def aclose(self):
+        if hasattr(self.chunks, "aclose"):
+            await self.chunks.aclose()
+
+
+def _register(stream_id: str, stream):
+    """
+    Keep the stream for node_summary_complete. Streams of runs that never
+    reached node_summary_complete (e.g. a sibling branch failed first) are
+    dropped after SUMMARY_STREAM_TTL.
+    """
+    now = time.monotonic()
+    for key, (opened_at, _) in list(_open_streams.items()):
+        if now - opened_at > config.SUMMARY_STREAM_TTL:
+            entry = _open_streams.pop(key, None)
+            if entry is not None and entry[1] is not None:
+                entry[1].close()
+    _open_streams[stream_id] = (now, stream)
+
+
+def run_node_summary_draft(state: AgentState):
+    """Stream the summary notes and return once enough sections are complete"""
+
+    logger.info("node_summary_notes (streaming) running....")
+
+    stream_id = uuid.uuid4().hex
+    response, vector = _semantic_lookup(state)
+    if response is not None:
+        _register(stream_id, None)
+        learning_space_writer.write(state["learning_space_id"], {
+                                               "summary_notes": response.model_dump()})
+        return {"summary_notes": _notes(response), "summary_stream": stream_id}
+
+    source_text = _source_text(state)
+    prompt = prompt_registry.get("node_summary_notes")
+    chain = prompt.template | get_streaming_model(SummaryNoteOutput)
+    chunks = resilient_stream(chain, prompt.name, _chain_input(state, source_text))
+    stream = _SummaryStream(state, chunks, vector)
+    _register(stream_id, stream)
+
+    try:
+        for partial in stream.chunks:
+            if stream.update(partial):
+                stream.publish("node_summary_notes")
+            if stream.ready():
+                logger.info("Summary draft ready, starting downstream nodes")
+                break
+    except BaseException:
+        _open_streams.pop(stream_id, None)
+        stream.close()
+        raise
+
+    stream.publish("node_summary_notes")
+    return {"summary_notes": _notes(_to_summary(stream.partial)), "summary_stream": stream_id}
+
+
+def run_node_summary_complete(state: AgentState):
+    """Finish the summary stream started by node_summary_draft"""
+
+    entry = _open_streams.pop(state.get("summary_stream"), None)
+    if entry is None:
+        # the draft ran in another process (e.g. before a restart)
+        return run_node_summary_notes(state)
+
+    stream = entry[1]
+    if stream is None:
+        return {}
+
+    try:
+        for partial in stream.chunks:
+            if stream.update(partial):
+                stream.publish("node_summary_complete")
+    finally:
+        stream.close()
+
+    response = SummaryNoteOutput(**stream.partial)
     logger.info("Completed LLM response step")
+    _semantic_store(state, stream.vector, response)
 
-    supabase_service.update_learning_space(state["learning_space_id"], {
+    learning_space_writer.write(state["learning_space_id"], {
                                            "summary_notes": response.model_dump()})
 
-    return {"summary_notes": response}
+    return {"summary_notes": _notes(response)}
+
+
+async def arun_node_summary_draft(state: AgentState):
+    """Async version of run_node_summary_draft"""
+
+    logger.info("node_summary_notes (streaming) running....")
+
+    stream_id = uuid.uuid4().hex
+    response, vector = await asyncio.to_thread(_semantic_lookup, state)
+    if response is not None:
+        _register(stream_id, None)
+        await learning_space_writer.awrite(state["learning_space_id"], {
+            "summary_notes": response.model_dump()})
+        return {"summary_notes": _notes(response), "summary_stream": stream_id}
+
+    source_text = await _asource_text(state)
+    prompt = prompt_registry.get("node_summary_notes")
+    chain = prompt.template | get_streaming_model(SummaryNoteOutput)
+    chunks = await aresilient_stream(chain, prompt.name, _chain_input(state, source_text))
+    stream = _SummaryStream(state, chunks, vector)
+    _register(stream_id, stream)
+
+    try:
+        async for partial in stream.chunks:
+            if stream.update(partial):
+                await asyncio.to_thread(stream.publish, "node_summary_notes")
+            if stream.ready():
+                logger.info("Summary draft ready, starting downstream nodes")
+                break
+    except BaseException:
+        _open_streams.pop(stream_id, None)
+        await stream.aclose()
+        raise
+
+    await asyncio.to_thread(stream.publish, "node_summary_notes")
+    return {"summary_notes": _notes(_to_summary(stream.partial)), "summary_stream": stream_id}
+
+
+async def arun_node_summary_complete(state: AgentState):
+    """Async version of run_node_summary_complete"""
+
+    entry = _open_streams.pop(state.get("summary_stream"), None)
+    if entry is None:
+        return await arun_node_summary_notes(state)
+
+    stream = entry[1]
+    if stream is None:
+        return {}
+
+    # also when a failed sibling branch cancels this node
+    try:
+        async for partial in stream.chunks:
+            if stream.update(partial):
+                await asyncio.to_thread(stream.publish, "node_summary_complete")
+    finally:
+        await stream.aclose()
+
+    response = SummaryNoteOutput(**stream.partial)
+    logger.info("Completed LLM response step")
+    await asyncio.to_thread(_semantic_store, state, stream.vector, response)
+
+    await learning_space_writer.awrite(state["learning_space_id"], {
+        "summary_notes": response.model_dump()})
+
+    return {"summary_notes": _notes(response)}
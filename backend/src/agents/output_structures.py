@@ -78,3 +78,13 @@ class MindMapStructure(BaseModel):
     nodes: List[Node]
     edges: List[Edge]
     central_node: str
+
+# ---- Combined Output Structure -------
+
+
+class StudyMaterials(BaseModel):
+    quiz: QuizOutput = Field(description="MCQ quiz on the notes")
+    recommendations: RecommendationList = Field(
+        description="Learning resources for the topic")
+    mindmap: MindMapStructure = Field(
+        description="Mind map of the core concepts and key ideas")
@@ -0,0 +1,263 @@
+# -----
+# Prompt registry: the prompt templates of the graph, compiled once and
+# versioned so the versions can be part of the cache keys, with a token
+# budget per prompt that the long inputs (the summary notes sent to every
+# branch) are shortened to fit
+# -----
+
+import hashlib
+import json
+import logging
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+import config
+from services.rate_limiter import count_tokens
+from services.telemetry import metrics
+
+logger = logging.getLogger(__name__)
+
+# the same profile block and defaults in every prompt
+PROFILE_PREAMBLE = """Student Profile:
+            - Class Level: {grade_level}
+            - Language: {language}
+            - Gender: {gender}"""
+
+PROFILE_DEFAULTS = {"grade_level": "general", "language": "English", "gender": ""}
+
+TRUNCATION_MARK = "\n\n[...]"
+
+
+def profile_inputs(state) -> dict:
+    """The preamble variables of a state, with the defaults for missing fields"""
+    profile = state["student_profile"]
+    return {field: profile.get(field) or default for field, default in PROFILE_DEFAULTS.items()}
+
+
+def shorten(text: str, max_tokens: int) -> str:
+    """
+    text cut to about max_tokens at a paragraph boundary, so the notes keep
+    their first sections whole rather than losing a bit of every one
+    """
+    max_chars = max(max_tokens * 4 - len(TRUNCATION_MARK), 0)
+    if len(text) <= max_chars:
+        return text
+
+    kept = ""
+    for paragraph in text.split("\n\n"):
+        candidate = f"{kept}\n\n{paragraph}" if kept else paragraph
+        if len(candidate) > max_chars:
+            break
+        kept = candidate
+    if not kept:
+        kept = text[:max_chars].rsplit(" ", 1)[0]
+    return kept + TRUNCATION_MARK
+
+
+@dataclass(frozen=True)
+class Prompt:
+    name: str
+    version: str
+    template: ChatPromptTemplate
+    # input tokens of the rendered prompt, None for no limit
+    budget: Optional[int] = None
+    # input variable shortened when the prompt is over budget
+    fit: Optional[str] = None
+
+    @property
+    def key(self) -> str:
+        """Deterministic id of this prompt version, for cache keys and experiments"""
+        return f"{self.name}@{self.version}"
+
+    def count_tokens(self, inputs: dict) -> int:
+        """Estimated input tokens of the rendered prompt"""
+        return count_tokens(self.template.invoke(inputs).to_string())
+
+    def fit_inputs(self, inputs: dict) -> dict:
+        """inputs with the fit variable shortened so the prompt stays within the budget"""
+        if self.budget is None or self.fit is None:
+            return inputs
+
+        tokens = self.count_tokens(inputs)
+        metrics.inc("fluence_prompt_tokens_total", tokens, prompt=self.name)
+        if tokens <= self.budget:
+            return inputs
+
+        text = inputs[self.fit]
+        allowed = count_tokens(text) - (tokens - self.budget)
+        logger.info(f"{self.key} is {tokens} tokens, shortening {self.fit} to {allowed}")
+        metrics.inc("fluence_prompt_truncations_total", prompt=self.name)
+        return {**inputs, self.fit: shorten(text, allowed)}
+
+
+class PromptRegistry:
+    """
+    Prompts by name and version. The active version of a prompt is the one
+    set in PROMPT_VERSIONS, by default the last one registered.
+    """
+
+    def __init__(self, active_versions: Dict[str, str], budgets: Dict[str, int]):
+        self.active_versions = active_versions
+        self.budgets = budgets
+        self._prompts: Dict[str, Dict[str, Prompt]] = {}
+
+    def register(self, name: str, version: str, messages, budget: Optional[int] = None,
+                 fit: Optional[str] = None) -> Prompt:
+        prompt = Prompt(name, version, ChatPromptTemplate(messages),
+                        self.budgets.get(name, budget), fit)
+        self._prompts.setdefault(name, {})[version] = prompt
+        return prompt
+
+    def get(self, name: str, version: Optional[str] = None) -> Prompt:
+        versions = self._prompts[name]
+        version = version or self.active_versions.get(name) or list(versions)[-1]
+        if version not in versions:
+            raise KeyError(f"Unknown version {version} of prompt {name}")
+        return versions[version]
+
+    def version(self, name: str) -> str:
+        return self.get(name).version if name in self._prompts else ""
+
+    def fingerprint(self, names: Optional[Iterable[str]] = None) -> str:
+        """
+        Hash of the active versions of names (by default every prompt) and
+        PROMPT_VERSION, for the keys of cached model outputs
+        """
+        names = sorted(self._prompts if names is None else names)
+        key = [config.PROMPT_VERSION, [f"{name}@{self.version(name)}" for name in names]]
+        return hashlib.sha256(json.dumps(key).encode()).hexdigest()[:16]
+
+
+prompt_registry = PromptRegistry(config.PROMPT_VERSIONS, config.PROMPT_TOKEN_BUDGETS)
+
+
+# ------- Summary Notes --------
+# the request (topic and source text or file) is one user message built by
+# the node, the source is not a template
+prompt_registry.register("node_summary_notes", "1", [
+    ("system", """You are an expert academic tutor. Create personalized educational content following these guidelines:
+
+            """ + PROFILE_PREAMBLE + """
+
+            Content Requirements:
+            1. Use the audio/image/pdf if provided by the user to genertae concise summary notes
+            2. Use bullet points and simple language appropriate for {grade_level}
+            3. Include practical examples and analogies
+            4. Make it engaging and easy to understand
+            5. Provide content in {language} only
+
+            """),
+    MessagesPlaceholder("request"),
+])
+
+prompt_registry.register("map_chunk", "1", [
+    ("system", """You are an expert academic note taker.
+        Extract the key concepts, definitions, facts, formulas and examples from the excerpt provided by the user.
+        1. Write concise bullet point notes in the language of the excerpt.
+        2. Keep every important detail, skip repetition and filler.
+        3. Do not add information that is not in the excerpt.
+        """),
+    ("user", "Excerpt:\n\n{chunk}")
+])
+
+
+# ------- Branches --------
+# the summary notes are shortened when a branch prompt is over its budget
+
+prompt_registry.register("node_quiz", "1", [
+    ("system", """
+        You are a helpful academic tutor. Use these instructions to create a quiz on the notes provided by the user:
+
+        """ + PROFILE_PREAMBLE + """
+
+        1. Questions should be in MCQ format with 4 options each.
+        2. Create 10 quality questions which tests fundamentals and analytical thinking of the user.
+        3. Adapt your language and complexity based on the student's profile provided.
+        4. Respond in JSON format which can be used to render a quiz UI.
+        5. Include correct answer, hint and explaination with each question.
+        """),
+    ("user", "Topic Summary {topic_summary}")
+], budget=6000, fit="topic_summary")
+
+prompt_registry.register("node_recommendations", "1", [
+    ("system", """
+        You are a helpful academic tutor. Use these instructions to create a recommendation list based on the notes provided by the user:
+
+        """ + PROFILE_PREAMBLE + """
+
+        1. The recommendation should include all the necessary resources to learn the topic.
+        2. Create uptp 10 quality recommendations with a mixture of books, online lectures, articles etc.
+        3. Adapt your language and complexity based on the student's profile provided and add proper contextual description and url if available with each source.
+        4. Respond in JSON format which can be used to render a UI.
+        """),
+    ("user", "Topic Summary {topic_summary}")
+], budget=6000, fit="topic_summary")
+
+prompt_registry.register("node_mindmap", "1", [
+    ("system", """
+        You are a helpful academic tutor.
+        Use the below context to create a json response to create a mind map using graph viz in python. The mind map should clearly explain the core concepts and key ideas.
+
+        """ + PROFILE_PREAMBLE + """
+
+        1. Adapt your language and complexity based on the student's profile provided.
+        2. Respond in JSON format which can be used to render.
+        """),
+    ("user", "Topic Summary {topic_summary}")
+], budget=6000, fit="topic_summary")
+
+prompt_registry.register("node_audio_overview", "1", [
+    ("system", """
+         You are an expert academic female tutor. Your goal is to generate engaging, informative, and personalized educational summaries for students.
+
+            """ + PROFILE_PREAMBLE + """
+
+            Podcast Content Requirements:
+            1.  Comprehensive Summary: Generate a detailed and well-structured summary of the user-provided topic. This summary should serve as the core script for a 7-10 minute audio podcast episode within a 3000 character limit.
+            2.  Academic Appropriateness: Tailor the depth, complexity, and vocabulary of the content precisely to the specified {grade_level}. Assume the student has foundational knowledge typical for their level, but introduce new concepts clearly.
+            3.  Engaging Delivery Style:
+                - Write in a conversational, accessible, and enthusiastic tone.
+                - Incorporate brief, relatable examples or analogies where helpful.
+                - Include a brief, friendly introduction and conclusion suitable for a podcast.
+            4.  Structure: Your summary should implicitly or explicitly follow a logical podcast flow:
+                - Introduction: Hook the listener, introduce the topic.
+                - Main Content: Break down the topic into digestible segments.
+                - Key Takeaways/Recap: Briefly summarize the main points.
+                - Call to Action/Further Exploration:** Encourage continued learning.
+            5. Strictly use the 3000 characters limit, if the script goes beyond this, self edit it to adhere to the character limit.
+            6. Provide the content in {language}.
+                """),
+    ("user", "Create a audio summary for the topic summary: {topic_summary}.")
+], budget=6000, fit="topic_summary")
+
+# the summary and profile come first and are identical for every call on
+# the same notes, so the provider can serve them from its prompt cache
+prompt_registry.register("node_study_materials", "1", [
+    ("system", """
+        You are a helpful academic tutor. The notes of the student are below.
+
+        Topic Summary: {topic_summary}
+
+        """ + PROFILE_PREAMBLE + """
+
+        Adapt your language and complexity based on the student's profile provided.
+        Respond in JSON format which can be used to render a UI.
+        """),
+    ("user", """
+        Create the study materials for these notes:
+
+        quiz:
+        1. Questions should be in MCQ format with 4 options each.
+        2. Create 10 quality questions which tests fundamentals and analytical thinking of the user.
+        3. Include correct answer, hint and explaination with each question.
+
+        recommendations:
+        1. The recommendation should include all the necessary resources to learn the topic.
+        2. Create upto 10 quality recommendations with a mixture of books, online lectures, articles etc.
+        3. Add proper contextual description and url if available with each source.
+
+        mindmap:
+        1. A mind map that clearly explains the core concepts and key ideas.
+        2. central_node is the id of the node for the topic, every other node is reachable from it through edges.
+        """)
+], budget=8000, fit="topic_summary")
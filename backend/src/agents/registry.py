@@ -0,0 +1,109 @@
+# ------
+# Process-wide registry of compiled agent graphs
+# ------
+
+import logging
+import os
+import threading
+from typing import Callable, Dict, Iterable, Optional
+import config
+from agents.checkpoint import get_checkpointer
+from agents.graph import AgentGraphWorkflow
+
+logger = logging.getLogger(__name__)
+
+
+class GraphRegistry:
+    """
+    Holds versioned graph definitions and compiles each one once per process.
+    Compiled graphs are stateless and safe to invoke concurrently.
+
+    The active version is kept in a small file under DATA_DIR so that every
+    worker process picks up a switch without being restarted.
+    """
+
+    def __init__(self, version_file: str, default_version: str):
+        self.version_file = version_file
+        self.default_version = default_version
+        self._builders: Dict[str, Callable[[], AgentGraphWorkflow]] = {}
+        self._compiled: Dict[str, AgentGraphWorkflow] = {}
+        self._subgraphs: Dict[frozenset, AgentGraphWorkflow] = {}
+        self._lock = threading.Lock()
+        self._active_version = None
+        self._version_mtime = None
+
+    def register(self, version: str, builder: Callable[[], AgentGraphWorkflow]):
+        """Register a graph definition, replacing any compiled graph of that version"""
+        with self._lock:
+            self._builders[version] = builder
+            self._compiled.pop(version, None)
+
+    def versions(self):
+        return list(self._builders)
+
+    def _compile(self, version: str) -> AgentGraphWorkflow:
+        with self._lock:
+            if version not in self._compiled:
+                if version not in self._builders:
+                    raise KeyError(f"Unknown graph version: {version}")
+                logger.info(f"Compiling agent graph {version}")
+                self._compiled[version] = self._builders[version]()
+            return self._compiled[version]
+
+    def active_version(self) -> str:
+        try:
+            mtime = os.stat(self.version_file).st_mtime
+        except FileNotFoundError:
+            return self.default_version
+
+        if mtime != self._version_mtime:
+            with open(self.version_file) as f:
+                self._active_version = f.read().strip() or self.default_version
+            self._version_mtime = mtime
+        return self._active_version
+
+    def activate(self, version: str):
+        """Compile the graph and make it the active version in all processes"""
+        self._compile(version)
+        directory = os.path.dirname(self.version_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_file = f"{self.version_file}.{os.getpid()}.tmp"
+        with open(temp_file, "w") as f:
+            f.write(version)
+        os.replace(temp_file, self.version_file)
+        logger.info(f"Activated agent graph {version}")
+
+    def get(self, version: Optional[str] = None) -> AgentGraphWorkflow:
+        version = version or self.active_version()
+        graph = self._compiled.get(version)
+        if graph is None:
+            graph = self._compile(version)
+        return graph
+
+    def subgraph(self, nodes: Iterable[str]) -> AgentGraphWorkflow:
+        """The compiled graph of only these nodes, for selective regeneration"""
+        key = frozenset(nodes)
+        with self._lock:
+            if key not in self._subgraphs:
+                self._subgraphs[key] = AgentGraphWorkflow(include=key)
+            return self._subgraphs[key]
+
+    def warm_up(self):
+        """Compile the active graph ahead of the first request"""
+        self.get()
+
+
+graph_registry = GraphRegistry(config.GRAPH_VERSION_FILE, config.GRAPH_VERSION)
+graph_registry.register(
+    "v1", lambda: AgentGraphWorkflow(checkpointer=get_checkpointer()))
+graph_registry.register(
+    "v1-streaming",
+    lambda: AgentGraphWorkflow(stream_summary=True, checkpointer=get_checkpointer()))
+graph_registry.register(
+    "v1-combined",
+    lambda: AgentGraphWorkflow(combined=True, checkpointer=get_checkpointer()))
+graph_registry.register(
+    "v1-combined-streaming",
+    lambda: AgentGraphWorkflow(stream_summary=True, combined=True,
+                               checkpointer=get_checkpointer()))
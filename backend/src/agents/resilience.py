@@ -0,0 +1,443 @@
+# ------
+# Resilience layer for the LLM calls of the graph nodes: deadlines, retries
+# with exponential backoff, hedged requests past the p95 latency and a
+# circuit breaker, plus graceful degradation of optional nodes
+# ------
+
+import asyncio
+import contextvars
+import functools
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Optional
+from langchain_core.runnables import Runnable, RunnableLambda
+import config
+from services.rate_limiter import estimate_tokens, low_priority, rate_limiter
+from services.telemetry import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures and rejects calls for
+    reset_timeout seconds, then lets one trial call through (half open).
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return "open"
+        return "half_open"
+
+    def before_call(self):
+        with self._lock:
+            state = self.state
+            if state == "open" or (state == "half_open" and self._trial_running):
+                metrics.inc("fluence_circuit_rejections_total", circuit=self.name)
+                raise CircuitOpenError(f"Circuit {self.name} is open")
+            if state == "half_open":
+                self._trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning(f"Circuit {self.name} opened after {self.failures} failures")
+                self.opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """Latencies of the last successful calls, for the hedging threshold"""
+
+    def __init__(self, window: int):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, percentile: float, min_samples: int) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < min_samples:
+                return None
+            samples = sorted(self._samples)
+        index = min(int(len(samples) * percentile / 100), len(samples) - 1)
+        return samples[index]
+
+
+def _running(futures) -> int:
+    return sum(not future.done() for future in futures)
+
+
+def acquire_budget(cost: int):
+    """Take the estimated tokens of one call from the rate limiter, if enabled"""
+    if config.LLM_RATE_LIMIT_ENABLED:
+        rate_limiter.acquire(cost)
+
+
+async def aacquire_budget(cost: int):
+    if config.LLM_RATE_LIMIT_ENABLED:
+        await rate_limiter.aacquire(cost)
+
+
+class Resilience:
+    """Per-call policy shared by all nodes of a process"""
+
+    def __init__(self):
+        self._breakers = {}
+        self._latencies = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def breaker(self, name: str) -> CircuitBreaker:
+        with self._lock:
+            if name not in self._breakers:
+                self._breakers[name] = CircuitBreaker(
+                    name, config.RESILIENCE_BREAKER_FAILURES,
+                    config.RESILIENCE_BREAKER_RESET)
+            return self._breakers[name]
+
+    def latency(self, name: str) -> LatencyTracker:
+        with self._lock:
+            if name not in self._latencies:
+                self._latencies[name] = LatencyTracker(config.RESILIENCE_LATENCY_WINDOW)
+            return self._latencies[name]
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=config.RESILIENCE_MAX_THREADS,
+                    thread_name_prefix="llm-call")
+            return self._executor
+
+    def deadline(self, name: str) -> float:
+        return config.RESILIENCE_DEADLINES.get(name, config.RESILIENCE_DEADLINE)
+
+    def _hedge_after(self, name: str) -> Optional[float]:
+        if not config.RESILIENCE_HEDGE:
+            return None
+        return self.latency(name).percentile(
+            config.RESILIENCE_HEDGE_PERCENTILE, config.RESILIENCE_HEDGE_MIN_SAMPLES)
+
+    @staticmethod
+    def _abandon(name: str, futures, abandoned: set):
+        """
+        Threads cannot be cancelled, so a sync attempt past its deadline keeps
+        running (and is billed) until the client gives up on it. abandoned
+        holds the attempts of one call, which stops retrying and hedging
+        while they run; other calls of name are not affected.
+        """
+        abandoned.update(futures)
+        metrics.inc("fluence_llm_abandoned_total", len(futures), call=name)
+
+    def _record_latency(self, name: str, seconds: float):
+        self.latency(name).add(seconds)
+        metrics.observe("fluence_llm_call_seconds", seconds, call=name)
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(config.RESILIENCE_RETRY_BASE_DELAY * 2 ** attempt,
+                    config.RESILIENCE_RETRY_MAX_DELAY)
+        return delay * random.uniform(0.5, 1.0)
+
+    # ------- Sync --------
+
+    def _can_hedge(self, cost: int) -> bool:
+        # a hedge is an extra request, it is only sent if the budget allows
+        return not config.LLM_RATE_LIMIT_ENABLED or rate_limiter.try_acquire(
+            cost, low_priority.get()) == 0
+
+    def _attempt(self, name: str, function, *args, cost: int = 0,
+                 abandoned: Optional[set] = None):
+        """
+        One call within the deadline, hedged once it runs past p95; attempts
+        still running at the deadline are added to abandoned
+        """
+        abandoned = set() if abandoned is None else abandoned
+        executor = self._get_executor()
+        start = time.monotonic()
+        deadline_at = start + self.deadline(name)
+        hedge_after = self._hedge_after(name)
+
+        def submit():
+            # each call gets its own copy of the context (callbacks, tracing)
+            return executor.submit(contextvars.copy_context().run, function, *args)
+
+        pending = {submit()}
+        hedged = hedge_after is None or start + hedge_after >= deadline_at
+        error = None
+        while pending:
+            now = time.monotonic()
+            if now >= deadline_at:
+                break
+            timeout = deadline_at - now
+            if not hedged:
+                timeout = min(timeout, max(start + hedge_after - now, 0))
+
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    self._record_latency(name, time.monotonic() - start)
+                    return future.result()
+                error = future.exception()
+
+            if not hedged and pending and time.monotonic() >= start + hedge_after:
+                hedged = True
+                # no extra requests on top of abandoned ones
+                if not _running(abandoned) and self._can_hedge(cost):
+                    logger.info(f"{name} slower than p95 ({hedge_after:.1f}s), sending a hedged request")
+                    metrics.inc("fluence_llm_hedges_total", call=name)
+                    pending.add(submit())
+
+        if error is not None and not pending:
+            raise error
+        self._abandon(name, pending, abandoned)
+        metrics.inc("fluence_llm_deadlines_exceeded_total", call=name)
+        raise DeadlineExceeded(f"{name} exceeded its {self.deadline(name):.1f}s deadline")
+
+    def call(self, name: str, function, *args, cost: int = 0, model: Optional[str] = None):
+        """
+        Call function with retries; cost is the estimated tokens of one call
+        and model the one it calls (default LLM_MODEL), whose breaker it
+        uses. There are no retries while abandoned attempts of this call
+        still run, they would only stack more threads and billed requests.
+        """
+        breaker = self.breaker(model or config.LLM_MODEL)
+        abandoned = set()
+        for attempt in range(config.RESILIENCE_RETRIES + 1):
+            breaker.before_call()
+            acquire_budget(cost)
+            try:
+                result = self._attempt(name, function, *args, cost=cost, abandoned=abandoned)
+            except Exception as e:
+                breaker.record_failure()
+                if attempt == config.RESILIENCE_RETRIES or _running(abandoned):
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning(f"{name} failed ({e}), retrying in {delay:.1f}s")
+                metrics.inc("fluence_llm_retries_total", call=name)
+                time.sleep(delay)
+            else:
+                breaker.record_success()
+                return result
+
+    # ------- Async --------
+
+    async def _aattempt(self, name: str, afunction, *args, cost: int = 0):
+        start = time.monotonic()
+        deadline_at = start + self.deadline(name)
+        hedge_after = self._hedge_after(name)
+
+        pending = {asyncio.ensure_future(afunction(*args))}
+        hedged = hedge_after is None or start + hedge_after >= deadline_at
+        error = None
+        try:
+            while pending:
+                now = time.monotonic()
+                if now >= deadline_at:
+                    break
+                timeout = deadline_at - now
+                if not hedged:
+                    timeout = min(timeout, max(start + hedge_after - now, 0))
+
+                done, pending = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self._record_latency(name, time.monotonic() - start)
+                        return task.result()
+                    error = task.exception()
+
+                if not hedged and pending and time.monotonic() >= start + hedge_after:
+                    hedged = True
+                    if await asyncio.to_thread(self._can_hedge, cost):
+                        logger.info(f"{name} slower than p95 ({hedge_after:.1f}s), sending a hedged request")
+                        metrics.inc("fluence_llm_hedges_total", call=name)
+                        pending.add(asyncio.ensure_future(afunction(*args)))
+        finally:
+            for task in pending:
+                task.cancel()
+
+        if error is not None and not pending:
+            raise error
+        metrics.inc("fluence_llm_deadlines_exceeded_total", call=name)
+        raise DeadlineExceeded(f"{name} exceeded its {self.deadline(name):.1f}s deadline")
+
+    async def acall(self, name: str, afunction, *args, cost: int = 0,
+                    model: Optional[str] = None):
+        breaker = self.breaker(model or config.LLM_MODEL)
+        for attempt in range(config.RESILIENCE_RETRIES + 1):
+            breaker.before_call()
+            await aacquire_budget(cost)
+            try:
+                result = await self._aattempt(name, afunction, *args, cost=cost)
+            except Exception as e:
+                breaker.record_failure()
+                if attempt == config.RESILIENCE_RETRIES:
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning(f"{name} failed ({e}), retrying in {delay:.1f}s")
+                metrics.inc("fluence_llm_retries_total", call=name)
+                await asyncio.sleep(delay)
+            else:
+                breaker.record_success()
+                return result
+
+
+resilience = Resilience()
+
+
+def with_resilience(chain: Runnable, name: str, model: Optional[str] = None) -> Runnable:
+    """
+    Wrap the LLM chain of a node so invoke and ainvoke go through the policy
+    and the circuit breaker of model (default LLM_MODEL). Every attempt
+    first takes its estimated budget from the rate limiter, also with the
+    policy disabled.
+    """
+    if not config.RESILIENCE_ENABLED:
+        def invoke_limited(value, config=None):
+            acquire_budget(estimate_tokens(value))
+            return chain.invoke(value, config)
+
+        async def ainvoke_limited(value, config=None):
+            await aacquire_budget(estimate_tokens(value))
+            return await chain.ainvoke(value, config)
+
+        return RunnableLambda(invoke_limited, afunc=ainvoke_limited, name=name)
+
+    def invoke(value, config=None):
+        return resilience.call(name, chain.invoke, value, config,
+                               cost=estimate_tokens(value), model=model)
+
+    async def ainvoke(value, config=None):
+        return await resilience.acall(name, chain.ainvoke, value, config,
+                                      cost=estimate_tokens(value), model=model)
+
+    return RunnableLambda(invoke, afunc=ainvoke, name=name)
+
+
+# no first chunk, the stream was empty
+_EMPTY = object()
+
+
+def resilient_stream(chain: Runnable, name: str, value):
+    """
+    chain.stream(value) through the policy. The deadline, retries, hedging
+    and breaker apply until the first chunk arrives; the rest of the stream
+    is returned as it comes.
+    """
+    if not config.RESILIENCE_ENABLED:
+        acquire_budget(estimate_tokens(value))
+        return iter(chain.stream(value))
+
+    def open_stream():
+        chunks = iter(chain.stream(value))
+        return chunks, next(chunks, _EMPTY)
+
+    chunks, first = resilience.call(name, open_stream, cost=estimate_tokens(value))
+    return _prepend(first, chunks)
+
+
+def _prepend(first, chunks):
+    # a generator, so closing it closes the model stream
+    if first is not _EMPTY:
+        yield first
+    yield from chunks
+
+
+async def _aprepend(first, chunks):
+    try:
+        if first is not _EMPTY:
+            yield first
+        async for chunk in chunks:
+            yield chunk
+    finally:
+        if hasattr(chunks, "aclose"):
+            await chunks.aclose()
+
+
+async def aresilient_stream(chain: Runnable, name: str, value):
+    """Async version of resilient_stream, returns an async iterator"""
+    if not config.RESILIENCE_ENABLED:
+        await aacquire_budget(estimate_tokens(value))
+        return aiter(chain.astream(value))
+
+    async def open_stream():
+        chunks = aiter(chain.astream(value))
+        return chunks, await anext(chunks, _EMPTY)
+
+    chunks, first = await resilience.acall(name, open_stream, cost=estimate_tokens(value))
+    return _aprepend(first, chunks)
+
+
+class NodesDegraded(Exception):
+    """A checkpointed run finished without the outputs of some nodes"""
+
+    def __init__(self, nodes):
+        super().__init__(f"Nodes failed: {', '.join(nodes)}")
+        self.nodes = nodes
+
+
+def degrade_node(name: str, node_function):
+    """
+    Let an optional node fail without failing the graph: the error is logged
+    (and recorded by the run registry), the node is added to degraded_nodes
+    and the other branches' results are still written.
+    """
+
+    @functools.wraps(node_function)
+    def degraded_node(state):
+        try:
+            return node_function(state)
+        except Exception as e:
+            logger.error(f"{name} failed, continuing without it: {e}")
+            return {"degraded_nodes": [name]}
+
+    return degraded_node
+
+
+def adegrade_node(name: str, anode_function):
+    """Async version of degrade_node"""
+
+    @functools.wraps(anode_function)
+    async def degraded_node(state):
+        try:
+            return await anode_function(state)
+        except Exception as e:
+            logger.error(f"{name} failed, continuing without it: {e}")
+            return {"degraded_nodes": [name]}
+
+    return degraded_node
@@ -3,7 +3,10 @@
 # ----
 
 # Student profile type definition
-from typing import Optional, TypedDict
+import operator
+import re
+from dataclasses import asdict, dataclass
+from typing import Annotated, List, Optional, TypedDict
 
 
 class StudentProfile(TypedDict):
@@ -15,15 +18,54 @@ class StudentProfile(TypedDict):
 class UserPrompt(TypedDict):
     topic: str
     file_url: Optional[str]
+    source_hash: Optional[str]  # content hash of the ingested file
 
 
-class AgentState(TypedDict):
+_BLANK_LINES = re.compile(r"\n\s*\n+")
+_TRAILING_SPACES = re.compile(r"[ \t]+\n")
+
+
+@dataclass(frozen=True, slots=True)
+class SummaryNotes:
+    """The summary notes passed from the summary node to the others"""
+    title: str
+    summary: str
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SummaryNotes":
+        """From a SummaryNoteOutput dump, e.g. the learning_space column"""
+        return cls(title=data.get("title") or "", summary=data.get("summary") or "")
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    def prompt_text(self) -> str:
+        """Compact canonical markdown of the notes, as sent in the prompts"""
+        summary = _TRAILING_SPACES.sub("\n", self.summary.strip())
+        summary = _BLANK_LINES.sub("\n\n", summary)
+        return f"# {self.title.strip()}\n\n{summary}" if self.title.strip() else summary
+
+
+@dataclass(frozen=True, slots=True)
+class ArtifactRef:
+    """A JSON artifact kept in the artifact store instead of the graph state"""
+    key: str   # content hash in services.artifact_store
+    size: int  # bytes of the JSON
+
+
+class AgentState(TypedDict, total=False):
     learning_space_id: int
+    run_id: Optional[int]  # workflow id in the run registry
     student_profile: StudentProfile
     user_prompt: UserPrompt
-    summary_notes: str
+    summary_notes: SummaryNotes
+    summary_stream: str  # id of the open summary stream in streaming mode
     podcast_script: str
-    mindmap: str
-    quiz: str
-    recommendations: str
-    study_plan: str
+    audio_overview_url: str
+    mindmap: ArtifactRef
+    mindmap_layout: ArtifactRef  # node positions for drawing on the frontend
+    mindmap_url: str
+    quiz: ArtifactRef
+    recommendations: ArtifactRef
+    # nodes that failed and were skipped, appended by every attempt
+    degraded_nodes: Annotated[List[str], operator.add]
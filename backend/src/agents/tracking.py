@@ -0,0 +1,131 @@
+# ------
+# This file contains the wrapper that reports node progress to the run registry
+# and the node spans and token metrics to telemetry
+# ------
+
+import asyncio
+import functools
+import logging
+from langchain_core.callbacks import get_usage_metadata_callback
+from pydantic import BaseModel
+import config
+from agents.state import AgentState, ArtifactRef, SummaryNotes
+from services.artifact_store import REF_KEY
+from services.run_registry import run_registry
+from services.telemetry import metrics, span
+
+logger = logging.getLogger(__name__)
+
+
+def _jsonable(value):
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    if isinstance(value, SummaryNotes):
+        return value.to_dict()
+    # resolved when the output is read
+    if isinstance(value, ArtifactRef):
+        return {REF_KEY: value.key}
+    if isinstance(value, dict):
+        return {key: _jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(item) for item in value]
+    return value
+
+
+def _token_counts(usage_metadata: dict):
+    input_tokens = sum(usage.get("input_tokens", 0)
+                       for usage in usage_metadata.values())
+    output_tokens = sum(usage.get("output_tokens", 0)
+                        for usage in usage_metadata.values())
+    return input_tokens, output_tokens
+
+
+def _price(model: str) -> dict:
+    """USD per 1M tokens of a model, LLM_PRICE_* for models without their own price"""
+    prices = config.LLM_PRICES.get(model) or config.LLM_PRICES.get(model.rsplit("/", 1)[-1]) or {}
+    return {"input": prices.get("input", config.LLM_PRICE_INPUT),
+            "cached_input": prices.get("cached_input", config.LLM_PRICE_CACHED_INPUT),
+            "output": prices.get("output", config.LLM_PRICE_OUTPUT)}
+
+
+def _cost(model: str, usage: dict) -> float:
+    price = _price(model)
+    cached_tokens = (usage.get("input_token_details") or {}).get("cache_read", 0)
+    return ((usage.get("input_tokens", 0) - cached_tokens) * price["input"]
+            + cached_tokens * price["cached_input"]
+            + usage.get("output_tokens", 0) * price["output"]) / 1e6
+
+
+def _record_usage(name: str, node_span, usage_metadata: dict):
+    """Token and cost metrics of one node, also set on its span"""
+    input_tokens, output_tokens = _token_counts(usage_metadata)
+    cached_tokens = sum((usage.get("input_token_details") or {}).get("cache_read", 0)
+                        for usage in usage_metadata.values())
+    # usage is keyed by model name
+    cost = sum(_cost(model, usage) for model, usage in usage_metadata.items())
+
+    node_span.set(input_tokens=input_tokens, output_tokens=output_tokens,
+                  cached_tokens=cached_tokens, cost_usd=round(cost, 6))
+    metrics.inc("fluence_llm_tokens_total", input_tokens, node=name, direction="input")
+    metrics.inc("fluence_llm_tokens_total", output_tokens, node=name, direction="output")
+    metrics.inc("fluence_llm_cached_tokens_total", cached_tokens, node=name)
+    metrics.inc("fluence_llm_cost_usd_total", cost, node=name)
+    return input_tokens, output_tokens
+
+
+def track_node(name: str, node_function):
+    """
+    Wrap a graph node in a span with its token usage and cost, and record
+    its state, timings and output in the run registry. Runs without a
+    run_id are not recorded in the registry.
+    """
+
+    @functools.wraps(node_function)
+    def tracked_node(state: AgentState):
+        run_id = state.get("run_id")
+        with span(f"node.{name}", node=name, run_id=run_id) as node_span:
+            if run_id is not None:
+                run_registry.node_started(run_id, name)
+            with get_usage_metadata_callback() as usage:
+                try:
+                    result = node_function(state)
+                except Exception as e:
+                    tokens = _record_usage(name, node_span, usage.usage_metadata)
+                    if run_id is not None:
+                        run_registry.node_failed(run_id, name, str(e), *tokens)
+                    raise
+
+            tokens = _record_usage(name, node_span, usage.usage_metadata)
+            if run_id is not None:
+                run_registry.node_finished(run_id, name, _jsonable(result), *tokens)
+        return result
+
+    return tracked_node
+
+
+def atrack_node(name: str, node_function):
+    """Async version of track_node"""
+
+    @functools.wraps(node_function)
+    async def tracked_node(state: AgentState):
+        run_id = state.get("run_id")
+        with span(f"node.{name}", node=name, run_id=run_id) as node_span:
+            if run_id is not None:
+                await asyncio.to_thread(run_registry.node_started, run_id, name)
+            with get_usage_metadata_callback() as usage:
+                try:
+                    result = await node_function(state)
+                except Exception as e:
+                    tokens = _record_usage(name, node_span, usage.usage_metadata)
+                    if run_id is not None:
+                        await asyncio.to_thread(
+                            run_registry.node_failed, run_id, name, str(e), *tokens)
+                    raise
+
+            tokens = _record_usage(name, node_span, usage.usage_metadata)
+            if run_id is not None:
+                await asyncio.to_thread(
+                    run_registry.node_finished, run_id, name, _jsonable(result), *tokens)
+        return result
+
+    return tracked_node
@@ -1,11 +1,27 @@
+import asyncio
+import json
 import uuid
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from services.agent_workflow import invoke_agent_workflow
+import config
+from agents.registry import graph_registry
+from jobs.backends import JobStatus
+from jobs.queue import (
+    enqueue_agent_workflow, enqueue_batch, enqueue_regeneration, get_job_queue)
+from services.artifact_dependencies import available_artifacts
+from services.batch_workflow import get_batch_status
+from services.run_registry import run_registry
 from services.supabase_service import supabase_service
-from services.text_to_speech import generate_tts
+from services.learning_space_writer import learning_space_writer
+from services.storage import artifact_uploader
+from services.telemetry import install_log_redaction, metrics
+from services.tts import synthesize_script, tts_language_code
 
-router = APIRouter()
+# the API process truncates logged payloads like the workers
+router = APIRouter(on_startup=[install_log_redaction])
 
 # Define request body model
 
@@ -15,29 +31,195 @@ class WorkflowRequest(BaseModel):
     user_id: uuid.UUID
 
 
+class BatchWorkflowRequest(BaseModel):
+    items: List[WorkflowRequest]
+
+
+class RegenerateRequest(BaseModel):
+    learning_space_id: int
+    user_id: uuid.UUID
+    # learning_space columns, e.g. ["quiz"]; by default the artifacts whose
+    # inputs changed since they were generated
+    targets: Optional[List[str]] = None
+    # student profile fields for this regeneration only
+    language: Optional[str] = None
+    grade_level: Optional[str] = None
+
+
+def get_workflow_status(workflow_id: int, include_output: bool = False):
+    job = get_job_queue().get(workflow_id)
+    if job is None:
+        return None
+
+    run = run_registry.get_run(workflow_id, include_output=include_output)
+    return {
+        "workflow_id": workflow_id,
+        "learning_space_id": job.payload.get("learning_space_id"),
+        "job_status": job.status,
+        "queue_position": get_job_queue().position(workflow_id),
+        "attempts": job.attempts,
+        "error": job.error,
+        "run": run
+    }
+
+
 @router.get("/status/{workflow_id}")
-async def workflow_status(workflow_id: int):
+async def workflow_status(workflow_id: int, include_output: bool = False):
     try:
-        return {"message": "Workflow started successfully", "workflow_id": workflow_id}
+        status = await run_in_threadpool(
+            get_workflow_status, workflow_id, include_output)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+    if status is None:
+        raise HTTPException(status_code=404, detail="Workflow not found")
+    return status
+
+
+async def _workflow_events(workflow_id: int):
+    """Server-sent events for every node state change, ending with the run"""
+    sent = {}
+    while True:
+        status = await run_in_threadpool(get_workflow_status, workflow_id, True)
+        if status is None:
+            # the job was removed while the stream was open
+            error = {"workflow_id": workflow_id, "error": "Workflow not found"}
+            yield f"event: error\ndata: {json.dumps(error)}\n\n"
+            return
+        run = status["run"]
+
+        for node in (run["nodes"] if run else []):
+            version = (node["status"], node["updated_at"])
+            if sent.get(node["node"]) != version:
+                sent[node["node"]] = version
+                yield f"event: node\ndata: {json.dumps(node, default=str)}\n\n"
+
+        # a failed run is retried by the queue until the job itself fails; a
+        # finished job may have no run (e.g. a regeneration with nothing stale)
+        if status["job_status"] in (JobStatus.DONE, JobStatus.FAILED):
+            if run:
+                run.pop("nodes")
+            status["run"] = run
+            yield f"event: run\ndata: {json.dumps(status, default=str)}\n\n"
+            return
+
+        await asyncio.sleep(config.STATUS_STREAM_INTERVAL)
+
+
+@router.get("/status/{workflow_id}/stream")
+async def workflow_status_stream(workflow_id: int):
+    job = await run_in_threadpool(get_job_queue().get, workflow_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Workflow not found")
+
+    return StreamingResponse(_workflow_events(workflow_id),
+                             media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
 
 # We can also add an auth layer to protect the api
 @router.post("/invoke")
-async def workflow_invoke(request: WorkflowRequest, background_tasks: BackgroundTasks):
+async def workflow_invoke(request: WorkflowRequest):
     try:
-        # invoke the workflow in background tasks
-        # pass the function to be run and the arguments in the correct order
-        background_tasks.add_task(
-            invoke_agent_workflow, request.learning_space_id, request.user_id)
-        return {"message": "Workflow started successfully.", "learning_space_id": request.learning_space_id}
+        # queue the workflow, the worker pool (python -m jobs.worker) runs it
+        job = await run_in_threadpool(
+            enqueue_agent_workflow, request.learning_space_id, request.user_id)
+        # jobs ahead of this one; the run is admitted when a worker and the
+        # LLM budget are free instead of failing under load
+        position = await run_in_threadpool(get_job_queue().position, job.id)
+        return {"message": "Workflow queued successfully.", "learning_space_id": request.learning_space_id,
+                "workflow_id": job.id, "status": job.status, "priority": job.priority,
+                "queue_position": position}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@router.post("/regenerate")
+async def workflow_regenerate(request: RegenerateRequest):
+    """Regenerate some artifacts from the stored summary instead of the whole graph"""
+    unknown = set(request.targets or []) - set(available_artifacts())
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown artifacts: {sorted(unknown)}")
+    overrides = request.model_dump(include={"language", "grade_level"}, exclude_none=True)
+    try:
+        job = await run_in_threadpool(
+            enqueue_regeneration, request.learning_space_id, request.user_id,
+            request.targets, overrides)
+        position = await run_in_threadpool(get_job_queue().position, job.id)
+        return {"message": "Regeneration queued successfully.",
+                "learning_space_id": request.learning_space_id, "workflow_id": job.id,
+                "status": job.status, "queue_position": position}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/invoke/batch")
+async def workflow_invoke_batch(request: BatchWorkflowRequest):
+    """Queue workflows for a whole class; identical learning spaces are generated once"""
+    if not request.items:
+        raise HTTPException(status_code=400, detail="No items in the batch")
+    if len(request.items) > config.BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400, detail=f"A batch holds at most {config.BATCH_MAX_ITEMS} items")
+    try:
+        job = await run_in_threadpool(
+            enqueue_batch, [(item.learning_space_id, item.user_id) for item in request.items])
+        return {"message": "Batch queued successfully.", "batch_id": job.batch_id,
+                "learning_spaces": len(request.items), "priority": job.priority}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/invoke/batch/{batch_id}")
+async def workflow_batch_status(batch_id: str):
+    status = await run_in_threadpool(get_batch_status, batch_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return status
+
+
+@router.get("/graph")
+async def graph_versions():
+    return {"active_version": graph_registry.active_version(), "versions": graph_registry.versions()}
+
+
+@router.put("/graph/{version}")
+async def graph_activate(version: str):
+    """Hot-swap the agent graph used by the workers"""
+    if version not in graph_registry.versions():
+        raise HTTPException(status_code=404, detail="Unknown graph version")
+    try:
+        await run_in_threadpool(graph_registry.activate, version)
+        return {"message": "Graph version activated.", "active_version": version}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Metrics of the API and worker processes in the Prometheus text format"""
+    text = await run_in_threadpool(metrics.render)
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
+
+
+def _synthesize_audio_summary(learning_space_id: int, script: str, language_code: str):
+    """Run the TTS pipeline outside the graph and write the audio url"""
+    with learning_space_writer.run():
+        try:
+            url = synthesize_script(script, language_code, learning_space_id)
+            if not artifact_uploader.wait(learning_space_id, config.STORAGE_UPLOAD_TIMEOUT):
+                raise RuntimeError("Audio upload failed")
+        finally:
+            learning_space_writer.close(learning_space_id)
+    return url
+
+
 @router.post("/audio-summary")
 async def audio_summary(request: WorkflowRequest):
+    """
+    Regenerate the audio overview from the stored script. Workflow runs
+    already synthesise it in the graph; cached chunks make this cheap.
+    """
     try:
         # get the learning space
         learning_space = supabase_service.get_learning_space(
@@ -46,14 +228,14 @@ async def audio_summary(request: WorkflowRequest):
 
         if learning_space.get('audio_script'):
             # process tts
-            language_code = 'hi-IN' if student_profile['language'] == 'hindi' else 'en-IN'
-            tts = generate_tts(learning_space['audio_script'], language_code)
+            language_code = tts_language_code(student_profile['language'])
+            audio_url = await run_in_threadpool(
+                _synthesize_audio_summary, request.learning_space_id,
+                learning_space['audio_script'], language_code)
 
-            supabase_service.update_learning_space(
-                request.learning_space_id, {'audio_overview': tts['public_url']})
             return {
                 'success': True,
-                'audio_url': tts['public_url']
+                'audio_url': audio_url
             }
         else:
             return {"message": "No audio script found.", "learning_space_id": request.learning_space_id, "success": False}
@@ -0,0 +1,248 @@
+# -----
+# This file contains the runtime configuration read from the environment
+# -----
+
+import json
+import os
+from urllib.parse import urlparse
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+# local directory for queue databases, caches and other on-disk state
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(os.getcwd(), ".data"))
+
+
+# ------- Job Queue --------
+JOB_QUEUE_BACKEND = os.getenv(
+    "JOB_QUEUE_BACKEND", "jobs.backends.SQLiteJobQueue")
+JOB_QUEUE_PATH = os.getenv(
+    "JOB_QUEUE_PATH", os.path.join(DATA_DIR, "jobs.sqlite3"))
+JOB_WORKERS = _env_int("JOB_WORKERS", 2)
+JOB_TENANT_CONCURRENCY = _env_int("JOB_TENANT_CONCURRENCY", 2)
+JOB_MAX_ATTEMPTS = _env_int("JOB_MAX_ATTEMPTS", 3)
+JOB_RETRY_BASE_DELAY = _env_float("JOB_RETRY_BASE_DELAY", 5.0)
+JOB_RETRY_MAX_DELAY = _env_float("JOB_RETRY_MAX_DELAY", 300.0)
+JOB_LEASE_SECONDS = _env_float("JOB_LEASE_SECONDS", 60.0)
+JOB_POLL_INTERVAL = _env_float("JOB_POLL_INTERVAL", 1.0)
+# "sync" runs one job at a time per worker, "async" runs up to
+# JOB_ASYNC_CONCURRENCY jobs per worker on a single event loop
+JOB_WORKER_MODE = os.getenv("JOB_WORKER_MODE", "sync")
+JOB_ASYNC_CONCURRENCY = _env_int("JOB_ASYNC_CONCURRENCY", 50)
+
+
+# ------- Run Registry --------
+RUN_REGISTRY_PATH = os.getenv(
+    "RUN_REGISTRY_PATH", os.path.join(DATA_DIR, "runs.sqlite3"))
+STATUS_STREAM_INTERVAL = _env_float("STATUS_STREAM_INTERVAL", 0.5)
+
+
+# ------- Agent Graph --------
+GRAPH_VERSION = os.getenv("GRAPH_VERSION", "v1")
+GRAPH_VERSION_FILE = os.getenv(
+    "GRAPH_VERSION_FILE", os.path.join(DATA_DIR, "graph_version"))
+
+
+# ------- Chat Models --------
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.5-flash")
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "google_genai")
+# "grpc" keeps one multiplexed HTTP/2 channel per client, "rest" uses a
+# keep-alive HTTP session
+LLM_TRANSPORT = os.getenv("LLM_TRANSPORT", "grpc")
+LLM_TIMEOUT = _env_float("LLM_TIMEOUT", 120.0)
+
+
+# ------- Caches --------
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(DATA_DIR, "cache"))
+# bump when prompts change so cached artifacts are not reused across versions
+PROMPT_VERSION = os.getenv("PROMPT_VERSION", "1")
+# active version per prompt of agents.prompts (default the latest), e.g.
+# PROMPT_VERSIONS='{"node_quiz": "2"}' for an experiment
+PROMPT_VERSIONS = json.loads(os.getenv("PROMPT_VERSIONS", "{}"))
+# input tokens per prompt, e.g. PROMPT_TOKEN_BUDGETS='{"node_quiz": 4000}';
+# the summary notes are shortened to fit
+PROMPT_TOKEN_BUDGETS = json.loads(os.getenv("PROMPT_TOKEN_BUDGETS", "{}"))
+ARTIFACT_CACHE_ENABLED = os.getenv("ARTIFACT_CACHE_ENABLED", "true").lower() == "true"
+ARTIFACT_CACHE_TTL = _env_float("ARTIFACT_CACHE_TTL", 7 * 24 * 3600)
+ARTIFACT_CACHE_MAX_ENTRIES = _env_int("ARTIFACT_CACHE_MAX_ENTRIES", 10000)
+# fingerprints of the inputs each stored artifact was generated from, used
+# to regenerate only the artifacts whose inputs changed
+ARTIFACT_INPUTS_PATH = os.getenv(
+    "ARTIFACT_INPUTS_PATH", os.path.join(DATA_DIR, "artifact_inputs.sqlite3"))
+ARTIFACT_INPUTS_TTL = _env_float("ARTIFACT_INPUTS_TTL", 365 * 24 * 3600)
+ARTIFACT_INPUTS_MAX_ENTRIES = _env_int("ARTIFACT_INPUTS_MAX_ENTRIES", 1000000)
+# quiz, recommendations and mindmap JSON referenced by graph states,
+# checkpoints and run outputs
+ARTIFACT_STORE_TTL = _env_float("ARTIFACT_STORE_TTL", 14 * 24 * 3600)
+ARTIFACT_STORE_MAX_ENTRIES = _env_int("ARTIFACT_STORE_MAX_ENTRIES", 200000)
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = _env_float("SEMANTIC_CACHE_THRESHOLD", 0.92)
+SEMANTIC_CACHE_MAX_ENTRIES = _env_int("SEMANTIC_CACHE_MAX_ENTRIES", 5000)
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "models/text-embedding-004")
+
+
+# ------- Summary Streaming --------
+# downstream nodes start once this many summary sections (markdown headings)
+# or top level bullet points are complete
+SUMMARY_EARLY_SECTIONS = _env_int("SUMMARY_EARLY_SECTIONS", 3)
+SUMMARY_EARLY_ITEMS = _env_int("SUMMARY_EARLY_ITEMS", 6)
+# seconds after which a summary stream never finished by its run is dropped
+SUMMARY_STREAM_TTL = _env_float("SUMMARY_STREAM_TTL", 600.0)
+# seconds between progressive writes of the partial summary
+SUMMARY_PROGRESS_INTERVAL = _env_float("SUMMARY_PROGRESS_INTERVAL", 2.0)
+
+
+# ------- Source Ingestion --------
+SOURCES_DIR = os.getenv("SOURCES_DIR", os.path.join(DATA_DIR, "sources"))
+INGEST_MAX_BYTES = _env_int("INGEST_MAX_BYTES", 50 * 1024 * 1024)
+# hosts sources are downloaded from (https only), by default the Supabase
+# project whose storage holds the uploads; comma separated
+INGEST_ALLOWED_HOSTS = [
+    host.strip().lower() for host in os.getenv(
+        "INGEST_ALLOWED_HOSTS", urlparse(os.getenv("SUPABASE_URL", "")).hostname or ""
+    ).split(",") if host.strip()]
+INGEST_DOWNLOAD_TIMEOUT = _env_float("INGEST_DOWNLOAD_TIMEOUT", 60.0)
+INGEST_CHUNK_CHARS = _env_int("INGEST_CHUNK_CHARS", 4000)
+INGEST_CHUNK_OVERLAP = _env_int("INGEST_CHUNK_OVERLAP", 200)
+# characters of extracted text sent to the model with the topic
+INGEST_CONTEXT_CHARS = _env_int("INGEST_CONTEXT_CHARS", 60000)
+
+
+# ------- Map-Reduce Summarisation --------
+# documents whose extracted text exceeds INGEST_CONTEXT_CHARS are summarised
+# chunk by chunk first
+MAPREDUCE_ENABLED = os.getenv("MAPREDUCE_ENABLED", "true").lower() == "true"
+MAPREDUCE_MODEL = os.getenv("MAPREDUCE_MODEL", LLM_MODEL)
+MAPREDUCE_CONCURRENCY = _env_int("MAPREDUCE_CONCURRENCY", 8)
+MAPREDUCE_CACHE_MAX_ENTRIES = _env_int("MAPREDUCE_CACHE_MAX_ENTRIES", 50000)
+
+
+# ------- Learning Space Writes --------
+# "run" buffers the patches of a workflow and writes them once at the end,
+# "node" writes after every node so clients see progress in the table
+LEARNING_SPACE_FLUSH_MODE = os.getenv("LEARNING_SPACE_FLUSH_MODE", "run")
+LEARNING_SPACE_FLUSH_CONCURRENCY = _env_int("LEARNING_SPACE_FLUSH_CONCURRENCY", 8)
+
+# ------- Checkpoints --------
+# "sqlite", "memory" (this process only), "none" or a dotted path to a
+# langgraph BaseCheckpointSaver subclass. A retried job resumes its graph
+# run from the nodes that had not finished.
+CHECKPOINT_BACKEND = os.getenv("CHECKPOINT_BACKEND", "sqlite")
+CHECKPOINT_PATH = os.getenv(
+    "CHECKPOINT_PATH", os.path.join(DATA_DIR, "checkpoints.sqlite3"))
+# checkpoints of runs that failed for good are dropped after this long
+CHECKPOINT_TTL = _env_float("CHECKPOINT_TTL", 7 * 24 * 3600)
+CHECKPOINT_MAX_THREADS = _env_int("CHECKPOINT_MAX_THREADS", 10000)
+
+# ------- Batches --------
+BATCH_MAX_ITEMS = _env_int("BATCH_MAX_ITEMS", 2000)
+# concurrent lookups when supabase_service has no bulk query
+BATCH_LOOKUP_CONCURRENCY = _env_int("BATCH_LOOKUP_CONCURRENCY", 8)
+
+
+# ------- Artifact Storage --------
+# dotted path of the StorageBackend class used for generated files
+STORAGE_BACKEND = os.getenv(
+    "STORAGE_BACKEND", "services.storage.SupabaseStorageBackend")
+# LocalStorageBackend
+STORAGE_LOCAL_DIR = os.getenv(
+    "STORAGE_LOCAL_DIR", os.path.join(DATA_DIR, "storage"))
+STORAGE_PUBLIC_BASE_URL = os.getenv("STORAGE_PUBLIC_BASE_URL", "")
+# S3StorageBackend (AWS S3, MinIO or any S3 compatible endpoint)
+STORAGE_S3_BUCKET = os.getenv("STORAGE_S3_BUCKET", "")
+STORAGE_S3_ENDPOINT_URL = os.getenv("STORAGE_S3_ENDPOINT_URL") or None
+STORAGE_UPLOAD_WORKERS = _env_int("STORAGE_UPLOAD_WORKERS", 4)
+STORAGE_UPLOAD_ATTEMPTS = _env_int("STORAGE_UPLOAD_ATTEMPTS", 4)
+STORAGE_UPLOAD_RETRY_DELAY = _env_float("STORAGE_UPLOAD_RETRY_DELAY", 1.0)
+# how long a finished workflow waits for its uploads before writing results
+STORAGE_UPLOAD_TIMEOUT = _env_float("STORAGE_UPLOAD_TIMEOUT", 120.0)
+
+
+# ------- Mindmap --------
+# "svg" is drawn in-process, "png" also needs cairosvg (falls back to svg)
+MINDMAP_FORMAT = os.getenv("MINDMAP_FORMAT", "svg")
+MINDMAP_PNG_RENDERERS = _env_int("MINDMAP_PNG_RENDERERS", 2)
+MINDMAP_CACHE_ENABLED = os.getenv("MINDMAP_CACHE_ENABLED", "true").lower() == "true"
+MINDMAP_CACHE_TTL = _env_float("MINDMAP_CACHE_TTL", 30 * 24 * 3600)
+MINDMAP_CACHE_MAX_ENTRIES = _env_int("MINDMAP_CACHE_MAX_ENTRIES", 20000)
+
+
+# ------- Text to Speech --------
+# audio overviews are synthesised with Amazon Polly in the graph
+# opt in: needs AWS credentials with access to Amazon Polly
+TTS_ENABLED = os.getenv("TTS_ENABLED", "false").lower() == "true"
+TTS_VOICE = os.getenv("TTS_VOICE", "Kajal")
+TTS_ENGINE = os.getenv("TTS_ENGINE", "neural")
+TTS_FORMAT = os.getenv("TTS_FORMAT", "mp3")
+TTS_CHUNK_CHARS = _env_int("TTS_CHUNK_CHARS", 500)
+TTS_CONCURRENCY = _env_int("TTS_CONCURRENCY", 4)
+TTS_CACHE_MAX_FILES = _env_int("TTS_CACHE_MAX_FILES", 20000)
+
+
+# ------- Resilience --------
+RESILIENCE_ENABLED = os.getenv("RESILIENCE_ENABLED", "true").lower() == "true"
+# seconds per LLM call attempt, with per node overrides as a JSON object,
+# e.g. RESILIENCE_DEADLINES='{"node_summary_notes": 120}'
+RESILIENCE_DEADLINE = _env_float("RESILIENCE_DEADLINE", 60.0)
+RESILIENCE_DEADLINES = json.loads(os.getenv("RESILIENCE_DEADLINES", "{}"))
+RESILIENCE_RETRIES = _env_int("RESILIENCE_RETRIES", 2)
+RESILIENCE_RETRY_BASE_DELAY = _env_float("RESILIENCE_RETRY_BASE_DELAY", 1.0)
+RESILIENCE_RETRY_MAX_DELAY = _env_float("RESILIENCE_RETRY_MAX_DELAY", 10.0)
+# a duplicate request is sent when a call runs past this latency percentile
+RESILIENCE_HEDGE = os.getenv("RESILIENCE_HEDGE", "true").lower() == "true"
+RESILIENCE_HEDGE_PERCENTILE = _env_float("RESILIENCE_HEDGE_PERCENTILE", 95.0)
+RESILIENCE_HEDGE_MIN_SAMPLES = _env_int("RESILIENCE_HEDGE_MIN_SAMPLES", 20)
+RESILIENCE_LATENCY_WINDOW = _env_int("RESILIENCE_LATENCY_WINDOW", 200)
+RESILIENCE_BREAKER_FAILURES = _env_int("RESILIENCE_BREAKER_FAILURES", 5)
+RESILIENCE_BREAKER_RESET = _env_float("RESILIENCE_BREAKER_RESET", 30.0)
+RESILIENCE_MAX_THREADS = _env_int("RESILIENCE_MAX_THREADS", 32)
+# nodes other than the summary may fail without failing the workflow; a job
+# run still fails with NodesDegraded and its retry reruns only those nodes
+RESILIENCE_DEGRADE = os.getenv("RESILIENCE_DEGRADE", "true").lower() == "true"
+
+
+# ------- LLM Rate Limits --------
+LLM_RATE_LIMIT_ENABLED = os.getenv("LLM_RATE_LIMIT_ENABLED", "true").lower() == "true"
+LLM_REQUESTS_PER_MINUTE = _env_int("LLM_REQUESTS_PER_MINUTE", 1000)
+LLM_TOKENS_PER_MINUTE = _env_int("LLM_TOKENS_PER_MINUTE", 1000000)
+# "memory" limits each process (set the budgets to the provider limits
+# divided by the processes), "sqlite" shares the budget between the
+# processes of a host through LLM_RATE_LIMIT_PATH, at the cost of a write
+# lock on that file for every call
+LLM_RATE_LIMIT_STORE = os.getenv("LLM_RATE_LIMIT_STORE", "memory")
+LLM_RATE_LIMIT_PATH = os.getenv(
+    "LLM_RATE_LIMIT_PATH", os.path.join(DATA_DIR, "rate_limits.sqlite3"))
+# share of the budget batch work leaves to interactive requests
+LLM_BATCH_RESERVE = _env_float("LLM_BATCH_RESERVE", 0.2)
+# prompt template and expected output tokens added to the input estimate
+LLM_REQUEST_OVERHEAD_TOKENS = _env_int("LLM_REQUEST_OVERHEAD_TOKENS", 1500)
+
+
+# ------- Telemetry --------
+# "none", "log" (one JSON line per span), "memory", "otel" (through the
+# OpenTelemetry API, needs opentelemetry-sdk) or a dotted path to a
+# SpanExporter subclass
+TELEMETRY_EXPORTER = os.getenv("TELEMETRY_EXPORTER", "none")
+# metrics of all processes sharing DATA_DIR, served on /metrics
+METRICS_PATH = os.getenv("METRICS_PATH", os.path.join(DATA_DIR, "metrics.sqlite3"))
+METRICS_FLUSH_INTERVAL = _env_float("METRICS_FLUSH_INTERVAL", 10.0)
+# longest string kept in span attributes and log messages
+TELEMETRY_REDACT_CHARS = _env_int("TELEMETRY_REDACT_CHARS", 200)
+LOG_MAX_CHARS = _env_int("LOG_MAX_CHARS", 2000)
+# USD per 1M tokens of LLM_MODEL, for the cost metric
+LLM_PRICE_INPUT = _env_float("LLM_PRICE_INPUT", 0.30)
+LLM_PRICE_OUTPUT = _env_float("LLM_PRICE_OUTPUT", 2.50)
+LLM_PRICE_CACHED_INPUT = _env_float("LLM_PRICE_CACHED_INPUT", 0.075)
+# prices of other models (e.g. MAPREDUCE_MODEL) by model name, e.g.
+# LLM_PRICES='{"gemini-2.5-flash-lite": {"input": 0.10, "output": 0.40, "cached_input": 0.025}}';
+# models not listed are priced as LLM_MODEL
+LLM_PRICES = json.loads(os.getenv("LLM_PRICES", "{}"))
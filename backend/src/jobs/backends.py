@@ -0,0 +1,303 @@
+# -----
+# This file contains the storage backends for the job queue
+# -----
+
+import json
+import os
+import random
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel
+
+
+# ------- Job Structure --------
+class JobStatus:
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class JobPriority:
+    """Higher runs first: interactive requests go ahead of batch regenerations"""
+    BATCH = 0
+    INTERACTIVE = 10
+
+
+class Job(BaseModel):
+    id: int
+    kind: str
+    payload: Dict[str, Any]
+    tenant: str
+    status: str
+    attempts: int
+    max_attempts: int
+    priority: int = JobPriority.INTERACTIVE
+    batch_id: Optional[str] = None
+    run_at: float
+    lease_until: Optional[float] = None
+    worker_id: Optional[str] = None
+    error: Optional[str] = None
+    created_at: float
+    updated_at: float
+
+
+# ------- Backend Interface --------
+class JobQueueBackend:
+    """
+    Base class for job queue backends. A backend must be safe to use from
+    several worker processes at the same time.
+    """
+
+    def enqueue(self, kind: str, payload: Dict[str, Any], tenant: str,
+                max_attempts: int, priority: int = JobPriority.INTERACTIVE,
+                batch_id: Optional[str] = None) -> Job:
+        raise NotImplementedError
+
+    def claim(self, worker_id: str, tenant_limit: int,
+              lease_seconds: float) -> Optional[Job]:
+        """Atomically move the next runnable job to running and return it"""
+        raise NotImplementedError
+
+    def heartbeat(self, job_id: int, worker_id: str, lease_seconds: float):
+        raise NotImplementedError
+
+    def complete(self, job_id: int, worker_id: str) -> bool:
+        """
+        Mark the job done. False when worker_id no longer holds the lease
+        (it expired and the job was re-queued or claimed by another worker).
+        """
+        raise NotImplementedError
+
+    def fail(self, job_id: int, worker_id: str, error: str, base_delay: float,
+             max_delay: float) -> Optional[Job]:
+        """
+        Record a failed attempt and schedule a retry if attempts remain.
+        None when worker_id no longer holds the lease.
+        """
+        raise NotImplementedError
+
+    def requeue_expired(self) -> int:
+        """Return running jobs whose worker stopped heartbeating to the queue"""
+        raise NotImplementedError
+
+    def get(self, job_id: int) -> Optional[Job]:
+        raise NotImplementedError
+
+    def position(self, job_id: int) -> Optional[int]:
+        """Number of queued jobs that run before job_id, None if it is not queued"""
+        raise NotImplementedError
+
+    def batch_jobs(self, batch_id: str) -> List[Job]:
+        """All jobs enqueued for a batch, oldest first"""
+        raise NotImplementedError
+
+
+def retry_delay(attempts: int, base_delay: float, max_delay: float) -> float:
+    """Exponential backoff with jitter for the given number of attempts"""
+    delay = min(max_delay, base_delay * (2 ** max(attempts - 1, 0)))
+    return delay * random.uniform(0.5, 1.0)
+
+
+# ------- SQLite Backend --------
+class SQLiteJobQueue(JobQueueBackend):
+    """Job queue stored in a local SQLite database (WAL mode)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._create_schema()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _create_schema(self):
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    tenant TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    max_attempts INTEGER NOT NULL,
+                    priority INTEGER NOT NULL DEFAULT 10,
+                    batch_id TEXT,
+                    run_at REAL NOT NULL,
+                    lease_until REAL,
+                    worker_id TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_jobs_status_run_at
+                    ON jobs (status, run_at);
+                CREATE INDEX IF NOT EXISTS idx_jobs_tenant_status
+                    ON jobs (tenant, status);
+            """)
+            # queues created before job priorities
+            columns = [row["name"] for row in conn.execute("PRAGMA table_info(jobs)")]
+            if "priority" not in columns:
+                conn.execute(
+                    "ALTER TABLE jobs ADD COLUMN priority INTEGER NOT NULL DEFAULT 10")
+            conn.execute("""CREATE INDEX IF NOT EXISTS idx_jobs_status_priority
+                            ON jobs (status, priority, run_at)""")
+            # queues created before batches
+            if "batch_id" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN batch_id TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_batch_id ON jobs (batch_id)")
+
+    @staticmethod
+    def _to_job(row) -> Job:
+        data = dict(row)
+        data["payload"] = json.loads(data["payload"])
+        return Job(**data)
+
+    def enqueue(self, kind, payload, tenant, max_attempts,
+                priority=JobPriority.INTERACTIVE, batch_id=None):
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                """INSERT INTO jobs (kind, payload, tenant, status, max_attempts,
+                                     priority, batch_id, run_at, created_at, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (kind, json.dumps(payload), tenant, JobStatus.QUEUED,
+                 max_attempts, priority, batch_id, now, now, now))
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?",
+                               (cursor.lastrowid,)).fetchone()
+        return self._to_job(row)
+
+    def claim(self, worker_id, tenant_limit, lease_seconds):
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                """SELECT * FROM jobs AS j
+                   WHERE j.status = ? AND j.run_at <= ?
+                     AND (SELECT COUNT(*) FROM jobs AS r
+                          WHERE r.tenant = j.tenant AND r.status = ?) < ?
+                   ORDER BY j.priority DESC, j.run_at, j.id
+                   LIMIT 1""",
+                (JobStatus.QUEUED, now, JobStatus.RUNNING, tenant_limit)).fetchone()
+            if row is None:
+                return None
+
+            conn.execute(
+                """UPDATE jobs
+                   SET status = ?, attempts = attempts + 1, worker_id = ?,
+                       lease_until = ?, updated_at = ?
+                   WHERE id = ?""",
+                (JobStatus.RUNNING, worker_id, now + lease_seconds, now, row["id"]))
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?",
+                               (row["id"],)).fetchone()
+        return self._to_job(row)
+
+    def heartbeat(self, job_id, worker_id, lease_seconds):
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                """UPDATE jobs SET lease_until = ?, updated_at = ?
+                   WHERE id = ? AND worker_id = ? AND status = ?""",
+                (now + lease_seconds, now, job_id, worker_id, JobStatus.RUNNING))
+
+    def complete(self, job_id, worker_id):
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                """UPDATE jobs SET status = ?, lease_until = NULL, error = NULL,
+                                   updated_at = ?
+                   WHERE id = ? AND worker_id = ? AND status = ?""",
+                (JobStatus.DONE, now, job_id, worker_id, JobStatus.RUNNING))
+        return cursor.rowcount == 1
+
+    def fail(self, job_id, worker_id, error, base_delay, max_delay):
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE id = ? AND worker_id = ? AND status = ?",
+                (job_id, worker_id, JobStatus.RUNNING)).fetchone()
+            if row is None:
+                return None
+            if row["attempts"] < row["max_attempts"]:
+                status = JobStatus.QUEUED
+                run_at = now + retry_delay(row["attempts"], base_delay, max_delay)
+            else:
+                status = JobStatus.FAILED
+                run_at = row["run_at"]
+
+            conn.execute(
+                """UPDATE jobs SET status = ?, run_at = ?, lease_until = NULL,
+                                   error = ?, updated_at = ?
+                   WHERE id = ? AND worker_id = ?""",
+                (status, run_at, error, now, job_id, worker_id))
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?",
+                               (job_id,)).fetchone()
+        return self._to_job(row)
+
+    def requeue_expired(self):
+        now = time.time()
+        with self._transaction() as conn:
+            # a crashed worker already used up the attempt it claimed, so jobs
+            # that have no attempts left are marked failed instead
+            conn.execute(
+                """UPDATE jobs SET status = ?, lease_until = NULL,
+                                   error = 'worker lease expired', updated_at = ?
+                   WHERE status = ? AND lease_until < ?
+                     AND attempts >= max_attempts""",
+                (JobStatus.FAILED, now, JobStatus.RUNNING, now))
+            cursor = conn.execute(
+                """UPDATE jobs SET status = ?, run_at = ?, lease_until = NULL,
+                                   error = 'worker lease expired', updated_at = ?
+                   WHERE status = ? AND lease_until < ?""",
+                (JobStatus.QUEUED, now, now, JobStatus.RUNNING, now))
+        return cursor.rowcount
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?",
+                               (job_id,)).fetchone()
+        return self._to_job(row) if row else None
+
+    def position(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?",
+                               (job_id,)).fetchone()
+            if row is None or row["status"] != JobStatus.QUEUED:
+                return None
+            # claim order: priority, then run_at, then id
+            return conn.execute(
+                """SELECT COUNT(*) FROM jobs
+                   WHERE status = ? AND id != ?
+                     AND (priority > ?
+                          OR (priority = ? AND (run_at < ?
+                              OR (run_at = ? AND id < ?))))""",
+                (JobStatus.QUEUED, job_id, row["priority"], row["priority"],
+                 row["run_at"], row["run_at"], job_id)).fetchone()[0]
+
+    def batch_jobs(self, batch_id):
+        with self._connect() as conn:
+            rows = conn.execute("SELECT * FROM jobs WHERE batch_id = ? ORDER BY id",
+                                (batch_id,)).fetchall()
+        return [self._to_job(row) for row in rows]
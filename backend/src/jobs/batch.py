@@ -0,0 +1,75 @@
+# -----
+# Command line for batch generation: queue the learning spaces of a class
+# from a CSV file (learning_space_id,user_id) and follow the progress
+# Usage: python -m jobs.batch class.csv [--wait]
+#        python -m jobs.batch --status BATCH_ID
+# -----
+
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+import config
+from jobs.queue import enqueue_batch
+from services.batch_workflow import get_batch_status
+
+
+def read_items(path: str):
+    with open(path, newline="") as f:
+        return [(int(row["learning_space_id"]), uuid.UUID(row["user_id"]))
+                for row in csv.DictReader(f)]
+
+
+def print_status(status: dict):
+    learning_spaces = status["learning_spaces"]
+    print(f"{status['batch_id']} {status['status']}: {learning_spaces['done']}/"
+          f"{learning_spaces['total']} done, {learning_spaces['failed']} failed, "
+          f"{learning_spaces['running']} running, {learning_spaces['skipped']} skipped "
+          f"({status['groups']} groups)")
+
+
+def wait(batch_id: str, interval: float):
+    while True:
+        status = get_batch_status(batch_id)
+        print_status(status)
+        if status["status"] in ("done", "failed"):
+            return status
+        time.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Queue agent workflows for many learning spaces")
+    parser.add_argument("items", nargs="?", help="CSV file with learning_space_id,user_id columns")
+    parser.add_argument("--status", metavar="BATCH_ID", help="show the progress of a batch")
+    parser.add_argument("--wait", action="store_true", help="follow the batch until it is done")
+    parser.add_argument("--interval", type=float, default=5.0)
+    args = parser.parse_args()
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING"))
+
+    if args.status:
+        status = get_batch_status(args.status)
+        if status is None:
+            sys.exit(f"Unknown batch {args.status}")
+        if args.wait:
+            status = wait(args.status, args.interval)
+        print(json.dumps(status, indent=2))
+        return
+
+    if not args.items:
+        parser.error("a CSV file or --status is required")
+    items = read_items(args.items)
+    if len(items) > config.BATCH_MAX_ITEMS:
+        sys.exit(f"A batch holds at most {config.BATCH_MAX_ITEMS} items, got {len(items)}")
+
+    job = enqueue_batch(items)
+    print(f"Queued batch {job.batch_id} with {len(items)} learning spaces")
+    if args.wait:
+        wait(job.batch_id, args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# Job handlers executed by the workers, keyed by job kind
+
+import asyncio
+import uuid
+from jobs.backends import Job, JobPriority
+from jobs.queue import AGENT_WORKFLOW_JOB, BATCH_GROUP_JOB, BATCH_PLAN_JOB, REGENERATE_JOB
+from services.agent_workflow import invoke_agent_workflow, ainvoke_agent_workflow
+from services.batch_workflow import arun_group, plan_batch, run_group
+from services.regeneration import aregenerate_artifacts, regenerate_artifacts
+from services.rate_limiter import low_priority
+
+
+def run_agent_workflow(job: Job):
+    # batch jobs leave part of the LLM budget to interactive ones
+    low_priority.set(job.priority < JobPriority.INTERACTIVE)
+    invoke_agent_workflow(
+        job.payload["learning_space_id"], uuid.UUID(job.payload["user_id"]),
+        run_id=job.id)
+
+
+async def arun_agent_workflow(job: Job):
+    low_priority.set(job.priority < JobPriority.INTERACTIVE)
+    await ainvoke_agent_workflow(
+        job.payload["learning_space_id"], uuid.UUID(job.payload["user_id"]),
+        run_id=job.id)
+
+
+def run_regeneration(job: Job):
+    low_priority.set(job.priority < JobPriority.INTERACTIVE)
+    regenerate_artifacts(
+        job.payload["learning_space_id"], uuid.UUID(job.payload["user_id"]),
+        targets=job.payload["targets"], overrides=job.payload["overrides"], run_id=job.id)
+
+
+async def arun_regeneration(job: Job):
+    low_priority.set(job.priority < JobPriority.INTERACTIVE)
+    await aregenerate_artifacts(
+        job.payload["learning_space_id"], uuid.UUID(job.payload["user_id"]),
+        targets=job.payload["targets"], overrides=job.payload["overrides"], run_id=job.id)
+
+
+def run_batch_group(job: Job):
+    low_priority.set(job.priority < JobPriority.INTERACTIVE)
+    run_group(job)
+
+
+async def arun_batch_group(job: Job):
+    low_priority.set(job.priority < JobPriority.INTERACTIVE)
+    await arun_group(job)
+
+
+async def aplan_batch(job: Job):
+    await asyncio.to_thread(plan_batch, job)
+
+
+HANDLERS = {
+    AGENT_WORKFLOW_JOB: run_agent_workflow,
+    BATCH_PLAN_JOB: plan_batch,
+    BATCH_GROUP_JOB: run_batch_group,
+    REGENERATE_JOB: run_regeneration,
+}
+
+ASYNC_HANDLERS = {
+    AGENT_WORKFLOW_JOB: arun_agent_workflow,
+    BATCH_PLAN_JOB: aplan_batch,
+    BATCH_GROUP_JOB: arun_batch_group,
+    REGENERATE_JOB: arun_regeneration,
+}
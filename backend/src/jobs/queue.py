@@ -0,0 +1,87 @@
+# Enqueue API for the job queue
+
+import importlib
+import logging
+import threading
+import uuid
+from typing import List, Optional, Tuple
+import config
+from jobs.backends import Job, JobPriority, JobQueueBackend
+
+logger = logging.getLogger(__name__)
+
+AGENT_WORKFLOW_JOB = "agent_workflow"
+# a batch is planned by one job, which enqueues a group job per set of
+# identical learning spaces
+BATCH_PLAN_JOB = "agent_workflow_batch"
+BATCH_GROUP_JOB = "agent_workflow_group"
+REGENERATE_JOB = "regenerate_artifacts"
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def _load_backend(dotted_path: str):
+    module_name, class_name = dotted_path.rsplit(".", 1)
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def get_job_queue() -> JobQueueBackend:
+    """Return the process-wide job queue backend configured by JOB_QUEUE_BACKEND"""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                backend_class = _load_backend(config.JOB_QUEUE_BACKEND)
+                _queue = backend_class(config.JOB_QUEUE_PATH)
+    return _queue
+
+
+def enqueue_job(kind: str, payload: dict, tenant: str,
+                priority: int = JobPriority.INTERACTIVE,
+                batch_id: Optional[str] = None) -> Job:
+    job = get_job_queue().enqueue(
+        kind, payload, tenant, max_attempts=config.JOB_MAX_ATTEMPTS,
+        priority=priority, batch_id=batch_id)
+    logger.info(f"Enqueued job {job.id} ({kind}, priority {priority}) for tenant {tenant}")
+    return job
+
+
+def enqueue_agent_workflow(learning_space_id: int, user_id: uuid.UUID,
+                           priority: int = JobPriority.INTERACTIVE) -> Job:
+    """Queue a full agent workflow run for a learning space"""
+    payload = {
+        "learning_space_id": learning_space_id,
+        "user_id": str(user_id)
+    }
+    return enqueue_job(AGENT_WORKFLOW_JOB, payload, tenant=str(user_id),
+                       priority=priority)
+
+
+def enqueue_regeneration(learning_space_id: int, user_id: uuid.UUID,
+                         targets: Optional[List[str]] = None,
+                         overrides: Optional[dict] = None,
+                         priority: int = JobPriority.INTERACTIVE) -> Job:
+    """Queue the regeneration of some artifacts of a learning space"""
+    payload = {
+        "learning_space_id": learning_space_id,
+        "user_id": str(user_id),
+        "targets": targets,
+        "overrides": overrides or {}
+    }
+    return enqueue_job(REGENERATE_JOB, payload, tenant=str(user_id),
+                       priority=priority)
+
+
+def enqueue_batch(items: List[Tuple[int, uuid.UUID]],
+                  priority: int = JobPriority.BATCH) -> Job:
+    """
+    Queue workflows for many (learning_space_id, user_id) pairs. Returns the
+    planning job, whose batch_id identifies the batch.
+    """
+    batch_id = uuid.uuid4().hex
+    payload = {"items": [{"learning_space_id": learning_space_id, "user_id": str(user_id)}
+                         for learning_space_id, user_id in items],
+               "priority": priority}
+    return enqueue_job(BATCH_PLAN_JOB, payload, tenant=f"batch:{batch_id}",
+                       priority=priority, batch_id=batch_id)
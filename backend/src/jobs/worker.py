@@ -0,0 +1,229 @@
+# -----
+# Worker processes that pull jobs from the queue and run them
+# Start the pool with: python -m jobs.worker
+# -----
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+import traceback
+import config
+from jobs.backends import Job, JobQueueBackend
+from jobs.queue import get_job_queue
+from services.telemetry import install_log_redaction, metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _keep_lease_alive(queue: JobQueueBackend, job: Job, worker_id: str,
+                      done: threading.Event):
+    """Extend the job lease while the handler is still running"""
+    interval = config.JOB_LEASE_SECONDS / 3
+    while not done.wait(interval):
+        try:
+            queue.heartbeat(job.id, worker_id, config.JOB_LEASE_SECONDS)
+        except Exception as e:
+            logger.warning(f"Heartbeat failed for job {job.id}: {e}")
+
+
+def _format_error(e: Exception) -> str:
+    return "".join(traceback.format_exception_only(type(e), e)).strip()
+
+
+def _log_failure(job: Job, failed):
+    # called from the except block of the handler, logs its traceback
+    if failed is None:
+        logger.exception(f"Job {job.id} failed after its lease was lost, not recorded")
+    else:
+        logger.exception(
+            f"Job {job.id} failed on attempt {failed.attempts}/{failed.max_attempts}")
+
+
+def execute_job(queue: JobQueueBackend, job: Job, worker_id: str):
+    # imported here so the handlers (and the agent graph) load in the worker
+    # process only
+    from jobs.handlers import HANDLERS
+
+    done = threading.Event()
+    heartbeat = threading.Thread(
+        target=_keep_lease_alive, args=(queue, job, worker_id, done), daemon=True)
+    heartbeat.start()
+
+    metrics.observe("fluence_job_queue_wait_seconds", max(time.time() - job.run_at, 0),
+                    kind=job.kind)
+    try:
+        handler = HANDLERS[job.kind]
+        handler(job)
+        if queue.complete(job.id, worker_id):
+            logger.info(f"Job {job.id} completed")
+        else:
+            logger.warning(f"Job {job.id} finished after its lease was lost, not marked done")
+    except Exception as e:
+        failed = queue.fail(job.id, worker_id, _format_error(e),
+                            config.JOB_RETRY_BASE_DELAY, config.JOB_RETRY_MAX_DELAY)
+        _log_failure(job, failed)
+    finally:
+        done.set()
+        heartbeat.join()
+
+
+async def _akeep_lease_alive(queue: JobQueueBackend, job: Job, worker_id: str):
+    interval = config.JOB_LEASE_SECONDS / 3
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(
+                queue.heartbeat, job.id, worker_id, config.JOB_LEASE_SECONDS)
+        except Exception as e:
+            logger.warning(f"Heartbeat failed for job {job.id}: {e}")
+
+
+async def aexecute_job(queue: JobQueueBackend, job: Job, worker_id: str):
+    """Async version of execute_job"""
+    from jobs.handlers import ASYNC_HANDLERS
+
+    heartbeat = asyncio.create_task(_akeep_lease_alive(queue, job, worker_id))
+    metrics.observe("fluence_job_queue_wait_seconds", max(time.time() - job.run_at, 0),
+                    kind=job.kind)
+    try:
+        handler = ASYNC_HANDLERS[job.kind]
+        await handler(job)
+        if await asyncio.to_thread(queue.complete, job.id, worker_id):
+            logger.info(f"Job {job.id} completed")
+        else:
+            logger.warning(f"Job {job.id} finished after its lease was lost, not marked done")
+    except Exception as e:
+        failed = await asyncio.to_thread(
+            queue.fail, job.id, worker_id, _format_error(e), config.JOB_RETRY_BASE_DELAY,
+            config.JOB_RETRY_MAX_DELAY)
+        _log_failure(job, failed)
+    finally:
+        heartbeat.cancel()
+
+
+async def _run_async_worker(queue: JobQueueBackend, worker_id: str, stop_event):
+    """Keep up to JOB_ASYNC_CONCURRENCY jobs running on this event loop"""
+    running = set()
+    while not stop_event.is_set():
+        await asyncio.to_thread(queue.requeue_expired)
+
+        while len(running) < config.JOB_ASYNC_CONCURRENCY:
+            job = await asyncio.to_thread(
+                queue.claim, worker_id, config.JOB_TENANT_CONCURRENCY,
+                config.JOB_LEASE_SECONDS)
+            if job is None:
+                break
+            running.add(asyncio.create_task(aexecute_job(queue, job, worker_id)))
+
+        if running:
+            done, _ = await asyncio.wait(
+                running, timeout=config.JOB_POLL_INTERVAL,
+                return_when=asyncio.FIRST_COMPLETED)
+            running -= done
+        else:
+            await asyncio.sleep(config.JOB_POLL_INTERVAL)
+
+    if running:
+        await asyncio.wait(running)
+
+
+def run_worker(worker_id: str, stop_event):
+    """Worker loop: claim the next runnable job, execute it, repeat"""
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+    install_log_redaction()
+    # the parent process handles shutdown signals and sets stop_event
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    # compile the agent graph once, before the first job is claimed
+    from agents.registry import graph_registry
+    graph_registry.warm_up()
+
+    queue = get_job_queue()
+    logger.info(f"Worker {worker_id} started ({config.JOB_WORKER_MODE} mode)")
+
+    if config.JOB_WORKER_MODE == "async":
+        asyncio.run(_run_async_worker(queue, worker_id, stop_event))
+        logger.info(f"Worker {worker_id} stopped")
+        return
+
+    while not stop_event.is_set():
+        queue.requeue_expired()
+        job = queue.claim(worker_id, config.JOB_TENANT_CONCURRENCY,
+                          config.JOB_LEASE_SECONDS)
+        if job is None:
+            stop_event.wait(config.JOB_POLL_INTERVAL)
+            continue
+        execute_job(queue, job, worker_id)
+
+    logger.info(f"Worker {worker_id} stopped")
+
+
+class WorkerPool:
+    """
+    A bounded pool of worker processes. Workers that die are restarted;
+    the jobs they held are re-queued once their lease expires.
+    """
+
+    def __init__(self, num_workers: int = config.JOB_WORKERS):
+        self.num_workers = num_workers
+        # spawn keeps the grpc/http clients of the parent out of the workers
+        self._context = multiprocessing.get_context("spawn")
+        self._stop_event = self._context.Event()
+        self._processes = {}
+
+    def _start_worker(self, index: int):
+        worker_id = f"{socket.gethostname()}-{os.getpid()}-{index}"
+        process = self._context.Process(
+            target=run_worker, args=(worker_id, self._stop_event),
+            name=f"job-worker-{index}")
+        process.start()
+        self._processes[index] = process
+
+    def start(self):
+        for index in range(self.num_workers):
+            self._start_worker(index)
+
+    def supervise(self, interval: float = 5.0):
+        """Block until stopped, restarting any worker process that exits"""
+        while not self._stop_event.wait(interval):
+            for index, process in list(self._processes.items()):
+                if not process.is_alive():
+                    logger.warning(
+                        f"Worker {process.name} exited with {process.exitcode}, restarting")
+                    self._start_worker(index)
+
+    def request_stop(self):
+        self._stop_event.set()
+
+    def stop(self, timeout: float = 30.0):
+        self.request_stop()
+        for process in self._processes.values():
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+
+
+def main():
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+    install_log_redaction()
+    pool = WorkerPool()
+
+    def _shutdown(signum, frame):
+        logger.info("Shutting down worker pool...")
+        pool.request_stop()
+
+    signal.signal(signal.SIGINT, _shutdown)
+    signal.signal(signal.SIGTERM, _shutdown)
+
+    pool.start()
+    pool.supervise()
+    pool.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,32 @@
 # Orchestrate the agent workflow
 
+import asyncio
 import logging
 import uuid
+from typing import Optional, Tuple
 from services.supabase_service import supabase_service
-from agents.graph import AgentGraphWorkflow
+from services.async_supabase_service import async_supabase_service
+from services.run_registry import run_registry
+from services.learning_space_writer import learning_space_writer
+from services.storage import artifact_uploader
+from services.artifact_cache import (
+    artifact_cache, artifact_cache_key, learning_space_artifacts)
+from services.artifact_dependencies import produced, record_inputs
+from services.ingestion import ingest_source
+from services.telemetry import current_span, span
+import config
+from agents.checkpoint import thread_id as checkpoint_thread_id
+from agents.registry import graph_registry
 
 logger = logging.getLogger(__name__)
 
 
-def invoke_agent_workflow(learning_space_id: int, user_id: uuid.UUID):
-    # get the data from supabase and prepare it for calling the agent
-    # run the agent in the background and return a success or failure
-
-    # get the input data from supabase
-    student_profile = supabase_service.get_student_profile(user_id)
-    learning_space = supabase_service.get_learning_space(learning_space_id)
-
-    print(student_profile)
-
+def _initial_state(learning_space_id: int, run_id: Optional[int],
+                   student_profile: dict, learning_space: dict):
     # prepate the initial state for agent
-    initial_state = {
+    return {
         "learning_space_id": learning_space_id,
+        "run_id": run_id,
         "student_profile": {
             "gender": student_profile.get('gender'),
             "grade_level": student_profile.get('grade_level'),
@@ -28,11 +34,216 @@ def invoke_agent_workflow(learning_space_id: int, user_id: uuid.UUID):
         },
         "user_prompt": {
             "topic": learning_space.get('topic'),
-            "file_url": learning_space.get('pdf_source')
+            "file_url": learning_space.get('pdf_source'),
+            "source_hash": None
         }
     }
 
-    # invoke the agent
-    agent_workflow = AgentGraphWorkflow()
-    response = agent_workflow.invoke(initial_state)
+
+def _ingest(initial_state: dict) -> bool:
+    """
+    Download and extract the uploaded source once, before the graph runs.
+    Returns False when the source could not be ingested; the model then
+    fetches the file itself.
+    """
+    try:
+        source = ingest_source(initial_state["user_prompt"]["file_url"])
+    except Exception as e:
+        logger.warning(f"Source ingestion failed, sending the file url: {e}")
+        return False
+
+    if source is not None:
+        initial_state["user_prompt"]["source_hash"] = source.content_hash
+    return True
+
+
+def _cache_lookup(initial_state: dict, ingested: bool):
+    """Return (cache key, cached artifacts or None)"""
+    # without the content hash of the source there is no safe key
+    if not config.ARTIFACT_CACHE_ENABLED or not ingested:
+        return None, None
+
+    cache_key = artifact_cache_key(initial_state)
+    return cache_key, artifact_cache.get(cache_key)
+
+
+def _use_cached_artifacts(learning_space_id: int, run_id: Optional[int],
+                          initial_state: dict, artifacts: dict):
+    """Write cached artifacts to the learning space instead of running the graph"""
+    logger.info(f"Artifact cache hit for learning space {learning_space_id}")
+    current_span().set(artifact_cache="hit")
+    learning_space_writer.write(learning_space_id, artifacts)
+    record_inputs(learning_space_id, initial_state, artifacts)
+
+    if run_id is not None:
+        run_registry.start_run(run_id, learning_space_id, ["artifact_cache"])
+        run_registry.node_finished(run_id, "artifact_cache", artifacts)
+        run_registry.finish_run(run_id)
+    return artifacts
+
+
+def _resume_from(learning_space_id: int, checkpoint: dict):
+    """
+    Rewrite what the nodes of the failed attempt produced, since a resumed
+    run skips them and that attempt may have died before its writes
+    """
+    logger.info(f"Resuming the run of learning space {learning_space_id} from its checkpoint")
+    current_span().set(resumed=True)
+    artifacts = learning_space_artifacts(checkpoint, partial=True)
+    if artifacts:
+        learning_space_writer.write(learning_space_id, artifacts)
+
+
+def _thread_id(learning_space_id: int, run_id: Optional[int], graph_version: str):
+    # only runs of jobs are retried
+    if run_id is None:
+        return None
+    return checkpoint_thread_id(learning_space_id, run_id, graph_version)
+
+
+def _cache_store(cache_key: Optional[str], initial_state: dict, final_state: dict):
+    # fingerprints for selective regeneration, then the cache entry
+    record_inputs(initial_state["learning_space_id"], initial_state, produced(final_state))
+    if cache_key is None:
+        return
+    artifacts = learning_space_artifacts(final_state)
+    if artifacts is not None:
+        artifact_cache.set(cache_key, artifacts)
+
+
+def invoke_agent_workflow(learning_space_id: int, user_id: uuid.UUID,
+                          run_id: Optional[int] = None, flush: bool = True,
+                          inputs: Optional[Tuple[dict, dict]] = None):
+    # get the data from supabase and prepare it for calling the agent
+    # run the agent in the background and return a success or failure
+    # the nodes buffer their learning_space writes, they are written in one
+    # update at the end (also after a failure so partial results are kept).
+    # Batches pass flush=False and flush all their learning spaces together,
+    # and the (student_profile, learning_space) inputs they fetched in bulk.
+    with span("workflow.run", learning_space_id=learning_space_id, run_id=run_id), \
+            learning_space_writer.run():
+        try:
+            return _invoke_agent_workflow(learning_space_id, user_id, run_id, inputs)
+        finally:
+            artifact_uploader.wait(learning_space_id, config.STORAGE_UPLOAD_TIMEOUT)
+            if flush:
+                learning_space_writer.close(learning_space_id)
+
+
+def _invoke_agent_workflow(learning_space_id: int, user_id: uuid.UUID,
+                           run_id: Optional[int], inputs: Optional[Tuple[dict, dict]]):
+
+    # get the input data from supabase
+    if inputs is not None:
+        student_profile, learning_space = inputs
+    else:
+        with span("supabase.read_inputs", learning_space_id=learning_space_id):
+            student_profile = supabase_service.get_student_profile(user_id)
+            learning_space = supabase_service.get_learning_space(learning_space_id)
+
+    initial_state = _initial_state(
+        learning_space_id, run_id, student_profile, learning_space)
+
+    ingested = _ingest(initial_state)
+
+    # identical requests reuse the artifacts of an earlier run
+    cache_key, cached = _cache_lookup(initial_state, ingested)
+    if cached is not None:
+        return _use_cached_artifacts(learning_space_id, run_id, initial_state, cached)
+
+    # invoke the compiled agent graph shared by this process
+    graph_version = graph_registry.active_version()
+    agent_workflow = graph_registry.get(graph_version)
+
+    # a retried job continues from the checkpoint of its previous attempt
+    thread_id = _thread_id(learning_space_id, run_id, graph_version)
+    checkpoint = agent_workflow.checkpoint(thread_id)
+    if checkpoint is not None:
+        _resume_from(learning_space_id, checkpoint)
+
+    if run_id is not None:
+        run_registry.start_run(
+            run_id, learning_space_id, list(agent_workflow.nodes),
+            resume=checkpoint is not None)
+    try:
+        response = agent_workflow.invoke(
+            initial_state if checkpoint is None else None, thread_id)
+    except Exception as e:
+        if run_id is not None:
+            run_registry.finish_run(run_id, error=str(e))
+        raise
+
+    # the run is done once its files are stored
+    uploaded = artifact_uploader.wait(learning_space_id, config.STORAGE_UPLOAD_TIMEOUT)
+    if run_id is not None:
+        run_registry.finish_run(run_id)
+
+    if uploaded:
+        _cache_store(cache_key, initial_state, response)
+    return response
+
+
+async def ainvoke_agent_workflow(learning_space_id: int, user_id: uuid.UUID,
+                                 run_id: Optional[int] = None, flush: bool = True,
+                                 inputs: Optional[Tuple[dict, dict]] = None):
+    """Async version of invoke_agent_workflow"""
+    with span("workflow.run", learning_space_id=learning_space_id, run_id=run_id), \
+            learning_space_writer.run():
+        try:
+            return await _ainvoke_agent_workflow(learning_space_id, user_id, run_id, inputs)
+        finally:
+            await asyncio.to_thread(
+                artifact_uploader.wait, learning_space_id, config.STORAGE_UPLOAD_TIMEOUT)
+            if flush:
+                await asyncio.to_thread(learning_space_writer.close, learning_space_id)
+
+
+async def _ainvoke_agent_workflow(learning_space_id: int, user_id: uuid.UUID,
+                                  run_id: Optional[int], inputs: Optional[Tuple[dict, dict]]):
+
+    if inputs is not None:
+        student_profile, learning_space = inputs
+    else:
+        with span("supabase.read_inputs", learning_space_id=learning_space_id):
+            student_profile, learning_space = await asyncio.gather(
+                async_supabase_service.get_student_profile(user_id),
+                async_supabase_service.get_learning_space(learning_space_id))
+
+    initial_state = _initial_state(
+        learning_space_id, run_id, student_profile, learning_space)
+
+    ingested = await asyncio.to_thread(_ingest, initial_state)
+
+    cache_key, cached = await asyncio.to_thread(_cache_lookup, initial_state, ingested)
+    if cached is not None:
+        return await asyncio.to_thread(
+            _use_cached_artifacts, learning_space_id, run_id, initial_state, cached)
+
+    graph_version = graph_registry.active_version()
+    agent_workflow = graph_registry.get(graph_version)
+
+    thread_id = _thread_id(learning_space_id, run_id, graph_version)
+    checkpoint = await agent_workflow.acheckpoint(thread_id)
+    if checkpoint is not None:
+        await asyncio.to_thread(_resume_from, learning_space_id, checkpoint)
+
+    if run_id is not None:
+        await asyncio.to_thread(
+            run_registry.start_run, run_id, learning_space_id, list(agent_workflow.nodes),
+            checkpoint is not None)
+    try:
+        response = await agent_workflow.ainvoke(
+            initial_state if checkpoint is None else None, thread_id)
+    except Exception as e:
+        if run_id is not None:
+            await asyncio.to_thread(run_registry.finish_run, run_id, str(e))
+        raise
+
+    uploaded = await asyncio.to_thread(
+        artifact_uploader.wait, learning_space_id, config.STORAGE_UPLOAD_TIMEOUT)
+    if run_id is not None:
+        await asyncio.to_thread(run_registry.finish_run, run_id)
+
+    if uploaded:
+        await asyncio.to_thread(_cache_store, cache_key, initial_state, response)
     return response
@@ -0,0 +1,71 @@
+# -----
+# Cache of generated learning space artifacts keyed by topic, source file
+# and student profile
+# -----
+
+import hashlib
+import json
+import logging
+import os
+import re
+from typing import Optional
+import config
+from agents.prompts import prompt_registry
+from agents.state import AgentState, ArtifactRef
+from services.artifact_store import artifact_store
+from services.cache import DiskCache
+
+logger = logging.getLogger(__name__)
+
+# learning_space columns written by the graph
+ARTIFACT_FIELDS = ("summary_notes", "quiz", "recommendations",
+                   "mindmap", "audio_script", "audio_overview")
+
+
+def normalize_text(text: Optional[str]) -> str:
+    text = re.sub(r"\s+", " ", (text or "").casefold())
+    return text.strip(" .?!")
+
+
+def artifact_cache_key(state: AgentState) -> str:
+    key = {
+        "topic": normalize_text(state["user_prompt"]["topic"]),
+        "file": state["user_prompt"].get("source_hash") or "",
+        "grade_level": normalize_text(state["student_profile"].get("grade_level")),
+        "language": normalize_text(state["student_profile"].get("language")),
+        "prompt_version": prompt_registry.fingerprint(),
+        "model": config.LLM_MODEL,
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+
+def _load(ref: Optional[ArtifactRef]):
+    return artifact_store.get(ref) if ref is not None else None
+
+
+def learning_space_artifacts(final_state: dict, partial: bool = False) -> Optional[dict]:
+    """
+    The learning_space patch produced by a graph run, None if incomplete.
+    With partial, the columns the run has produced so far.
+    """
+    summary_notes = final_state.get("summary_notes")
+    artifacts = {
+        "summary_notes": summary_notes.to_dict() if summary_notes else None,
+        "quiz": _load(final_state.get("quiz")),
+        "recommendations": _load(final_state.get("recommendations")),
+        "mindmap": final_state.get("mindmap_url"),
+        "audio_script": final_state.get("podcast_script"),
+    }
+    if config.TTS_ENABLED:
+        artifacts["audio_overview"] = final_state.get("audio_overview_url")
+    if partial:
+        return {column: value for column, value in artifacts.items() if value is not None}
+    if any(value is None for value in artifacts.values()):
+        return None
+    return artifacts
+
+
+artifact_cache = DiskCache(
+    os.path.join(config.CACHE_DIR, "artifacts.sqlite3"),
+    ttl_seconds=config.ARTIFACT_CACHE_TTL,
+    max_entries=config.ARTIFACT_CACHE_MAX_ENTRIES)
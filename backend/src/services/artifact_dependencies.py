@@ -0,0 +1,139 @@
+# -----
+# Dependencies between the learning space artifacts: which node produces an
+# artifact, which artifacts and request inputs it is generated from, and a
+# fingerprint of those inputs per artifact, so a changed input invalidates
+# only the artifacts that depend on it
+# -----
+
+import hashlib
+import json
+from typing import Dict, Iterable, NamedTuple, Optional, Set, Tuple
+import config
+from agents.graph import AgentGraphWorkflow
+from agents.prompts import prompt_registry
+from services.cache import DiskCache
+
+PROFILE_INPUTS = ("grade_level", "language", "gender")
+
+
+class Artifact(NamedTuple):
+    node: str
+    # key of the node output in the agent state
+    state_key: str
+    # request inputs the prompt of the node uses
+    inputs: Tuple[str, ...]
+
+
+# learning_space column -> how it is produced
+ARTIFACTS = {
+    "summary_notes": Artifact(
+        "node_summary_notes", "summary_notes", ("topic", "source") + PROFILE_INPUTS),
+    "quiz": Artifact("node_quiz", "quiz", PROFILE_INPUTS),
+    "recommendations": Artifact("node_recommendations", "recommendations", PROFILE_INPUTS),
+    "mindmap": Artifact("node_mindmap", "mindmap_url", PROFILE_INPUTS),
+    "audio_script": Artifact("node_audio_overview", "podcast_script", PROFILE_INPUTS),
+    "audio_overview": Artifact("node_tts", "audio_overview_url", ("language",)),
+}
+
+_NODE_ARTIFACTS = {artifact.node: name for name, artifact in ARTIFACTS.items()}
+
+
+def available_artifacts():
+    names = list(ARTIFACTS)
+    if not config.TTS_ENABLED:
+        names.remove("audio_overview")
+    return names
+
+
+def upstream(name: str):
+    """Artifacts the node of name reads"""
+    return [_NODE_ARTIFACTS[node]
+            for node in AgentGraphWorkflow.DEPENDENCIES[ARTIFACTS[name].node]]
+
+
+def downstream(names: Iterable[str]) -> Set[str]:
+    """names and every artifact generated from them, transitively"""
+    result = set(names)
+    changed = True
+    while changed:
+        changed = False
+        for name in available_artifacts():
+            if name not in result and result.intersection(upstream(name)):
+                result.add(name)
+                changed = True
+    return result
+
+
+def _request_inputs(state: dict) -> dict:
+    profile = state["student_profile"]
+    return {
+        "topic": state["user_prompt"]["topic"],
+        "source": state["user_prompt"]["file_url"] or "",
+        **{field: profile.get(field) for field in PROFILE_INPUTS},
+    }
+
+
+def fingerprints(state: dict) -> Dict[str, str]:
+    """
+    Per artifact, a hash of its request inputs, the version of its prompt and
+    model and the fingerprints of the artifacts it is generated from
+    """
+    inputs = _request_inputs(state)
+    result = {}
+    # ARTIFACTS lists every artifact after the ones it reads
+    for name, artifact in ARTIFACTS.items():
+        key = {
+            "artifact": name,
+            "inputs": {field: inputs[field] for field in artifact.inputs},
+            "upstream": [result[dependency] for dependency in upstream(name)],
+            "prompt_version": prompt_registry.fingerprint([artifact.node]),
+            "model": config.LLM_MODEL,
+        }
+        result[name] = hashlib.sha256(
+            json.dumps(key, sort_keys=True).encode()).hexdigest()[:16]
+    return result
+
+
+# learning space id -> fingerprints of its stored artifacts
+artifact_inputs = DiskCache(
+    config.ARTIFACT_INPUTS_PATH,
+    ttl_seconds=config.ARTIFACT_INPUTS_TTL,
+    max_entries=config.ARTIFACT_INPUTS_MAX_ENTRIES)
+
+
+def produced(final_state: dict):
+    """The artifacts a graph run generated"""
+    return [name for name, artifact in ARTIFACTS.items()
+            if final_state.get(artifact.state_key) is not None]
+
+
+def record_inputs(learning_space_id: int, state: dict, names: Iterable[str]):
+    """Remember what the artifacts names of a learning space were generated from"""
+    current = fingerprints(state)
+    recorded = artifact_inputs.get(str(learning_space_id)) or {}
+    recorded.update({name: current[name] for name in names})
+    artifact_inputs.set(str(learning_space_id), recorded)
+
+
+def plan(learning_space_id: int, state: dict, stored: dict,
+         targets: Optional[Iterable[str]] = None) -> Set[str]:
+    """
+    The artifacts to regenerate: targets (by default the stored artifacts
+    whose inputs changed, and the missing ones), everything generated from
+    them, and any artifact they read that is not stored
+    """
+    names = available_artifacts()
+    if targets is None:
+        current = fingerprints(state)
+        recorded = artifact_inputs.get(str(learning_space_id)) or {}
+        targets = [name for name in names if not stored.get(name)
+                   or recorded.get(name, current[name]) != current[name]]
+
+    result = downstream(targets)
+    pending = list(result)
+    while pending:
+        for dependency in upstream(pending.pop()):
+            if dependency not in result and not stored.get(dependency):
+                result.add(dependency)
+                pending.append(dependency)
+    return result
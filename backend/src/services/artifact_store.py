@@ -0,0 +1,52 @@
+# -----
+# Content addressed store for the JSON artifacts of graph runs (quiz,
+# recommendations, mindmap), so the graph state and its checkpoints carry
+# a small reference instead of the whole artifact
+# -----
+
+import hashlib
+import json
+import os
+from typing import Any
+import config
+from agents.state import ArtifactRef
+from services.cache import DiskCache
+
+# marks a reference in the JSON recorded by the run registry
+REF_KEY = "$artifact"
+
+
+class ArtifactStore:
+    """JSON values in a DiskCache keyed by the hash of their content"""
+
+    def __init__(self, cache: DiskCache):
+        self.cache = cache
+
+    def put(self, value: Any) -> ArtifactRef:
+        data = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+        # identical artifacts (e.g. the learning spaces of a batch) share a key
+        key = hashlib.sha256(data.encode()).hexdigest()
+        self.cache.set(key, value)
+        return ArtifactRef(key=key, size=len(data))
+
+    def get(self, ref: ArtifactRef) -> Any:
+        value = self.cache.get(ref.key)
+        if value is None:
+            raise KeyError(f"Artifact {ref.key} is no longer stored")
+        return value
+
+    def resolve(self, value: Any) -> Any:
+        """value with the references recorded by the run registry replaced by the artifacts"""
+        if isinstance(value, dict):
+            if set(value) == {REF_KEY}:
+                return self.cache.get(value[REF_KEY])
+            return {key: self.resolve(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self.resolve(item) for item in value]
+        return value
+
+
+artifact_store = ArtifactStore(DiskCache(
+    os.path.join(config.CACHE_DIR, "artifact_store.sqlite3"),
+    ttl_seconds=config.ARTIFACT_STORE_TTL,
+    max_entries=config.ARTIFACT_STORE_MAX_ENTRIES))
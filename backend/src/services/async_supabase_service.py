@@ -0,0 +1,36 @@
+# -----
+# Async facade over supabase_service for the async agent pipeline
+# -----
+
+import asyncio
+from typing import Optional
+from services.supabase_service import supabase_service
+
+
+class AsyncSupabaseService:
+    """
+    Awaitable versions of the supabase_service calls. Each call runs on the
+    default executor, so a thread is held only for the duration of one
+    database or storage round trip, never for a whole workflow.
+    """
+
+    async def get_student_profile(self, user_id):
+        return await asyncio.to_thread(supabase_service.get_student_profile, user_id)
+
+    async def get_learning_space(self, learning_space_id: int):
+        return await asyncio.to_thread(supabase_service.get_learning_space, learning_space_id)
+
+    async def update_learning_space(self, learning_space_id: int, data: dict):
+        return await asyncio.to_thread(
+            supabase_service.update_learning_space, learning_space_id, data)
+
+    async def upload_file(self, filename: str, file_bytes: bytes,
+                          content_type: Optional[str] = None):
+        return await asyncio.to_thread(
+            supabase_service.upload_file, filename, file_bytes, content_type=content_type)
+
+    async def get_public_url(self, filename: str):
+        return await asyncio.to_thread(supabase_service.get_public_url, filename)
+
+
+async_supabase_service = AsyncSupabaseService()
@@ -0,0 +1,183 @@
+# -----
+# Batch generation for whole classes: the profiles and learning spaces of a
+# batch are fetched in bulk, identical requests are grouped so each group is
+# generated once, and the result is written to every learning space of it
+# -----
+
+import asyncio
+import hashlib
+import json
+import logging
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+import config
+from jobs.backends import Job, JobStatus
+from jobs.queue import BATCH_GROUP_JOB, BATCH_PLAN_JOB, enqueue_job, get_job_queue
+from services.agent_workflow import _initial_state, ainvoke_agent_workflow, invoke_agent_workflow
+from services.artifact_cache import artifact_cache_key
+from services.learning_space_writer import learning_space_writer
+from services.supabase_service import supabase_service
+from services.telemetry import span
+
+logger = logging.getLogger(__name__)
+
+
+def _bulk_lookup(bulk_name: str, single, keys: List) -> Dict:
+    """
+    One bulk query when supabase_service provides it, otherwise the single
+    row lookups run concurrently
+    """
+    bulk = getattr(supabase_service, bulk_name, None)
+    if bulk is not None:
+        return bulk(keys)
+    with ThreadPoolExecutor(max_workers=config.BATCH_LOOKUP_CONCURRENCY) as executor:
+        return dict(zip(keys, executor.map(single, keys)))
+
+
+def get_student_profiles(user_ids: Iterable[str]) -> Dict[str, dict]:
+    user_ids = sorted(set(user_ids))
+    with span("supabase.get_student_profiles", rows=len(user_ids)):
+        return _bulk_lookup("get_student_profiles", supabase_service.get_student_profile, user_ids)
+
+
+def get_learning_spaces(learning_space_ids: Iterable[int]) -> Dict[int, dict]:
+    learning_space_ids = sorted(set(learning_space_ids))
+    with span("supabase.get_learning_spaces", rows=len(learning_space_ids)):
+        return _bulk_lookup("get_learning_spaces", supabase_service.get_learning_space,
+                            learning_space_ids)
+
+
+def group_key(initial_state: dict) -> str:
+    """Requests with the same key produce the same artifacts"""
+    key = [artifact_cache_key(initial_state), initial_state["user_prompt"]["file_url"] or ""]
+    return hashlib.sha256(json.dumps(key).encode()).hexdigest()
+
+
+# ------- Planning --------
+
+def plan_batch(job: Job):
+    """
+    Group the items of a batch and enqueue one group job per set of
+    identical learning spaces. A retried plan skips the groups it enqueued.
+    Items whose profile or learning space is missing are skipped rather than
+    failing the whole batch; get_batch_status reports them.
+    """
+    items = job.payload["items"]
+    profiles = get_student_profiles(item["user_id"] for item in items)
+    learning_spaces = get_learning_spaces(item["learning_space_id"] for item in items)
+
+    groups = {}
+    skipped = 0
+    for item in items:
+        learning_space_id = item["learning_space_id"]
+        student_profile = profiles.get(item["user_id"])
+        learning_space = learning_spaces.get(learning_space_id)
+        if student_profile is None or learning_space is None:
+            missing = "student profile" if student_profile is None else "learning space"
+            logger.warning(f"Batch {job.batch_id}: skipping learning space "
+                           f"{learning_space_id} of user {item['user_id']}, no {missing}")
+            skipped += 1
+            continue
+        initial_state = _initial_state(learning_space_id, None, student_profile, learning_space)
+        group = groups.setdefault(group_key(initial_state), {
+            "learning_space_id": learning_space_id,
+            "user_id": item["user_id"],
+            "student_profile": initial_state["student_profile"],
+            "learning_space": {"topic": learning_space.get("topic"),
+                               "pdf_source": learning_space.get("pdf_source")},
+            "mirrors": [],
+        })
+        if learning_space_id != group["learning_space_id"]:
+            group["mirrors"].append(learning_space_id)
+
+    enqueued = {planned.payload["learning_space_id"]
+                for planned in get_job_queue().batch_jobs(job.batch_id)
+                if planned.kind == BATCH_GROUP_JOB}
+    for group in groups.values():
+        if group["learning_space_id"] not in enqueued:
+            enqueue_job(BATCH_GROUP_JOB, group, tenant=group["user_id"],
+                        priority=job.payload["priority"], batch_id=job.batch_id)
+    logger.info(f"Batch {job.batch_id}: {len(items) - skipped} learning spaces in "
+                f"{len(groups)} groups, {skipped} skipped")
+
+
+# ------- Groups --------
+
+def run_group(job: Job):
+    """Generate a group once and write the result to all its learning spaces"""
+    payload = job.payload
+    learning_space_id = payload["learning_space_id"]
+    # the workflow buffers in the scope of the group, which flushes every row
+    with learning_space_writer.run():
+        learning_space_writer.mirror(learning_space_id, payload["mirrors"])
+        try:
+            invoke_agent_workflow(
+                learning_space_id, uuid.UUID(payload["user_id"]), run_id=job.id, flush=False,
+                inputs=(payload["student_profile"], payload["learning_space"]))
+        finally:
+            learning_space_writer.flush_many([learning_space_id, *payload["mirrors"]])
+
+
+async def arun_group(job: Job):
+    """Async version of run_group"""
+    payload = job.payload
+    learning_space_id = payload["learning_space_id"]
+    with learning_space_writer.run():
+        learning_space_writer.mirror(learning_space_id, payload["mirrors"])
+        try:
+            await ainvoke_agent_workflow(
+                learning_space_id, uuid.UUID(payload["user_id"]), run_id=job.id, flush=False,
+                inputs=(payload["student_profile"], payload["learning_space"]))
+        finally:
+            await asyncio.to_thread(
+                learning_space_writer.flush_many, [learning_space_id, *payload["mirrors"]])
+
+
+# ------- Progress --------
+
+def get_batch_status(batch_id: str) -> Optional[dict]:
+    """Aggregate progress of a batch over its plan and group jobs"""
+    jobs = get_job_queue().batch_jobs(batch_id)
+    plan = next((job for job in jobs if job.kind == BATCH_PLAN_JOB), None)
+    if plan is None:
+        return None
+
+    groups = [job for job in jobs if job.kind == BATCH_GROUP_JOB]
+    learning_spaces = Counter()
+    planned = set()
+    for group in groups:
+        learning_spaces[group.status] += 1 + len(group.payload["mirrors"])
+        planned.update([group.payload["learning_space_id"], *group.payload["mirrors"]])
+
+    # the items plan_batch left out for a missing profile or learning space
+    skipped = []
+    if plan.status == JobStatus.DONE:
+        skipped = [item for item in plan.payload["items"]
+                   if item["learning_space_id"] not in planned]
+
+    if plan.status == JobStatus.FAILED:
+        status = "failed"
+    elif plan.status != JobStatus.DONE:
+        status = "planning"
+    elif all(group.status in (JobStatus.DONE, JobStatus.FAILED) for group in groups):
+        status = "done"
+    else:
+        status = "running"
+
+    return {
+        "batch_id": batch_id,
+        "status": status,
+        "error": plan.error,
+        "groups": len(groups),
+        "learning_spaces": {
+            "total": len(plan.payload["items"]),
+            "done": learning_spaces[JobStatus.DONE],
+            "failed": learning_spaces[JobStatus.FAILED],
+            "running": learning_spaces[JobStatus.RUNNING],
+            "queued": learning_spaces[JobStatus.QUEUED],
+            "skipped": len(skipped),
+        },
+        "skipped": skipped,
+    }
@@ -0,0 +1,134 @@
+# -----
+# Persistent key/value cache on local disk with TTL and LRU eviction
+# -----
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Optional
+from services.telemetry import metrics
+
+
+class DiskCache:
+    """
+    JSON values stored in a local SQLite file. Entries older than ttl_seconds
+    are dropped on read, and the least recently used entries are evicted once
+    the cache holds more than max_entries. Eviction runs every evict_every
+    writes of a process rather than on each one, so the cache can briefly
+    exceed max_entries by that many entries per process.
+    """
+
+    evict_every = 100
+
+    def __init__(self, path: str, ttl_seconds: float, max_entries: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.name = os.path.splitext(os.path.basename(path))[0]
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+        self._writes = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._create_schema()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+        finally:
+            conn.close()
+
+    def _create_schema(self):
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_entries_accessed_at
+                    ON entries (accessed_at);
+                CREATE INDEX IF NOT EXISTS idx_entries_created_at
+                    ON entries (created_at);
+            """)
+
+    def _record(self, hit: bool):
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        metrics.inc("fluence_cache_requests_total", cache=self.name,
+                    result="hit" if hit else "miss")
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value, created_at FROM entries WHERE key = ?",
+                (key,)).fetchone()
+
+            if row is not None and now - row[1] > self.ttl_seconds:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                row = None
+
+            if row is None:
+                self._record(hit=False)
+                return None
+
+            conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?",
+                         (now, key))
+
+        self._record(hit=True)
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                """INSERT OR REPLACE INTO entries (key, value, created_at, accessed_at)
+                   VALUES (?, ?, ?, ?)""",
+                (key, json.dumps(value, default=str), now, now))
+            if self._due_for_eviction():
+                self._evict(conn, now)
+
+    def delete(self, key: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def _due_for_eviction(self) -> bool:
+        with self._stats_lock:
+            self._writes += 1
+            return self._writes % self.evict_every == 1
+
+    def _evict(self, conn, now: float):
+        # both deletes walk an index from the oldest entry
+        conn.execute("DELETE FROM entries WHERE created_at < ?",
+                     (now - self.ttl_seconds,))
+        excess = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0] - self.max_entries
+        if excess > 0:
+            conn.execute(
+                """DELETE FROM entries WHERE key IN (
+                       SELECT key FROM entries ORDER BY accessed_at LIMIT ?)""",
+                (excess,))
+
+    def stats(self):
+        with self._connect() as conn:
+            entries = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": entries
+        }
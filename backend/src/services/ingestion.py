@@ -0,0 +1,226 @@
+# -----
+# Ingestion of uploaded learning sources: download once, hash, extract and
+# chunk the text of PDFs and keep the result on disk keyed by content hash
+# -----
+
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+import tempfile
+import urllib.request
+from collections import Counter
+from urllib.parse import urlparse
+from typing import List, Optional
+from pydantic import BaseModel
+import config
+from services.cache import DiskCache
+
+logger = logging.getLogger(__name__)
+
+
+class SourceTooLarge(Exception):
+    pass
+
+
+class SourceNotAllowed(Exception):
+    """The source url is not an https url of an allowed storage host"""
+    pass
+
+
+class IngestedSource(BaseModel):
+    content_hash: str
+    mime_type: str
+    size: int
+    chunk_count: int = 0
+
+
+def _source_path(content_hash: str, suffix: str) -> str:
+    return os.path.join(config.SOURCES_DIR, f"{content_hash}{suffix}")
+
+
+def check_source_url(url: str):
+    """
+    pdf_source is set by the user, so only https urls of the storage hosts
+    are fetched: no local files and no internal addresses
+    """
+    parsed = urlparse(url)
+    if parsed.scheme != "https":
+        raise SourceNotAllowed(f"{parsed.scheme or 'no'} scheme in source url")
+    if (parsed.hostname or "").lower() not in config.INGEST_ALLOWED_HOSTS:
+        raise SourceNotAllowed(f"{parsed.hostname} is not an allowed source host")
+
+
+class _CheckedRedirectHandler(urllib.request.HTTPRedirectHandler):
+    # a redirect must stay on the allowed hosts too
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        check_source_url(newurl)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+def _opener():
+    # https only, unlike build_opener which also handles file:// and ftp://
+    opener = urllib.request.OpenerDirector()
+    for handler in (urllib.request.HTTPSHandler(), _CheckedRedirectHandler(),
+                    urllib.request.HTTPDefaultErrorHandler(),
+                    urllib.request.HTTPErrorProcessor()):
+        opener.add_handler(handler)
+    return opener
+
+
+def _download(url: str):
+    """Stream url to a temp file, returning (path, sha256, size, content type)"""
+    check_source_url(url)
+    os.makedirs(config.SOURCES_DIR, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+
+    with _opener().open(url, timeout=config.INGEST_DOWNLOAD_TIMEOUT) as response:
+        content_type = response.headers.get_content_type()
+        declared = int(response.headers.get("Content-Length") or 0)
+        if declared > config.INGEST_MAX_BYTES:
+            raise SourceTooLarge(f"{url} is {declared} bytes")
+
+        with tempfile.NamedTemporaryFile(dir=config.SOURCES_DIR, delete=False) as f:
+            try:
+                for chunk in iter(lambda: response.read(1024 * 1024), b""):
+                    size += len(chunk)
+                    if size > config.INGEST_MAX_BYTES:
+                        raise SourceTooLarge(f"{url} exceeds {config.INGEST_MAX_BYTES} bytes")
+                    digest.update(chunk)
+                    f.write(chunk)
+            except Exception:
+                os.unlink(f.name)
+                raise
+
+    if content_type == "application/octet-stream":
+        content_type = mimetypes.guess_type(url.split("?")[0])[0] or content_type
+    return f.name, digest.hexdigest(), size, content_type
+
+
+def split_text(text: str, chunk_chars: int, overlap: int) -> List[str]:
+    """Split text into chunks of about chunk_chars, preferring paragraph breaks"""
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_chars, len(text))
+        if end < len(text):
+            paragraph = text.rfind("\n\n", start + chunk_chars // 2, end)
+            if paragraph != -1:
+                end = paragraph
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+    return chunks
+
+
+def _extract_pdf_text(path: str) -> str:
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    pages = [page.extract_text() or "" for page in reader.pages]
+    return "\n\n".join(pages)
+
+
+def _ingest_file(path: str, content_hash: str, size: int, mime_type: str) -> IngestedSource:
+    extension = mimetypes.guess_extension(mime_type) or ""
+    stored_path = _source_path(content_hash, extension)
+    os.replace(path, stored_path)
+
+    chunks = []
+    if mime_type == "application/pdf":
+        try:
+            chunks = split_text(_extract_pdf_text(stored_path),
+                                config.INGEST_CHUNK_CHARS, config.INGEST_CHUNK_OVERLAP)
+        except Exception as e:
+            logger.warning(f"Text extraction failed for {content_hash}: {e}")
+
+    if chunks:
+        with open(_source_path(content_hash, ".chunks.json"), "w") as f:
+            json.dump(chunks, f)
+
+    return IngestedSource(content_hash=content_hash, mime_type=mime_type,
+                          size=size, chunk_count=len(chunks))
+
+
+# uploaded sources are immutable, so the url -> ingested source mapping can be
+# cached and regenerations never download the file again
+_ingested_urls = DiskCache(
+    os.path.join(config.CACHE_DIR, "ingested_sources.sqlite3"),
+    ttl_seconds=30 * 24 * 3600, max_entries=100000)
+
+
+def ingest_source(url: Optional[str]) -> Optional[IngestedSource]:
+    """Download, hash and extract the source at url. None when there is no source"""
+    if not url or not url.strip():
+        return None
+
+    cached = _ingested_urls.get(url)
+    if cached is not None:
+        return IngestedSource(**cached)
+
+    path, content_hash, size, mime_type = _download(url)
+    metadata_path = _source_path(content_hash, ".json")
+
+    if os.path.exists(metadata_path):
+        # same content uploaded under another url
+        os.unlink(path)
+        with open(metadata_path) as f:
+            source = IngestedSource(**json.load(f))
+    else:
+        source = _ingest_file(path, content_hash, size, mime_type)
+        with open(metadata_path, "w") as f:
+            f.write(source.model_dump_json())
+
+    _ingested_urls.set(url, source.model_dump())
+    logger.info(
+        f"Ingested {mime_type} source {content_hash[:12]} ({size} bytes, {source.chunk_count} chunks)")
+    return source
+
+
+def load_chunks(content_hash: str) -> List[str]:
+    try:
+        with open(_source_path(content_hash, ".chunks.json")) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+
+def _terms(text: str) -> List[str]:
+    return re.findall(r"\w{3,}", text.casefold())
+
+
+def relevant_chunks(content_hash: str, topic: str, budget_chars: int) -> List[str]:
+    """
+    The chunks most relevant to topic (by term overlap) that fit in
+    budget_chars, in document order. Small documents are returned whole.
+    """
+    chunks = load_chunks(content_hash)
+    if sum(len(chunk) for chunk in chunks) <= budget_chars:
+        return chunks
+
+    topic_terms = set(_terms(topic))
+    document_frequency = Counter(
+        term for chunk in chunks for term in set(_terms(chunk)))
+
+    def score(index: int):
+        counts = Counter(_terms(chunks[index]))
+        relevance = sum(counts[term] / document_frequency[term]
+                        for term in topic_terms if term in counts)
+        # earlier chunks (introductions) win ties
+        return (relevance, -index)
+
+    selected = []
+    used = 0
+    for index in sorted(range(len(chunks)), key=score, reverse=True):
+        if used + len(chunks[index]) > budget_chars:
+            continue
+        selected.append(index)
+        used += len(chunks[index])
+
+    return [chunks[index] for index in sorted(selected)]
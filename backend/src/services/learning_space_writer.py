@@ -0,0 +1,123 @@
+# -----
+# Write coalescing for learning_space rows: nodes buffer their patches and
+# the workflow writes them in one update per learning space
+# -----
+
+import asyncio
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterable, Optional
+import config
+from services.supabase_service import supabase_service
+from services.telemetry import span
+
+logger = logging.getLogger(__name__)
+
+# id of the run whose patches write() buffers, see LearningSpaceWriter.run()
+_current_run = ContextVar("learning_space_writer_run", default=None)
+
+
+class LearningSpaceWriter:
+    """
+    Buffers learning_space patches per run and row. Patches to the same row
+    are merged (later keys win) and written with a single update on flush.
+    With flush_on_write every write is flushed immediately instead.
+    A row can be mirrored to other rows that receive the same patches.
+    Each run buffers inside its own run() scope, so two runs on one row
+    (e.g. a regeneration next to a workflow) never flush or close each
+    other's patches.
+    """
+
+    def __init__(self, flush_on_write: bool, flush_concurrency: int):
+        self.flush_on_write = flush_on_write
+        self.flush_concurrency = flush_concurrency
+        # (run, row) -> merged patch
+        self._pending = {}
+        self._lock = threading.Lock()
+        # one lock per run and row so that flushes of the same row stay in order
+        self._row_locks = {}
+        self._mirrors = {}
+
+    @contextmanager
+    def run(self):
+        """Scope of the buffers of one run; a nested scope shares the outer one"""
+        token = _current_run.set(_current_run.get() or uuid.uuid4().hex)
+        try:
+            yield
+        finally:
+            _current_run.reset(token)
+
+    @staticmethod
+    def _key(learning_space_id: int, run: Optional[str] = None):
+        return run or _current_run.get(), learning_space_id
+
+    def mirror(self, learning_space_id: int, mirror_ids: Iterable[int]):
+        """
+        Apply every later write to learning_space_id to mirror_ids as well,
+        until it is closed (rows generated once for a batch group)
+        """
+        with self._lock:
+            self._mirrors[self._key(learning_space_id)] = list(mirror_ids)
+
+    def write(self, learning_space_id: int, patch: dict, flush: bool = False):
+        """Buffer patch; flush writes it straight away, e.g. streaming progress"""
+        run, _ = self._key(learning_space_id)
+        with self._lock:
+            row_ids = [learning_space_id, *self._mirrors.get((run, learning_space_id), [])]
+            for row_id in row_ids:
+                self._pending.setdefault((run, row_id), {}).update(patch)
+        if self.flush_on_write or flush:
+            for row_id in row_ids:
+                self.flush(row_id, run)
+
+    def flush(self, learning_space_id: int, run: Optional[str] = None) -> Optional[dict]:
+        """Write the buffered patch of one row, returns what was written"""
+        key = self._key(learning_space_id, run)
+        with self._lock:
+            row_lock = self._row_locks.setdefault(key, threading.Lock())
+
+        with row_lock:
+            with self._lock:
+                patch = self._pending.pop(key, None)
+            if patch:
+                with span("supabase.update_learning_space",
+                          learning_space_id=learning_space_id, fields=sorted(patch)):
+                    supabase_service.update_learning_space(learning_space_id, patch)
+        return patch
+
+    def flush_many(self, learning_space_ids: Iterable[int]):
+        """Flush several finished rows concurrently, e.g. at the end of a batch"""
+        run = _current_run.get()
+        with ThreadPoolExecutor(max_workers=self.flush_concurrency) as executor:
+            list(executor.map(lambda row_id: self.close(row_id, run), list(learning_space_ids)))
+
+    def flush_all(self):
+        with self._lock:
+            keys = list(self._pending)
+        with ThreadPoolExecutor(max_workers=self.flush_concurrency) as executor:
+            list(executor.map(lambda key: self.close(key[1], key[0]), keys))
+
+    def close(self, learning_space_id: int, run: Optional[str] = None):
+        """Flush a row whose run has finished and forget its lock"""
+        key = self._key(learning_space_id, run)
+        patch = self.flush(learning_space_id, key[0])
+        with self._lock:
+            self._mirrors.pop(key, None)
+            if key not in self._pending:
+                self._row_locks.pop(key, None)
+        return patch
+
+    async def awrite(self, learning_space_id: int, patch: dict, flush: bool = False):
+        if self.flush_on_write or flush:
+            await asyncio.to_thread(self.write, learning_space_id, patch, flush)
+        else:
+            self.write(learning_space_id, patch)
+
+
+learning_space_writer = LearningSpaceWriter(
+    flush_on_write=config.LEARNING_SPACE_FLUSH_MODE == "node",
+    flush_concurrency=config.LEARNING_SPACE_FLUSH_CONCURRENCY)
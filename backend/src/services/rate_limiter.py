@@ -0,0 +1,177 @@
+# -----
+# Token-bucket rate limiter for the LLM provider: every model call takes one
+# request and its estimated tokens from per-minute budgets before it is sent
+# -----
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+import config
+
+# set for batch work (regenerations), which leaves a reserve of the budget
+# to interactive requests
+low_priority = ContextVar("llm_low_priority", default=False)
+
+
+class RateLimitUnsatisfiable(ValueError):
+    """A call the budgets can never admit"""
+    pass
+
+
+def count_tokens(text: str) -> int:
+    """Rough token count of a text: about 4 characters per token"""
+    return len(text) // 4
+
+
+def estimate_tokens(value) -> int:
+    """Rough token count of a model call, with the template and output overhead"""
+    text = value if isinstance(value, str) else json.dumps(value, default=str)
+    return count_tokens(text) + config.LLM_REQUEST_OVERHEAD_TOKENS
+
+
+class _MemoryBucketStore:
+    """Bucket levels of this process"""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def buckets(self):
+        with self._lock:
+            yield self._buckets
+
+
+class _SQLiteBucketStore:
+    """Bucket levels shared by all processes using the same local file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS buckets (
+                    name TEXT PRIMARY KEY,
+                    level REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )""")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def buckets(self):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                buckets = {name: (level, updated_at) for name, level, updated_at
+                           in conn.execute("SELECT name, level, updated_at FROM buckets")}
+                yield buckets
+                conn.executemany(
+                    """INSERT OR REPLACE INTO buckets (name, level, updated_at)
+                       VALUES (?, ?, ?)""",
+                    [(name, level, updated_at)
+                     for name, (level, updated_at) in buckets.items()])
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+
+class RateLimiter:
+    """
+    Two token buckets, requests per minute and tokens per minute, refilled
+    continuously. Low priority callers only take budget while more than
+    batch_reserve of each bucket is left.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int,
+                 batch_reserve: float, store):
+        self.capacity = {"requests": float(requests_per_minute),
+                         "tokens": float(tokens_per_minute)}
+        for name, capacity in self.capacity.items():
+            if capacity <= 0:
+                raise RateLimitUnsatisfiable(f"The {name} per minute budget must be positive")
+        self.batch_reserve = batch_reserve
+        self.store = store
+
+    def try_acquire(self, tokens: int, priority_low: bool = False) -> float:
+        """
+        Take one request and tokens if available and return 0, otherwise
+        take nothing and return the seconds to wait before trying again
+        """
+        now = time.time()
+        need = {"requests": 1.0, "tokens": float(tokens)}
+        wait = 0.0
+
+        with self.store.buckets() as buckets:
+            levels = {}
+            for name, capacity in self.capacity.items():
+                level, updated_at = buckets.get(name, (capacity, now))
+                level = min(capacity, level + (now - updated_at) * capacity / 60)
+                levels[name] = level
+
+                required = need[name]
+                if priority_low:
+                    required += capacity * self.batch_reserve
+                # a call larger than the bucket (or than what is left of it
+                # after the reserve) waits for a full bucket
+                required = min(required, capacity)
+                if level < required:
+                    wait = max(wait, (required - level) * 60 / capacity)
+
+            if wait == 0:
+                for name in levels:
+                    levels[name] -= min(need[name], self.capacity[name])
+            for name, level in levels.items():
+                buckets[name] = (level, now)
+        return wait
+
+    @staticmethod
+    def _check_wait(wait: float):
+        # an empty bucket is full again after a minute, a longer wait would
+        # never end
+        if wait > 60:
+            raise RateLimitUnsatisfiable(f"Rate limit wait of {wait:.0f}s can never be satisfied")
+
+    def acquire(self, tokens: int):
+        while True:
+            wait = self.try_acquire(tokens, low_priority.get())
+            if wait == 0:
+                return
+            self._check_wait(wait)
+            time.sleep(min(wait, 1.0))
+
+    async def aacquire(self, tokens: int):
+        while True:
+            wait = await asyncio.to_thread(self.try_acquire, tokens, low_priority.get())
+            if wait == 0:
+                return
+            self._check_wait(wait)
+            await asyncio.sleep(min(wait, 1.0))
+
+
+def _store():
+    if config.LLM_RATE_LIMIT_STORE == "sqlite":
+        return _SQLiteBucketStore(config.LLM_RATE_LIMIT_PATH)
+    return _MemoryBucketStore()
+
+
+rate_limiter = RateLimiter(
+    requests_per_minute=config.LLM_REQUESTS_PER_MINUTE,
+    tokens_per_minute=config.LLM_TOKENS_PER_MINUTE,
+    batch_reserve=config.LLM_BATCH_RESERVE,
+    store=_store())
@@ -0,0 +1,135 @@
+# -----
+# Selective regeneration: rebuild only some artifacts of a learning space,
+# starting from the stored summary instead of running the whole graph
+# -----
+
+import asyncio
+import logging
+import uuid
+from typing import Iterable, Optional
+import config
+from agents.state import SummaryNotes
+from agents.registry import graph_registry
+from agents.resilience import NodesDegraded
+from services import artifact_dependencies
+from services.agent_workflow import _ingest, _initial_state
+from services.artifact_dependencies import ARTIFACTS, produced, record_inputs
+from services.learning_space_writer import learning_space_writer
+from services.run_registry import run_registry
+from services.storage import artifact_uploader
+from services.supabase_service import supabase_service
+from services.telemetry import span
+
+logger = logging.getLogger(__name__)
+
+
+def _prepare(learning_space_id: int, user_id: uuid.UUID, run_id: Optional[int],
+             targets: Optional[Iterable[str]], overrides: Optional[dict]):
+    """Return (input state with the stored artifacts the graph reads, artifacts to build)"""
+    with span("supabase.read_inputs", learning_space_id=learning_space_id):
+        student_profile = supabase_service.get_student_profile(user_id)
+        learning_space = supabase_service.get_learning_space(learning_space_id)
+
+    # e.g. the podcast in another language than the profile's
+    student_profile = {**student_profile, **(overrides or {})}
+    state = _initial_state(learning_space_id, run_id, student_profile, learning_space)
+    artifacts = artifact_dependencies.plan(learning_space_id, state, learning_space, targets)
+
+    if "summary_notes" in artifacts:
+        _ingest(state)
+    else:
+        state["summary_notes"] = SummaryNotes.from_dict(learning_space["summary_notes"])
+    if "audio_script" not in artifacts and learning_space.get("audio_script"):
+        state["podcast_script"] = learning_space["audio_script"]
+    return state, artifacts
+
+
+def _start(state: dict, artifacts, run_id: Optional[int]):
+    """The subgraph of the artifacts, None when nothing is stale; the run is registered either way"""
+    graph = None
+    if artifacts:
+        graph = graph_registry.subgraph(ARTIFACTS[name].node for name in artifacts)
+        logger.info(f"Regenerating {sorted(artifacts)} of learning space {state['learning_space_id']}")
+    if run_id is not None:
+        run_registry.start_run(run_id, state["learning_space_id"],
+                               list(graph.nodes) if graph is not None else [])
+    return graph
+
+
+def _finish(state: dict, artifacts, run_id: Optional[int], final_state: Optional[dict] = None,
+            error: Optional[str] = None):
+    """
+    Return the artifacts the run generated. Only those are recorded as
+    fresh; when a planned artifact is missing (its node degraded) the run
+    fails with NodesDegraded so the queue retries it.
+    """
+    learning_space_id = state["learning_space_id"]
+    uploaded = artifact_uploader.wait(learning_space_id, config.STORAGE_UPLOAD_TIMEOUT)
+    regenerated, degraded = [], None
+    if error is None:
+        # the input state already holds the stored artifacts the graph reads
+        regenerated = sorted(name for name in produced(final_state or {}) if name in artifacts)
+        missing = sorted(set(artifacts) - set(regenerated))
+        if missing:
+            degraded = NodesDegraded([ARTIFACTS[name].node for name in missing])
+            error = str(degraded)
+
+    if run_id is not None:
+        run_registry.finish_run(run_id, error=error)
+    if regenerated and uploaded:
+        record_inputs(learning_space_id, state, regenerated)
+    if degraded is not None:
+        raise degraded
+    return regenerated
+
+
+def regenerate_artifacts(learning_space_id: int, user_id: uuid.UUID,
+                         targets: Optional[Iterable[str]] = None,
+                         overrides: Optional[dict] = None, run_id: Optional[int] = None):
+    """
+    Regenerate targets (by default the artifacts whose inputs changed) and
+    the artifacts generated from them. overrides replace student profile
+    fields for this run. Returns the regenerated artifact names, and raises
+    NodesDegraded when some of them could not be generated.
+    """
+    with span("workflow.regenerate", learning_space_id=learning_space_id, run_id=run_id), \
+            learning_space_writer.run():
+        try:
+            state, artifacts = _prepare(learning_space_id, user_id, run_id, targets, overrides)
+            graph = _start(state, artifacts, run_id)
+            if graph is None:
+                return _finish(state, artifacts, run_id)
+            try:
+                final_state = graph.invoke(state)
+            except Exception as e:
+                _finish(state, artifacts, run_id, error=str(e))
+                raise
+            return _finish(state, artifacts, run_id, final_state)
+        finally:
+            artifact_uploader.wait(learning_space_id, config.STORAGE_UPLOAD_TIMEOUT)
+            learning_space_writer.close(learning_space_id)
+
+
+async def aregenerate_artifacts(learning_space_id: int, user_id: uuid.UUID,
+                                targets: Optional[Iterable[str]] = None,
+                                overrides: Optional[dict] = None,
+                                run_id: Optional[int] = None):
+    """Async version of regenerate_artifacts"""
+    with span("workflow.regenerate", learning_space_id=learning_space_id, run_id=run_id), \
+            learning_space_writer.run():
+        try:
+            state, artifacts = await asyncio.to_thread(
+                _prepare, learning_space_id, user_id, run_id, targets, overrides)
+            graph = await asyncio.to_thread(_start, state, artifacts, run_id)
+            if graph is None:
+                return await asyncio.to_thread(_finish, state, artifacts, run_id)
+            try:
+                final_state = await graph.ainvoke(state)
+            except Exception as e:
+                await asyncio.to_thread(_finish, state, artifacts, run_id, error=str(e))
+                raise
+            return await asyncio.to_thread(_finish, state, artifacts, run_id, final_state)
+        finally:
+            await asyncio.to_thread(
+                artifact_uploader.wait, learning_space_id, config.STORAGE_UPLOAD_TIMEOUT)
+            await asyncio.to_thread(learning_space_writer.close, learning_space_id)
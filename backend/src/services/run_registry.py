@@ -0,0 +1,188 @@
+# -----
+# Run registry: records the state of every workflow run and its nodes so the
+# API can report progress without reading the learning_space rows
+# -----
+
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+import config
+from services.artifact_store import artifact_store
+
+
+class RunStatus:
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class RunRegistry:
+    """Run and per-node state stored in a local SQLite database"""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._create_schema()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+        finally:
+            conn.close()
+
+    def _create_schema(self):
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS runs (
+                    run_id INTEGER PRIMARY KEY,
+                    learning_space_id INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    error TEXT,
+                    started_at REAL,
+                    finished_at REAL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS run_nodes (
+                    run_id INTEGER NOT NULL,
+                    node TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    input_tokens INTEGER,
+                    output_tokens INTEGER,
+                    output TEXT,
+                    error TEXT,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (run_id, node)
+                );
+            """)
+
+    # ------- Writers --------
+
+    def start_run(self, run_id: int, learning_space_id: int, nodes: List[str],
+                  resume: bool = False):
+        """
+        Register a run (or a retry of it) with all its nodes pending. A retry
+        resumed from a checkpoint keeps the nodes that already finished.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                """INSERT INTO runs (run_id, learning_space_id, status,
+                                     started_at, updated_at)
+                   VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT (run_id) DO UPDATE SET
+                       status = excluded.status, error = NULL,
+                       started_at = excluded.started_at, finished_at = NULL,
+                       updated_at = excluded.updated_at""",
+                (run_id, learning_space_id, RunStatus.RUNNING, now, now))
+            if resume:
+                conn.execute(
+                    """UPDATE run_nodes SET status = ?, started_at = NULL,
+                           finished_at = NULL, input_tokens = NULL,
+                           output_tokens = NULL, output = NULL, error = NULL,
+                           updated_at = ?
+                       WHERE run_id = ? AND status != ?""",
+                    (RunStatus.PENDING, now, run_id, RunStatus.DONE))
+            else:
+                conn.execute("DELETE FROM run_nodes WHERE run_id = ?", (run_id,))
+            conn.executemany(
+                """INSERT OR IGNORE INTO run_nodes (run_id, node, status, updated_at)
+                   VALUES (?, ?, ?, ?)""",
+                [(run_id, node, RunStatus.PENDING, now) for node in nodes])
+            conn.execute("COMMIT")
+
+    def finish_run(self, run_id: int, error: Optional[str] = None):
+        now = time.time()
+        status = RunStatus.FAILED if error else RunStatus.DONE
+        with self._connect() as conn:
+            conn.execute(
+                """UPDATE runs SET status = ?, error = ?, finished_at = ?,
+                                   updated_at = ?
+                   WHERE run_id = ?""",
+                (status, error, now, now, run_id))
+
+    def node_started(self, run_id: int, node: str):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                """INSERT INTO run_nodes (run_id, node, status, started_at,
+                                          updated_at)
+                   VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT (run_id, node) DO UPDATE SET
+                       status = excluded.status,
+                       started_at = excluded.started_at,
+                       updated_at = excluded.updated_at""",
+                (run_id, node, RunStatus.RUNNING, now, now))
+
+    def node_progress(self, run_id: int, node: str, output: Any):
+        """Record the partial output of a node that is still running"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                """UPDATE run_nodes SET output = ?, updated_at = ?
+                   WHERE run_id = ? AND node = ? AND status = ?""",
+                (json.dumps(output, default=str), now, run_id, node,
+                 RunStatus.RUNNING))
+
+    def node_finished(self, run_id: int, node: str, output: Any,
+                      input_tokens: int = 0, output_tokens: int = 0):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                """UPDATE run_nodes SET status = ?, finished_at = ?,
+                       input_tokens = ?, output_tokens = ?, output = ?,
+                       updated_at = ?
+                   WHERE run_id = ? AND node = ?""",
+                (RunStatus.DONE, now, input_tokens, output_tokens,
+                 json.dumps(output, default=str), now, run_id, node))
+
+    def node_failed(self, run_id: int, node: str, error: str,
+                    input_tokens: int = 0, output_tokens: int = 0):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                """UPDATE run_nodes SET status = ?, finished_at = ?,
+                       input_tokens = ?, output_tokens = ?, error = ?,
+                       updated_at = ?
+                   WHERE run_id = ? AND node = ?""",
+                (RunStatus.FAILED, now, input_tokens, output_tokens, error,
+                 now, run_id, node))
+
+    # ------- Readers --------
+
+    def get_run(self, run_id: int, include_output: bool = False) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            run = conn.execute("SELECT * FROM runs WHERE run_id = ?",
+                               (run_id,)).fetchone()
+            if run is None:
+                return None
+            nodes = conn.execute(
+                "SELECT * FROM run_nodes WHERE run_id = ? ORDER BY rowid",
+                (run_id,)).fetchall()
+
+        result = dict(run)
+        result["nodes"] = []
+        for row in nodes:
+            node = dict(row)
+            output = node.pop("output")
+            if include_output:
+                node["output"] = artifact_store.resolve(json.loads(output)) if output else None
+            if node["started_at"] and node["finished_at"]:
+                node["duration"] = node["finished_at"] - node["started_at"]
+            result["nodes"].append(node)
+        return result
+
+
+run_registry = RunRegistry(config.RUN_REGISTRY_PATH)
@@ -0,0 +1,177 @@
+# -----
+# Semantic cache of summary notes: reuses the summary of an earlier topic
+# that is close enough in meaning for the same grade level and language
+# -----
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional, Tuple
+import numpy as np
+import config
+from agents.models import get_embeddings
+from agents.prompts import prompt_registry
+from services.artifact_cache import normalize_text
+from services.telemetry import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class _Partition:
+    """Row ids and vectors of one (grade_level, language) pair held in memory"""
+
+    def __init__(self):
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+
+    def append(self, ids: np.ndarray, vectors: np.ndarray):
+        self.ids = np.concatenate([self.ids, ids])
+        self.vectors = vectors if not len(self.vectors) else np.vstack([self.vectors, vectors])
+
+    def drop_before(self, min_id: int):
+        keep = self.ids >= min_id
+        self.ids, self.vectors = self.ids[keep], self.vectors[keep]
+
+
+class SemanticSummaryCache:
+    """
+    In-process NumPy index of topic embeddings per (grade_level, language).
+    Entries are appended to a SQLite file shared by the worker processes;
+    each process only reads the rows added since its last lookup, and the
+    summaries are read on a hit.
+    """
+
+    def __init__(self, path: str, threshold: float, max_entries: int):
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._partitions = {}
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._create_schema()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+        finally:
+            conn.close()
+
+    def _create_schema(self):
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    partition TEXT NOT NULL,
+                    topic TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    summary TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_entries_partition_id
+                    ON entries (partition, id);
+            """)
+
+    def _partition_key(self, grade_level: str, language: str) -> str:
+        # summaries from other prompt versions or models are never reused, and
+        # vectors of another embedding model (or dimension) are never compared
+        name = "|".join([normalize_text(grade_level), normalize_text(language),
+                         prompt_registry.fingerprint(["node_summary_notes"]), config.LLM_MODEL,
+                         config.EMBEDDING_MODEL])
+        return hashlib.sha256(name.encode()).hexdigest()[:16]
+
+    def _sync(self, conn, key: str) -> _Partition:
+        """The partition with the rows other processes added or evicted since the last sync"""
+        partition = self._partitions.setdefault(key, _Partition())
+        last_id = int(partition.ids[-1]) if len(partition.ids) else 0
+        rows = conn.execute(
+            "SELECT id, vector FROM entries WHERE partition = ? AND id > ? ORDER BY id",
+            (key, last_id)).fetchall()
+        if rows:
+            partition.append(np.array([row[0] for row in rows], dtype=np.int64),
+                             np.vstack([np.frombuffer(row[1], dtype=np.float32) for row in rows]))
+
+        min_id = conn.execute("SELECT MIN(id) FROM entries WHERE partition = ?",
+                              (key,)).fetchone()[0]
+        partition.drop_before(min_id if min_id is not None else last_id + 1)
+        return partition
+
+    def embed(self, topic: str) -> np.ndarray:
+        vector = np.asarray(
+            get_embeddings().embed_query(normalize_text(topic)), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def find(self, topic: str, grade_level: str, language: str) -> Tuple[Optional[dict], np.ndarray]:
+        """
+        Return (summary of the most similar cached topic or None, embedding of
+        topic). The embedding can be passed to add() after a miss.
+        """
+        vector = self.embed(topic)
+        key = self._partition_key(grade_level, language)
+
+        with self._lock, self._connect() as conn:
+            partition = self._sync(conn, key)
+            match = None
+            if len(partition.ids):
+                scores = partition.vectors @ vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    # None when the entry was evicted since the sync
+                    match = conn.execute("SELECT topic, summary FROM entries WHERE id = ?",
+                                         (int(partition.ids[best]),)).fetchone()
+                    if match is not None:
+                        logger.info(
+                            f"Semantic cache hit: '{topic}' ~ '{match[0]}' ({scores[best]:.3f})")
+
+            metrics.inc("fluence_cache_requests_total", cache="semantic",
+                        result="miss" if match is None else "hit")
+            if match is None:
+                self.misses += 1
+                return None, vector
+            self.hits += 1
+            return json.loads(match[1]), vector
+
+    def add(self, vector: np.ndarray, topic: str, grade_level: str,
+            language: str, summary: dict):
+        key = self._partition_key(grade_level, language)
+
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                """INSERT INTO entries (partition, topic, vector, summary, created_at)
+                   VALUES (?, ?, ?, ?, ?)""",
+                (key, topic, np.asarray(vector, dtype=np.float32).tobytes(),
+                 json.dumps(summary), time.time()))
+            # keep the most recent entries only
+            conn.execute(
+                """DELETE FROM entries WHERE partition = ? AND id <= (
+                       SELECT id FROM entries WHERE partition = ?
+                       ORDER BY id DESC LIMIT 1 OFFSET ?)""",
+                (key, key, self.max_entries))
+            conn.execute("COMMIT")
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+
+semantic_summary_cache = SemanticSummaryCache(
+    os.path.join(config.CACHE_DIR, "semantic_cache.sqlite3"),
+    threshold=config.SEMANTIC_CACHE_THRESHOLD,
+    max_entries=config.SEMANTIC_CACHE_MAX_ENTRIES)
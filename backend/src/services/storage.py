@@ -0,0 +1,227 @@
+# -----
+# Storage of generated files (mindmap images, audio): pluggable backends and
+# a background uploader so uploads never block the agent graph
+# -----
+
+import contextvars
+import hashlib
+import importlib
+import io
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import BinaryIO, Callable, Optional, Union
+import config
+from services.cache import DiskCache
+from services.telemetry import span
+
+logger = logging.getLogger(__name__)
+
+# bytes, a binary file object, or a callable producing either (rendered lazily
+# on the upload thread)
+UploadData = Union[bytes, BinaryIO, Callable[[], Union[bytes, BinaryIO]]]
+
+
+def content_key(prefix: str, content: Union[str, bytes], extension: str) -> str:
+    """Storage key derived from content, identical content maps to one file"""
+    if isinstance(content, str):
+        content = content.encode()
+    return f"{prefix}_{hashlib.sha256(content).hexdigest()[:32]}{extension}"
+
+
+class StorageBackend:
+    """Interface of the file storage used for generated artifacts"""
+
+    def put(self, key: str, data: Union[bytes, BinaryIO], content_type: str):
+        raise NotImplementedError
+
+    def public_url(self, key: str) -> str:
+        """URL of key, known before the file is uploaded"""
+        raise NotImplementedError
+
+
+class SupabaseStorageBackend(StorageBackend):
+    """The Supabase Storage bucket used by supabase_service"""
+
+    def put(self, key: str, data: Union[bytes, BinaryIO], content_type: str):
+        from services.supabase_service import supabase_service
+
+        if not isinstance(data, bytes):
+            data = data.read()
+        try:
+            # the content type goes into the upload's file options; the
+            # frontend shows mindmaps with <img>, which needs image/svg+xml
+            supabase_service.upload_file(key, data, content_type=content_type)
+        except Exception as e:
+            # keys are content hashes, an existing object has the same bytes
+            if "duplicate" in str(e).lower() or "already exists" in str(e).lower():
+                return
+            raise
+
+    def public_url(self, key: str) -> str:
+        from services.supabase_service import supabase_service
+
+        return supabase_service.get_public_url(key)
+
+
+class LocalStorageBackend(StorageBackend):
+    """Files on local disk, for development and tests"""
+
+    def __init__(self, root: Optional[str] = None, base_url: Optional[str] = None):
+        self.root = root or config.STORAGE_LOCAL_DIR
+        self.base_url = config.STORAGE_PUBLIC_BASE_URL if base_url is None else base_url
+        os.makedirs(self.root, exist_ok=True)
+
+    def put(self, key: str, data: Union[bytes, BinaryIO], content_type: str):
+        path = os.path.join(self.root, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as f:
+            if isinstance(data, bytes):
+                f.write(data)
+            else:
+                shutil.copyfileobj(data, f)
+        os.replace(f.name, path)
+
+    def public_url(self, key: str) -> str:
+        if self.base_url:
+            return f"{self.base_url.rstrip('/')}/{key}"
+        return Path(self.root, key).resolve().as_uri()
+
+
+class S3StorageBackend(StorageBackend):
+    """An S3 bucket, or a MinIO / S3 compatible one via STORAGE_S3_ENDPOINT_URL"""
+
+    def __init__(self, bucket: Optional[str] = None, endpoint_url: Optional[str] = None):
+        import boto3
+
+        self.bucket = bucket or config.STORAGE_S3_BUCKET
+        self.endpoint_url = endpoint_url or config.STORAGE_S3_ENDPOINT_URL
+        self.client = boto3.client("s3", endpoint_url=self.endpoint_url)
+
+    def put(self, key: str, data: Union[bytes, BinaryIO], content_type: str):
+        if isinstance(data, bytes):
+            data = io.BytesIO(data)
+        # multipart upload straight from the file object
+        self.client.upload_fileobj(
+            data, self.bucket, key, ExtraArgs={"ContentType": content_type})
+
+    def public_url(self, key: str) -> str:
+        if config.STORAGE_PUBLIC_BASE_URL:
+            return f"{config.STORAGE_PUBLIC_BASE_URL.rstrip('/')}/{key}"
+        if self.endpoint_url:
+            return f"{self.endpoint_url.rstrip('/')}/{self.bucket}/{key}"
+        return f"https://{self.bucket}.s3.amazonaws.com/{key}"
+
+
+def _load_backend(dotted_path: str):
+    module_name, class_name = dotted_path.rsplit(".", 1)
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+class ArtifactUploader:
+    """
+    Uploads files on a small thread pool with retries. submit() returns the
+    public URL straight away; a workflow calls wait() for its uploads before
+    it writes its results. Keys already uploaded are skipped.
+    """
+
+    def __init__(self, workers: int, attempts: int, retry_delay: float):
+        self.workers = workers
+        self.attempts = attempts
+        self.retry_delay = retry_delay
+        self._backend = None
+        self._executor = None
+        self._pending = defaultdict(list)
+        self._lock = threading.Lock()
+        self._uploaded = DiskCache(
+            os.path.join(config.CACHE_DIR, "uploaded_files.sqlite3"),
+            ttl_seconds=365 * 24 * 3600, max_entries=1000000)
+
+    @property
+    def backend(self) -> StorageBackend:
+        # created on first use so worker processes build their own clients
+        with self._lock:
+            if self._backend is None:
+                self._backend = _load_backend(config.STORAGE_BACKEND)()
+            return self._backend
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="upload")
+            return self._executor
+
+    def _upload(self, key: str, data: UploadData, content_type: str, url: str,
+                on_uploaded: Optional[Callable[[str], None]]):
+        if callable(data):
+            try:
+                data = data()
+            except Exception as e:
+                logger.error(f"Could not produce {key} for upload: {e}")
+                raise
+
+        for attempt in range(self.attempts):
+            try:
+                if not isinstance(data, bytes):
+                    data.seek(0)
+                with span("storage.put", key=key, attempt=attempt):
+                    self.backend.put(key, data, content_type)
+                break
+            except Exception as e:
+                if attempt == self.attempts - 1:
+                    logger.error(f"Upload of {key} failed after {self.attempts} attempts: {e}")
+                    raise
+                delay = self.retry_delay * 2 ** attempt
+                logger.warning(f"Upload of {key} failed, retrying in {delay:.1f}s: {e}")
+                time.sleep(delay)
+
+        self._uploaded.set(key, url)
+        logger.info(f"Uploaded {key}")
+        if on_uploaded is not None:
+            on_uploaded(url)
+
+    def submit(self, key: str, data: UploadData, content_type: str,
+               owner: Optional[int] = None,
+               on_uploaded: Optional[Callable[[str], None]] = None) -> str:
+        """
+        Queue an upload and return its public URL. on_uploaded(url) runs once
+        the file is stored (straight away if key was uploaded before).
+        """
+        url = self._uploaded.get(key)
+        if url is not None:
+            if on_uploaded is not None:
+                on_uploaded(url)
+            return url
+
+        url = self.backend.public_url(key)
+        # on_uploaded writes to the learning space buffers of the caller's run
+        future = self._get_executor().submit(
+            contextvars.copy_context().run, self._upload, key, data, content_type, url, on_uploaded)
+        with self._lock:
+            self._pending[owner].append(future)
+        return url
+
+    def wait(self, owner: Optional[int], timeout: Optional[float] = None) -> bool:
+        """Wait for the uploads of owner, True when all of them succeeded"""
+        with self._lock:
+            futures = self._pending.pop(owner, [])
+        if not futures:
+            return True
+
+        done, not_done = wait(futures, timeout=timeout)
+        if not_done:
+            logger.warning(f"{len(not_done)} uploads of {owner} still running after {timeout}s")
+        return not not_done and all(future.exception() is None for future in done)
+
+
+artifact_uploader = ArtifactUploader(
+    workers=config.STORAGE_UPLOAD_WORKERS,
+    attempts=config.STORAGE_UPLOAD_ATTEMPTS,
+    retry_delay=config.STORAGE_UPLOAD_RETRY_DELAY)
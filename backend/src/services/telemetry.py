@@ -0,0 +1,369 @@
+# -----
+# Telemetry: spans for workflow runs, nodes, model, storage and database
+# calls, metrics aggregated across the API and worker processes and served
+# in the Prometheus text format, and redaction of large payloads
+# -----
+
+import atexit
+import importlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+import config
+
+logger = logging.getLogger(__name__)
+
+# fields of the agent state and learning space that hold generated content
+REDACTED_FIELDS = {"summary_notes", "podcast_script", "audio_script", "quiz",
+                   "recommendations", "mindmap", "mindmap_layout", "topic_summary",
+                   "source_text", "script", "student_profile"}
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+                   20, 30, 60, 120, 300)
+
+
+def redact(value: Any, max_chars: Optional[int] = None, depth: int = 0) -> Any:
+    """
+    A copy of value that is safe to log: generated content is replaced by
+    its size, long strings are truncated and containers are shortened
+    """
+    max_chars = max_chars or config.TELEMETRY_REDACT_CHARS
+    if hasattr(value, "model_dump"):
+        value = value.model_dump()
+    if isinstance(value, str):
+        if len(value) <= max_chars:
+            return value
+        return f"{value[:max_chars]}...<{len(value)} chars>"
+    if isinstance(value, dict):
+        if depth > 3:
+            return f"<dict of {len(value)} keys>"
+        return {key: (f"<redacted {len(json.dumps(item, default=str))} chars>"
+                      if key in REDACTED_FIELDS and item is not None
+                      else redact(item, max_chars, depth + 1))
+                for key, item in list(value.items())[:50]}
+    if isinstance(value, (list, tuple)):
+        items = [redact(item, max_chars, depth + 1) for item in value[:10]]
+        if len(value) > 10:
+            items.append(f"<{len(value) - 10} more>")
+        return items
+    return value
+
+
+class RedactingFilter(logging.Filter):
+    """Truncates log messages, so a stray state dump stays out of the logs"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        message = record.getMessage()
+        if len(message) > config.LOG_MAX_CHARS:
+            record.msg = f"{message[:config.LOG_MAX_CHARS]}...<{len(message)} chars>"
+            record.args = ()
+        return True
+
+
+def install_log_redaction():
+    for handler in logging.getLogger().handlers:
+        if not any(isinstance(f, RedactingFilter) for f in handler.filters):
+            handler.addFilter(RedactingFilter())
+
+
+# ------- Metrics --------
+
+def _escape(value: Any) -> str:
+    """A label value as the exposition format requires: backslash, quote and newline escaped"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    """
+    Counters and histograms kept in memory and merged every flush_interval
+    into a local SQLite file, so /metrics reports the totals of all the
+    processes (API and workers) that share DATA_DIR
+    """
+
+    def __init__(self, path: str, flush_interval: float):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._pending = defaultdict(float)
+        self._kinds = {}
+        self._lock = threading.Lock()
+        self._flusher = None
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS metrics (
+                    name TEXT NOT NULL,
+                    labels TEXT NOT NULL,
+                    series TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    value REAL NOT NULL,
+                    PRIMARY KEY (name, labels, series)
+                )""")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+        finally:
+            conn.close()
+
+    def _start_flusher(self):
+        if self._flusher is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(self.flush_interval)
+                try:
+                    self.flush()
+                except Exception as e:
+                    logger.warning(f"Could not flush metrics: {e}")
+
+        self._flusher = threading.Thread(target=run, name="metrics-flush", daemon=True)
+        self._flusher.start()
+        atexit.register(self.flush)
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = (name, json.dumps(labels, sort_keys=True, default=str), "value")
+        with self._lock:
+            self._kinds[name] = "counter"
+            self._pending[key] += value
+            self._start_flusher()
+
+    def observe(self, name: str, value: float, **labels):
+        label_key = json.dumps(labels, sort_keys=True, default=str)
+        with self._lock:
+            self._kinds[name] = "histogram"
+            for bound in SECONDS_BUCKETS:
+                if value <= bound:
+                    self._pending[(name, label_key, f"bucket:{bound}")] += 1
+            self._pending[(name, label_key, "bucket:+Inf")] += 1
+            self._pending[(name, label_key, "sum")] += value
+            self._pending[(name, label_key, "count")] += 1
+            self._start_flusher()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(float)
+            kinds = dict(self._kinds)
+        if not pending:
+            return
+        with self._connect() as conn:
+            conn.executemany(
+                """INSERT INTO metrics (name, labels, series, kind, value)
+                   VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT (name, labels, series) DO UPDATE SET
+                       value = value + excluded.value""",
+                [(name, labels, series, kinds[name], value)
+                 for (name, labels, series), value in pending.items()])
+
+    @staticmethod
+    def _labels(labels: Dict[str, Any], **extra) -> str:
+        labels = {**labels, **extra}
+        if not labels:
+            return ""
+        pairs = ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+        return "{" + pairs + "}"
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        self.flush()
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT name, labels, series, kind, value FROM metrics").fetchall()
+        # buckets in increasing order, then sum and count
+        rows.sort(key=lambda row: (row[0], row[1], float(row[2][7:])
+                                   if row[2].startswith("bucket:") else float("inf"), row[2]))
+
+        lines = []
+        typed = set()
+        for name, label_key, series, kind, value in rows:
+            if name not in typed:
+                lines.append(f"# TYPE {name} {kind}")
+                typed.add(name)
+            labels = json.loads(label_key)
+            if series == "value":
+                lines.append(f"{name}{self._labels(labels)} {value:g}")
+            elif series.startswith("bucket:"):
+                lines.append(
+                    f"{name}_bucket{self._labels(labels, le=series[7:])} {value:g}")
+            else:
+                lines.append(f"{name}_{series}{self._labels(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics(config.METRICS_PATH, config.METRICS_FLUSH_INTERVAL)
+
+
+# ------- Spans --------
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start_time: float
+    end_time: Optional[float] = None
+    status: str = "ok"
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def duration(self) -> float:
+        return (self.end_time or time.time()) - self.start_time
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+
+class SpanExporter:
+    """Receives every span when it opens and once it finished"""
+
+    def start(self, span: Span):
+        pass
+
+    def export(self, span: Span):
+        pass
+
+
+class LogSpanExporter(SpanExporter):
+    """One redacted JSON line per span, for local use"""
+
+    def export(self, span: Span):
+        logger.info("span " + json.dumps({
+            "name": span.name, "trace_id": span.trace_id, "span_id": span.span_id,
+            "parent_id": span.parent_id, "duration": round(span.duration, 4),
+            "status": span.status, "attributes": span.attributes}, default=str))
+
+
+class InMemorySpanExporter(SpanExporter):
+    """Keeps the last spans in memory, a local stand-in for a collector"""
+
+    def __init__(self, max_spans: int = 10000):
+        self.max_spans = max_spans
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+            del self.spans[:-self.max_spans]
+
+
+class OpenTelemetrySpanExporter(SpanExporter):
+    """
+    Mirrors spans as OpenTelemetry spans, so whatever SDK and exporter
+    (OTLP, console, ...) the process configured receives them. Each span is
+    started as a child of its parent's OpenTelemetry span, keeping the
+    node, LLM and Supabase spans of a run in one trace.
+    """
+
+    def __init__(self):
+        from opentelemetry import trace
+
+        self._trace = trace
+        self._tracer = trace.get_tracer("fluence")
+        # span_id -> OpenTelemetry span of the open spans
+        self._open = {}
+        self._lock = threading.Lock()
+
+    def start(self, span: Span):
+        with self._lock:
+            parent = self._open.get(span.parent_id)
+        # a root span joins the active OpenTelemetry context, e.g. a request
+        context = self._trace.set_span_in_context(parent) if parent is not None else None
+        otel_span = self._tracer.start_span(
+            span.name, context=context, start_time=int(span.start_time * 1e9))
+        with self._lock:
+            self._open[span.span_id] = otel_span
+
+    def export(self, span: Span):
+        with self._lock:
+            otel_span = self._open.pop(span.span_id, None)
+        if otel_span is None:
+            self.start(span)
+            with self._lock:
+                otel_span = self._open.pop(span.span_id)
+        otel_span.set_attributes(
+            {key: value if isinstance(value, (str, bool, int, float)) else str(value)
+             for key, value in span.attributes.items() if value is not None})
+        if span.status == "error":
+            otel_span.set_status(self._trace.Status(self._trace.StatusCode.ERROR))
+        otel_span.end(end_time=int(span.end_time * 1e9))
+
+
+_EXPORTERS = {
+    "none": SpanExporter,
+    "log": LogSpanExporter,
+    "memory": InMemorySpanExporter,
+    "otel": OpenTelemetrySpanExporter,
+}
+
+
+def _load_exporter(name: str) -> SpanExporter:
+    try:
+        if name in _EXPORTERS:
+            return _EXPORTERS[name]()
+        module_name, class_name = name.rsplit(".", 1)
+        return getattr(importlib.import_module(module_name), class_name)()
+    except Exception as e:
+        logger.warning(f"Span exporter {name} unavailable, spans are not exported: {e}")
+        return SpanExporter()
+
+
+span_exporter = _load_exporter(config.TELEMETRY_EXPORTER)
+_current_span = ContextVar("telemetry_span", default=None)
+
+
+def current_span() -> Span:
+    """The innermost open span, or a detached one outside any span"""
+    return _current_span.get() or Span("detached", "", "", None, time.time())
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Time a block as a span (a child of the current one) and record its
+    duration in fluence_span_seconds. Attributes are redacted.
+    """
+    parent = _current_span.get()
+    current = Span(
+        name=name,
+        trace_id=parent.trace_id if parent else uuid.uuid4().hex,
+        span_id=uuid.uuid4().hex[:16],
+        parent_id=parent.span_id if parent else None,
+        start_time=time.time(),
+        attributes=attributes)
+    token = _current_span.set(current)
+    try:
+        span_exporter.start(current)
+    except Exception as e:
+        logger.warning(f"Could not start span {name}: {e}")
+    try:
+        yield current
+    except BaseException as e:
+        current.status = "error"
+        current.attributes["error"] = str(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end_time = time.time()
+        current.attributes = redact(current.attributes)
+        metrics.observe("fluence_span_seconds", current.duration,
+                        span=name, status=current.status)
+        try:
+            span_exporter.export(current)
+        except Exception as e:
+            logger.warning(f"Could not export span {name}: {e}")
@@ -0,0 +1,198 @@
+# -----
+# Text to speech for the audio overviews: the script is split into sentence
+# sized chunks that are synthesised concurrently (Amazon Polly), cached on
+# disk and stitched into one file
+# -----
+
+import hashlib
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+import config
+from services.learning_space_writer import learning_space_writer
+from services.storage import artifact_uploader, content_key
+from services.telemetry import metrics, span
+
+logger = logging.getLogger(__name__)
+
+# sentence ends, including the devanagari danda
+_SENTENCE_END = re.compile(r"(?<=[.!?।])\s+")
+
+
+def tts_language_code(language: Optional[str]) -> str:
+    return "hi-IN" if (language or "").strip().lower() == "hindi" else "en-IN"
+
+
+def split_sentences(text: str, max_chars: int) -> List[str]:
+    """
+    Split text into chunks of whole sentences of up to max_chars. A single
+    sentence longer than max_chars is split at spaces.
+    """
+    chunks = []
+    current = ""
+    for sentence in _SENTENCE_END.split(text.strip()):
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}".strip()
+
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class ChunkAudioCache:
+    """Synthesised chunks as files on disk, the oldest removed past max_files"""
+
+    def __init__(self, directory: str, max_files: int):
+        self.directory = directory
+        self.max_files = max_files
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.{config.TTS_FORMAT}")
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as f:
+                audio = f.read()
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            metrics.inc("fluence_cache_requests_total", cache="tts_chunks", result="miss")
+            return None
+        # reads refresh the mtime, so eviction drops the least recently used
+        os.utime(self._path(key))
+        with self._lock:
+            self.hits += 1
+        metrics.inc("fluence_cache_requests_total", cache="tts_chunks", result="hit")
+        return audio
+
+    def set(self, key: str, audio: bytes):
+        temp_path = f"{self._path(key)}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(audio)
+        os.replace(temp_path, self._path(key))
+        self._evict()
+
+    def _evict(self):
+        entries = os.listdir(self.directory)
+        if len(entries) <= self.max_files:
+            return
+        paths = [os.path.join(self.directory, name) for name in entries]
+        paths.sort(key=lambda path: os.stat(path).st_mtime)
+        for path in paths[:len(paths) - self.max_files]:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+
+chunk_audio_cache = ChunkAudioCache(
+    os.path.join(config.CACHE_DIR, "tts"), max_files=config.TTS_CACHE_MAX_FILES)
+
+_polly = None
+_polly_lock = threading.Lock()
+
+
+def _get_polly():
+    global _polly
+    with _polly_lock:
+        if _polly is None:
+            import boto3
+
+            _polly = boto3.client("polly")
+        return _polly
+
+
+def chunk_key(text: str, voice: str, language_code: str) -> str:
+    key = "|".join([text, voice, language_code, config.TTS_ENGINE, config.TTS_FORMAT])
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def synthesize_chunk(text: str, voice: str, language_code: str) -> bytes:
+    key = chunk_key(text, voice, language_code)
+    audio = chunk_audio_cache.get(key)
+    if audio is not None:
+        return audio
+
+    with span("tts.synthesize", chars=len(text), language_code=language_code):
+        response = _get_polly().synthesize_speech(
+            Text=text, VoiceId=voice, LanguageCode=language_code,
+            Engine=config.TTS_ENGINE, OutputFormat=config.TTS_FORMAT)
+        with response["AudioStream"] as stream:
+            audio = stream.read()
+
+    chunk_audio_cache.set(key, audio)
+    return audio
+
+
+def synthesize_script(script: str, language_code: str, learning_space_id: int,
+                      on_progress: Optional[Callable[[List[str]], None]] = None) -> Optional[str]:
+    """
+    Synthesise script and queue the stitched audio for upload, returning its
+    public URL; the learning space gets it as audio_overview once stored.
+    Every chunk is uploaded as well and on_progress receives the URLs of the
+    stored chunks that can be played in order so far. None when the script
+    has no text, nothing is synthesised then.
+    """
+    voice = config.TTS_VOICE
+    chunks = split_sentences(script or "", config.TTS_CHUNK_CHARS)
+    if not chunks:
+        return None
+    keys = [chunk_key(chunk, voice, language_code) for chunk in chunks]
+    audio = [None] * len(chunks)
+    chunk_urls = [None] * len(chunks)
+    lock = threading.Lock()
+
+    def chunk_uploaded(index: int, url: str):
+        with lock:
+            chunk_urls[index] = url
+            playable = []
+            for chunk_url in chunk_urls:
+                if chunk_url is None:
+                    break
+                playable.append(chunk_url)
+            if on_progress is not None and playable:
+                on_progress(playable)
+
+    def run(index: int):
+        audio[index] = synthesize_chunk(chunks[index], voice, language_code)
+        artifact_uploader.submit(
+            f"tts_{keys[index]}.{config.TTS_FORMAT}", audio[index],
+            f"audio/{config.TTS_FORMAT}", owner=learning_space_id,
+            on_uploaded=lambda url: chunk_uploaded(index, url))
+
+    with ThreadPoolExecutor(max_workers=config.TTS_CONCURRENCY) as executor:
+        list(executor.map(run, range(len(chunks))))
+
+    # frames of MP3 chunks with the same encoding can be concatenated
+    return artifact_uploader.submit(
+        content_key("audio_overview", "".join(keys), f".{config.TTS_FORMAT}"),
+        b"".join(audio), f"audio/{config.TTS_FORMAT}", owner=learning_space_id,
+        on_uploaded=lambda url: learning_space_writer.write(
+            learning_space_id, {"audio_overview": url}))
@@ -0,0 +1,24 @@
+import os
+import sys
+import tempfile
+import pytest
+
+# the caches, metrics and queues of the imported modules live under DATA_DIR
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="fluence-tests-"))
+# the in-memory supabase_service and fake models of the benchmarks, installed
+# before any test module imports the graph nodes that bind them
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "benchmarks"))
+
+import fakes  # noqa: E402
+
+_supabase_service, _models = fakes.install(fakes.Latency("0"))
+
+
+@pytest.fixture
+def fake_supabase():
+    return _supabase_service
+
+
+@pytest.fixture
+def fake_models():
+    return _models
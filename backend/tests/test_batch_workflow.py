@@ -0,0 +1,66 @@
+import pytest
+import jobs.queue
+from jobs.backends import JobStatus, SQLiteJobQueue
+from jobs.queue import BATCH_GROUP_JOB, enqueue_batch
+from services.batch_workflow import get_batch_status, plan_batch
+
+USERS = ["00000000-0000-0000-0000-00000000000%d" % i for i in range(4)]
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    queue = SQLiteJobQueue(str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setattr(jobs.queue, "_queue", queue)
+    return queue
+
+
+@pytest.fixture
+def missing_rows(fake_supabase, monkeypatch):
+    get_student_profile = fake_supabase.get_student_profile
+    get_learning_space = fake_supabase.get_learning_space
+    monkeypatch.setattr(fake_supabase, "get_student_profile",
+                        lambda user_id: None if user_id == USERS[1] else get_student_profile(user_id))
+    monkeypatch.setattr(fake_supabase, "get_learning_space",
+                        lambda id: None if id == 13 else get_learning_space(id))
+
+
+def _plan(queue, items):
+    plan = enqueue_batch(items)
+    claimed = queue.claim("worker", tenant_limit=10, lease_seconds=60)
+    assert claimed.id == plan.id
+    plan_batch(claimed)
+    queue.complete(plan.id, "worker")
+    return plan.batch_id
+
+
+def test_missing_profiles_and_learning_spaces_are_skipped(queue, missing_rows):
+    batch_id = _plan(queue, [(10, USERS[0]), (11, USERS[1]), (12, USERS[2]), (13, USERS[3])])
+
+    groups = [job for job in queue.batch_jobs(batch_id) if job.kind == BATCH_GROUP_JOB]
+    assert sorted(job.payload["learning_space_id"] for job in groups) == [10, 12]
+
+    status = get_batch_status(batch_id)
+    assert status["status"] == "running"
+    assert status["learning_spaces"]["total"] == 4
+    assert status["learning_spaces"]["queued"] == 2
+    assert status["learning_spaces"]["skipped"] == 2
+    assert status["skipped"] == [{"learning_space_id": 11, "user_id": USERS[1]},
+                                 {"learning_space_id": 13, "user_id": USERS[3]}]
+
+
+def test_batch_with_only_skipped_items_is_done(queue, missing_rows):
+    batch_id = _plan(queue, [(11, USERS[1])])
+
+    status = get_batch_status(batch_id)
+    assert status["status"] == "done"
+    assert status["groups"] == 0
+    assert status["learning_spaces"]["skipped"] == 1
+
+
+def test_nothing_is_skipped_while_planning(queue):
+    plan = enqueue_batch([(10, USERS[0])])
+
+    status = get_batch_status(plan.batch_id)
+    assert status["status"] == "planning"
+    assert status["skipped"] == []
+    assert queue.get(plan.id).status == JobStatus.QUEUED
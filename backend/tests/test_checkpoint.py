@@ -0,0 +1,101 @@
+import pytest
+import config
+import agents.graph
+from agents.checkpoint import SQLiteCheckpointSaver
+from agents.graph import AgentGraphWorkflow
+from agents.resilience import NodesDegraded
+from services.agent_workflow import _initial_state
+
+
+@pytest.fixture
+def saver(tmp_path):
+    return SQLiteCheckpointSaver(str(tmp_path / "checkpoints.sqlite3"),
+                                 ttl_seconds=3600, max_threads=100)
+
+
+@pytest.fixture
+def failing_mindmap(monkeypatch):
+    """node_mindmap fails until failing["on"] is cleared"""
+    failing = {"on": True}
+    run_node_mindmap = agents.graph.run_node_mindmap
+
+    def mindmap(state):
+        if failing["on"]:
+            raise RuntimeError("mindmap down")
+        return run_node_mindmap(state)
+
+    monkeypatch.setattr(agents.graph, "run_node_mindmap", mindmap)
+    monkeypatch.setattr(config, "TTS_ENABLED", False)
+    return failing
+
+
+def _state(learning_space_id: int):
+    return _initial_state(learning_space_id, 1, {"grade_level": "10", "language": "english"},
+                          {"topic": f"Photosynthesis {learning_space_id}", "pdf_source": None})
+
+
+def _threads(saver):
+    with saver._connect() as conn:
+        return conn.execute("SELECT COUNT(*) FROM checkpoints").fetchone()[0]
+
+
+def test_failed_run_resumes_from_its_checkpoint(saver, failing_mindmap, fake_models, monkeypatch):
+    monkeypatch.setattr(config, "RESILIENCE_DEGRADE", False)
+    workflow = AgentGraphWorkflow(checkpointer=saver)
+
+    with pytest.raises(RuntimeError):
+        workflow.invoke(_state(1), "thread-1")
+    checkpoint = workflow.checkpoint("thread-1")
+    assert checkpoint["summary_notes"] is not None
+
+    failing_mindmap["on"] = False
+    calls = fake_models.calls
+    final_state = workflow.invoke(None, "thread-1")
+    # the summary is not generated again
+    assert final_state["mindmap_url"]
+    assert fake_models.calls - calls < 4
+    assert workflow.checkpoint("thread-1") is None
+    assert _threads(saver) == 0
+
+
+def test_degraded_nodes_fail_the_run_and_only_they_rerun(saver, failing_mindmap, fake_models):
+    workflow = AgentGraphWorkflow(checkpointer=saver)
+
+    with pytest.raises(NodesDegraded) as error:
+        workflow.invoke(_state(2), "thread-2")
+    assert error.value.nodes == ["node_mindmap"]
+    checkpoint = workflow.checkpoint("thread-2")
+    assert checkpoint["quiz"] is not None and "mindmap_url" not in checkpoint
+
+    # failing again keeps the checkpoint for the next retry
+    with pytest.raises(NodesDegraded):
+        workflow.invoke(None, "thread-2")
+
+    failing_mindmap["on"] = False
+    calls = fake_models.calls
+    final_state = workflow.invoke(None, "thread-2")
+    assert fake_models.calls - calls == 1
+    assert final_state["mindmap_url"] and final_state["quiz"] is not None
+    assert workflow.checkpoint("thread-2") is None
+
+
+def test_runs_without_a_thread_still_degrade(failing_mindmap):
+    final_state = AgentGraphWorkflow().invoke(_state(3))
+    assert final_state["degraded_nodes"] == ["node_mindmap"]
+    assert final_state["quiz"] is not None
+
+
+def test_prune_drops_the_oldest_threads(tmp_path):
+    saver = SQLiteCheckpointSaver(str(tmp_path / "checkpoints.sqlite3"),
+                                  ttl_seconds=3600, max_threads=2)
+    saver.prune_every = 1
+    workflow = AgentGraphWorkflow(checkpointer=saver)
+    for learning_space_id in (4, 5, 6):
+        workflow.resumable_workflow.update_state(
+            {"configurable": {"thread_id": f"thread-{learning_space_id}"}},
+            _state(learning_space_id))
+
+    with saver._connect() as conn:
+        threads = [row[0] for row in conn.execute(
+            "SELECT thread_id FROM checkpoints ORDER BY updated_at")]
+    assert threads == ["thread-5", "thread-6"]
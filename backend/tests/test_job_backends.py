@@ -0,0 +1,69 @@
+import time
+from jobs.backends import JobPriority, JobStatus, SQLiteJobQueue
+
+
+def _claim_expired(tmp_path):
+    queue = SQLiteJobQueue(str(tmp_path / "jobs.sqlite3"))
+    job = queue.enqueue("agent_workflow", {"learning_space_id": 1}, "tenant", max_attempts=3)
+    assert queue.claim("worker-a", tenant_limit=2, lease_seconds=0.01).id == job.id
+    time.sleep(0.02)
+    assert queue.requeue_expired() == 1
+    return queue, job
+
+
+def test_expired_lease_cannot_complete_or_fail_requeued_job(tmp_path):
+    queue, job = _claim_expired(tmp_path)
+
+    assert queue.complete(job.id, "worker-a") is False
+    assert queue.fail(job.id, "worker-a", "late error", 0, 0) is None
+    assert queue.get(job.id).status == JobStatus.QUEUED
+
+
+def test_expired_lease_cannot_finish_job_claimed_by_another_worker(tmp_path):
+    queue, job = _claim_expired(tmp_path)
+    assert queue.claim("worker-b", tenant_limit=2, lease_seconds=60).id == job.id
+
+    assert queue.complete(job.id, "worker-a") is False
+    assert queue.fail(job.id, "worker-a", "late error", 0, 0) is None
+    running = queue.get(job.id)
+    assert (running.status, running.worker_id, running.error) == (
+        JobStatus.RUNNING, "worker-b", "worker lease expired")
+
+    assert queue.complete(job.id, "worker-b") is True
+    assert queue.get(job.id).status == JobStatus.DONE
+
+
+def test_fail_by_lease_holder_schedules_retry(tmp_path):
+    queue = SQLiteJobQueue(str(tmp_path / "jobs.sqlite3"))
+    job = queue.enqueue("agent_workflow", {"learning_space_id": 1}, "tenant", max_attempts=3)
+    queue.claim("worker-a", tenant_limit=2, lease_seconds=60)
+
+    failed = queue.fail(job.id, "worker-a", "boom", 0, 0)
+    assert (failed.status, failed.attempts, failed.error) == (JobStatus.QUEUED, 1, "boom")
+
+
+def test_claim_and_position_follow_priority(tmp_path):
+    queue = SQLiteJobQueue(str(tmp_path / "jobs.sqlite3"))
+    batch = queue.enqueue("regenerate_artifacts", {}, "tenant-a", max_attempts=3,
+                          priority=JobPriority.BATCH)
+    first = queue.enqueue("agent_workflow", {}, "tenant-b", max_attempts=3)
+    second = queue.enqueue("agent_workflow", {}, "tenant-c", max_attempts=3)
+
+    assert [queue.position(job.id) for job in (first, second, batch)] == [0, 1, 2]
+    claimed = [queue.claim("worker-a", tenant_limit=2, lease_seconds=60).id for _ in range(3)]
+    assert claimed == [first.id, second.id, batch.id]
+    assert queue.position(first.id) is None
+    assert queue.claim("worker-a", tenant_limit=2, lease_seconds=60) is None
+
+
+def test_claim_respects_the_tenant_limit(tmp_path):
+    queue = SQLiteJobQueue(str(tmp_path / "jobs.sqlite3"))
+    running = queue.enqueue("agent_workflow", {}, "tenant-a", max_attempts=3)
+    waiting = queue.enqueue("agent_workflow", {}, "tenant-a", max_attempts=3)
+    other = queue.enqueue("agent_workflow", {}, "tenant-b", max_attempts=3,
+                          priority=JobPriority.BATCH)
+
+    assert queue.claim("worker-a", tenant_limit=1, lease_seconds=60).id == running.id
+    # the higher priority job of the busy tenant waits
+    assert queue.claim("worker-a", tenant_limit=1, lease_seconds=60).id == other.id
+    assert queue.position(waiting.id) == 0
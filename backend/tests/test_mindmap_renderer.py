@@ -0,0 +1,90 @@
+import xml.etree.ElementTree as ElementTree
+
+from agents.mindmap_renderer import (
+    LEVEL_GAP, MARGIN, layout_mindmap, mindmap_hash, mindmap_tree, render_svg
+)
+
+SVG = "{http://www.w3.org/2000/svg}"
+
+
+def _mindmap(edges, central="root", extra=()):
+    ids = {central, *extra} | {node for edge in edges for node in edge}
+    return {
+        "central_node": central,
+        "nodes": [{"id": node_id, "label": node_id.title()} for node_id in sorted(ids)],
+        "edges": [{"source": source, "target": target} for source, target in edges]
+    }
+
+
+def test_tree_levels_follow_breadth_first_order():
+    mindmap = _mindmap([("root", "a"), ("root", "b"), ("a", "c"), ("c", "b"), ("b", "a")])
+
+    levels, children, root = mindmap_tree(mindmap)
+
+    assert root == "root"
+    assert levels == {"root": 0, "a": 1, "b": 1, "c": 2}
+    # every node has one parent, cycles and cross edges are dropped
+    assert children == {"root": ["a", "b"], "a": ["c"], "b": [], "c": []}
+
+
+def test_unreachable_nodes_hang_from_the_root():
+    mindmap = _mindmap([("root", "a"), ("ghost", "a"), ("a", "missing")], extra=["lonely"])
+    mindmap["nodes"] = [node for node in mindmap["nodes"] if node["id"] != "missing"]
+
+    levels, children, _ = mindmap_tree(mindmap)
+
+    assert levels["lonely"] == 1 and levels["ghost"] == 1
+    assert set(children["root"]) == {"a", "ghost", "lonely"}
+    assert "missing" not in levels
+
+
+def test_layout_centres_parents_and_keeps_siblings_apart():
+    layout = layout_mindmap(_mindmap([("root", "a"), ("root", "b"), ("a", "c"), ("a", "d")]))
+    nodes = {node["id"]: node for node in layout["nodes"]}
+
+    def centre(node_id):
+        return nodes[node_id]["x"] + nodes[node_id]["width"] / 2
+
+    assert [node["level"] for node in layout["nodes"]] == sorted(n["level"] for n in layout["nodes"])
+    assert abs(centre("a") - (centre("c") + centre("d")) / 2) < 0.1
+    assert abs(centre("root") - (centre("a") + centre("b")) / 2) < 0.1
+    assert nodes["c"]["x"] + nodes["c"]["width"] < nodes["d"]["x"]
+    assert nodes["a"]["x"] + nodes["a"]["width"] < nodes["b"]["x"]
+    assert nodes["root"]["y"] == MARGIN
+    assert nodes["a"]["y"] == MARGIN + nodes["root"]["height"] + LEVEL_GAP
+    assert all(node["x"] >= MARGIN for node in layout["nodes"])
+    assert layout["width"] >= max(node["x"] + node["width"] for node in layout["nodes"])
+
+
+def test_deep_mindmaps_do_not_recurse():
+    chain = [(f"n{i}", f"n{i + 1}") for i in range(2000)]
+    layout = layout_mindmap(_mindmap(chain, central="n0"))
+
+    assert len(layout["nodes"]) == 2001
+    assert max(node["level"] for node in layout["nodes"]) == 2000
+
+
+def test_svg_draws_every_node_and_edge():
+    mindmap = _mindmap([("root", "a"), ("root", "b & <c>")])
+    layout = layout_mindmap(mindmap)
+
+    svg = ElementTree.fromstring(render_svg(layout))
+
+    assert svg.tag == f"{SVG}svg"
+    assert svg.get("width") == str(layout["width"])
+    assert len(svg.findall(f"{SVG}path")) == 2
+    # the background plus one box per node
+    assert len(svg.findall(f"{SVG}rect")) == 4
+    assert {text.text for text in svg.findall(f"{SVG}text")} == {"Root", "A", "B & <C>"}
+
+
+def test_hash_ignores_ids_order_and_label_case():
+    mindmap = _mindmap([("root", "a"), ("root", "b")])
+    renamed = {
+        "central_node": "1",
+        "nodes": [{"id": "3", "label": " b "}, {"id": "1", "label": "ROOT"}, {"id": "2", "label": "A"}],
+        "edges": [{"source": "1", "target": "3"}, {"source": "1", "target": "2"}]
+    }
+
+    assert mindmap_hash(mindmap, "svg") == mindmap_hash(renamed, "svg")
+    assert mindmap_hash(mindmap, "svg") != mindmap_hash(mindmap, "png")
@@ -0,0 +1,90 @@
+import time
+import pytest
+from services.rate_limiter import (
+    RateLimitUnsatisfiable, RateLimiter, _MemoryBucketStore, _SQLiteBucketStore, low_priority)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    return now
+
+
+def _limiter(requests_per_minute=60, tokens_per_minute=6000, reserve=0.2, store=None):
+    return RateLimiter(requests_per_minute, tokens_per_minute, reserve,
+                       store or _MemoryBucketStore())
+
+
+def test_bucket_is_taken_and_refilled_continuously(clock):
+    limiter = _limiter(tokens_per_minute=600)
+
+    assert limiter.try_acquire(600) == 0
+    # the tokens bucket is empty, 100 tokens come back every 10 seconds
+    assert limiter.try_acquire(100) == pytest.approx(10)
+    clock[0] += 10
+    assert limiter.try_acquire(100) == 0
+
+
+def test_requests_bucket_limits_small_calls(clock):
+    limiter = _limiter(requests_per_minute=2)
+
+    assert limiter.try_acquire(1) == 0
+    assert limiter.try_acquire(1) == 0
+    assert limiter.try_acquire(1) == pytest.approx(30)
+
+
+def test_low_priority_leaves_the_reserve(clock):
+    limiter = _limiter(tokens_per_minute=1000, reserve=0.2)
+    assert limiter.try_acquire(700) == 0
+
+    # 300 tokens left: a batch call of 200 would cut into the 200 reserve
+    assert limiter.try_acquire(200, priority_low=True) > 0
+    assert limiter.try_acquire(200) == 0
+
+
+def test_low_priority_requirement_is_clamped_to_the_bucket(clock):
+    # one request per minute, the reserve alone would exceed the bucket
+    limiter = _limiter(requests_per_minute=1, reserve=0.2)
+
+    assert limiter.try_acquire(10, priority_low=True) == 0
+    assert limiter.try_acquire(10, priority_low=True) == pytest.approx(60)
+    clock[0] += 60
+    assert limiter.try_acquire(10, priority_low=True) == 0
+
+
+def test_acquire_waits_for_the_refill(clock, monkeypatch):
+    limiter = _limiter(tokens_per_minute=600)
+    limiter.try_acquire(600)
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        clock[0] += seconds
+
+    monkeypatch.setattr(time, "sleep", sleep)
+    token = low_priority.set(False)
+    try:
+        limiter.acquire(50)
+    finally:
+        low_priority.reset(token)
+    assert sum(sleeps) == pytest.approx(5)
+
+
+def test_unsatisfiable_budgets_raise(clock, monkeypatch):
+    with pytest.raises(RateLimitUnsatisfiable):
+        _limiter(requests_per_minute=0)
+
+    limiter = _limiter()
+    monkeypatch.setattr(limiter, "try_acquire", lambda tokens, priority_low=False: 61.0)
+    with pytest.raises(RateLimitUnsatisfiable):
+        limiter.acquire(10)
+
+
+def test_sqlite_store_shares_the_buckets(clock, tmp_path):
+    path = str(tmp_path / "rate_limit.sqlite3")
+    first = _limiter(tokens_per_minute=600, store=_SQLiteBucketStore(path))
+    second = _limiter(tokens_per_minute=600, store=_SQLiteBucketStore(path))
+
+    assert first.try_acquire(500) == 0
+    assert second.try_acquire(200) == pytest.approx(10)
@@ -0,0 +1,156 @@
+import asyncio
+import threading
+import time
+import pytest
+import config
+from agents.resilience import (
+    CircuitBreaker, CircuitOpenError, DeadlineExceeded, Resilience)
+
+
+@pytest.fixture(autouse=True)
+def policy(monkeypatch):
+    monkeypatch.setattr(config, "LLM_RATE_LIMIT_ENABLED", False)
+    monkeypatch.setattr(config, "RESILIENCE_DEADLINE", 1.0)
+    monkeypatch.setattr(config, "RESILIENCE_RETRIES", 2)
+    monkeypatch.setattr(config, "RESILIENCE_RETRY_BASE_DELAY", 0)
+    monkeypatch.setattr(config, "RESILIENCE_HEDGE", False)
+    monkeypatch.setattr(config, "RESILIENCE_BREAKER_FAILURES", 3)
+    monkeypatch.setattr(config, "RESILIENCE_BREAKER_RESET", 30.0)
+
+
+class Flaky:
+    """Fails the first failures calls, then returns "ok" """
+
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise RuntimeError("provider error")
+        return "ok"
+
+
+def test_breaker_opens_after_consecutive_failures_and_half_opens(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker("model", failure_threshold=2, reset_timeout=10)
+
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    now[0] += 10
+    assert breaker.state == "half_open"
+    breaker.before_call()
+    # one trial call at a time
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    # a failed trial opens it again, a successful one closes it
+    breaker.record_failure()
+    assert breaker.state == "open"
+    now[0] += 10
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    breaker.before_call()
+
+
+def test_call_retries_until_success():
+    function = Flaky(failures=2)
+    assert Resilience().call("node_quiz", function) == "ok"
+    assert function.calls == 3
+
+
+def test_call_raises_after_the_last_retry():
+    function = Flaky(failures=5)
+    with pytest.raises(RuntimeError):
+        Resilience().call("node_quiz", function)
+    assert function.calls == 3
+
+
+def test_breaker_is_per_model():
+    resilience = Resilience()
+    for _ in range(3):
+        with pytest.raises(RuntimeError):
+            resilience.call("map_chunk", Flaky(failures=5), model="small-model")
+
+    assert resilience.breaker("small-model").state == "open"
+    with pytest.raises(CircuitOpenError):
+        resilience.call("map_chunk", Flaky(failures=0), model="small-model")
+    assert resilience.call("node_quiz", Flaky(failures=0), model="large-model") == "ok"
+
+
+def test_deadline_abandons_the_attempt_without_retrying(monkeypatch):
+    monkeypatch.setattr(config, "RESILIENCE_DEADLINE", 0.05)
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        release.wait(5)
+        return "late"
+
+    resilience = Resilience()
+    try:
+        with pytest.raises(DeadlineExceeded):
+            resilience.call("node_quiz", slow)
+        # a retry would run next to the abandoned attempt
+        assert len(calls) == 1
+
+        # other calls of the same node still retry
+        function = Flaky(failures=1)
+        assert resilience.call("node_quiz", function) == "ok"
+        assert function.calls == 2
+    finally:
+        release.set()
+
+
+def test_slow_call_is_hedged_past_the_percentile(monkeypatch):
+    monkeypatch.setattr(config, "RESILIENCE_HEDGE", True)
+    monkeypatch.setattr(config, "RESILIENCE_HEDGE_PERCENTILE", 95.0)
+    monkeypatch.setattr(config, "RESILIENCE_HEDGE_MIN_SAMPLES", 5)
+    resilience = Resilience()
+    for _ in range(5):
+        resilience.latency("node_quiz").add(0.01)
+
+    release = threading.Event()
+    calls = []
+
+    def first_slow():
+        calls.append(1)
+        if len(calls) == 1:
+            release.wait(5)
+            return "slow"
+        return "hedge"
+
+    try:
+        assert resilience.call("node_quiz", first_slow) == "hedge"
+        assert len(calls) == 2
+    finally:
+        release.set()
+
+
+def test_async_call_retries_and_enforces_the_deadline(monkeypatch):
+    resilience = Resilience()
+    function = Flaky(failures=1)
+
+    async def flaky():
+        return function()
+
+    assert asyncio.run(resilience.acall("node_quiz", flaky)) == "ok"
+    assert function.calls == 2
+
+    monkeypatch.setattr(config, "RESILIENCE_DEADLINE", 0.05)
+    monkeypatch.setattr(config, "RESILIENCE_RETRIES", 0)
+
+    async def slow():
+        await asyncio.sleep(5)
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(resilience.acall("node_quiz", slow))